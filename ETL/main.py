@@ -1,13 +1,17 @@
 from __future__ import annotations
 
 import datetime
+import hashlib
+import json
 import os
+import time
 from typing import Any
 
 import elasticsearch
 import psycopg2
 import psycopg2.extras
 import logging
+import redis
 from dotenv import load_dotenv
 from elasticsearch import Elasticsearch
 from elasticsearch.helpers import bulk
@@ -18,6 +22,24 @@ from state import State, JsonFileStorage
 
 START_ID = os.environ.get('START_ID', '00000000-0000-0000-0000-000000000000')
 LIMIT_AT = os.environ.get('LIMIT_AT', 50)
+CACHE_INVALIDATION_CHANNEL = os.environ.get('CACHE_INVALIDATION_CHANNEL', 'cache:invalidate')
+# Пауза между полными проходами по фильмам, в секундах
+PASS_INTERVAL = int(os.environ.get('PASS_INTERVAL', 60))
+# Хэши содержимого записанных документов: документ с тем же хэшем не пишется
+# в Elasticsearch повторно и не попадает в события инвалидации кэша
+DOC_HASH_KEY = 'etl:doc_hash:{}'
+# uuid индекса, для которого записаны хэши: пересозданный индекс пуст, и хэши сбрасываются
+DOC_HASH_INDEX_KEY = 'etl:doc_hash_index:{}'
+INDEXES = ('movies', 'persons', 'genres')
+# Материализованные рейтинги фильмов по жанрам, из которых API отдаёт топ жанра
+GENRE_TOP_KEY = 'genre_top:{}'
+GENRE_TOP_BUILT_KEY = 'genre_top:built'
+GENRE_TOP_UPDATED_KEY = 'genre_top:updated'
+FILM_SHORT_KEY = 'films_short'
+FILM_GENRES_KEY = 'film_genres'
+# участники каждого фильма при последней записи: персона, которую убрали из фильма,
+# тоже переиндексируется, иначе её роли продолжат ссылаться на фильм
+FILM_PERSONS_KEY = 'film_persons'
 
 logging.basicConfig(
     filename='etl.log',
@@ -35,40 +57,70 @@ class ETL:
         """
         self.current_id = None
         self.es = None
+        self.redis = None
         self.storage = State(JsonFileStorage('state.json'))
 
     @backoff(log=logging, exception=elasticsearch.exceptions.ConnectionError)
     def main_cicle(self):
         self.es = Elasticsearch(f'{os.environ.get("ES_HOST", "localhost")}:{os.environ.get("ES_PORT", "9200")}')
+        self.redis = redis.Redis(host=os.environ.get('REDIS_HOST', 'localhost'),
+                                 port=int(os.environ.get('REDIS_PORT', 6379)))
         self.current_id = START_ID if self.storage.get_state('last_id') is None else self.storage.get_state('last_id')
         self.last_genres_update = datetime.datetime(1900, 1, 1) \
-            if self.storage.get_state('last_genre_update') is None else self.storage.get_state('last_genre_update')
+            if self.storage.get_state('last_genres_update') is None else self.storage.get_state('last_genres_update')
         self.last_persons_update = datetime.datetime(1900, 1, 1) \
             if self.storage.get_state('last_persons_update') is None else self.storage.get_state('last_persons_update')
+        self.check_targets()
 
         while True:
             # movies
             db_data_movies = self.extract_movies(self.current_id)
             if len(db_data_movies) == 0:
+                # полный проход по фильмам завершён, рейтинги жанров содержат весь каталог
+                self.redis.set(GENRE_TOP_BUILT_KEY, datetime.datetime.now().timestamp())
+                self.mark_rankings_fresh()
                 self.current_id = START_ID
                 self.transaction = 0
+                # фильмы перечитываются целиком, потому что их документы собраны и из персон,
+                # и из жанров; записываются только изменившиеся
+                time.sleep(PASS_INTERVAL)
+                self.check_targets()
                 continue
-            bulk(self.es, self.load_films(db_data_movies))
+            films = self.changed_only('movies', list(self.load_films(db_data_movies)))
+            if films:
+                bulk(self.es, films)
+                self.update_genre_rankings(films)
+                self.publish_changes('movies', films)
+                self.remember('movies', films)
+                # роли персон хранятся в индексе persons, поэтому переиндексируем прежних
+                # и нынешних участников изменившихся фильмов
+                film_ids = {film['_id'] for film in films}
+                film_persons = {movie['id']: sorted({person['person_id'] for person in movie['persons']})
+                                for movie in db_data_movies if movie['id'] in film_ids}
+                person_ids = self.previous_persons(list(film_persons))
+                person_ids.update(person_id for ids in film_persons.values() for person_id in ids)
+                self.write_changed('persons', list(self.load_persons(self.extract_persons_by_ids(person_ids))))
+                self.remember_persons(film_persons)
+            # рейтинги сверены с этой порцией, даже если в ней ничего не изменилось
+            self.mark_rankings_fresh()
             self.current_id = db_data_movies[-1]['id']
             self.storage.set_state('last_id', self.current_id)
-            logging.info(f'transaciton added, last filmwork_id={self.current_id}')
+            logging.info(f'transaciton added, last filmwork_id={self.current_id}, changed films={len(films)}')
             # persons
-            time_stamp = datetime.datetime.now()
             db_data_persons = self.extract_persons(self.last_persons_update)
-            bulk(self.es, self.load_persons(db_data_persons))
-            logging.info(f'transaciton added, all persons updated')
-            self.storage.set_state('last_persons_update', time_stamp.strftime('%Y-%m-%d %H:%M:%S'))
+            if db_data_persons:
+                self.write_changed('persons', list(self.load_persons(db_data_persons)))
+                # строки отсортированы по modified, отметкой служит время из БД, а не часы ETL
+                self.last_persons_update = str(db_data_persons[-1]['modified'])
+                self.storage.set_state('last_persons_update', self.last_persons_update)
+                logging.info(f'transaciton added, persons updated till {self.last_persons_update}')
             # genres
-            time_stamp = datetime.datetime.now()
             db_data_genres = self.extract_genres(self.last_genres_update)
-            bulk(self.es, self.load_genres(db_data_genres))
-            logging.info(f'transaciton added, all genres updated')
-            self.storage.set_state('last_genres_update', time_stamp.strftime('%Y-%m-%d %H:%M:%S'))
+            if db_data_genres:
+                self.write_changed('genres', list(self.load_genres(db_data_genres)))
+                self.last_genres_update = str(db_data_genres[-1]['modified'])
+                self.storage.set_state('last_genres_update', self.last_genres_update)
+                logging.info(f'transaciton added, genres updated till {self.last_genres_update}')
 
     @backoff(log=logging, exception=OperationalError)
     def extract_movies(self, current_id_t: str) -> list[dict[Any, Any]]:
@@ -117,15 +169,45 @@ class ETL:
 
         return ans1
 
+    # Персоны вместе с фильмами, сгруппированными по ролям, чтобы API отдавал персону одним GET
+    PERSONS_QUERY = """SELECT
+                           p.id,
+                           p.full_name,
+                           p.modified,
+                           COALESCE(array_agg(DISTINCT pfw.film_work_id::text)
+                                    FILTER (WHERE pfw.role = 'director'), '{{}}') as director,
+                           COALESCE(array_agg(DISTINCT pfw.film_work_id::text)
+                                    FILTER (WHERE pfw.role = 'actor'), '{{}}') as actor,
+                           COALESCE(array_agg(DISTINCT pfw.film_work_id::text)
+                                    FILTER (WHERE pfw.role = 'writer'), '{{}}') as writer,
+                           COUNT(DISTINCT pfw.film_work_id) as film_count
+                       FROM content.person p
+                       LEFT JOIN content.person_film_work pfw ON pfw.person_id = p.id
+                       WHERE {where}
+                       GROUP BY p.id
+                       ORDER BY p.modified"""
+
     @backoff(log=logging, exception=OperationalError)
     def extract_persons(self, last_update) -> list[dict[Any, Any]]:
+        return self._extract_persons('p.modified > %s', (last_update,))
+
+    @backoff(log=logging, exception=OperationalError)
+    def extract_persons_by_ids(self, person_ids: set) -> list[dict[Any, Any]]:
+        """
+        Метод загружает персон, участвовавших в изменённых фильмах, чтобы переиндексировать их роли
+        :param person_ids: id персон
+        :return: словарь данных выборки без преобразований
+        """
+        if not person_ids:
+            return []
+        return self._extract_persons('p.id IN %s', (tuple(person_ids),))
+
+    def _extract_persons(self, where: str, params: tuple) -> list[dict[Any, Any]]:
         with psycopg2.connect(f"""dbname={os.environ.get('DB_NAME', 'movies_db')} 
             host={os.environ.get('DB_HOST', 'localhost')} user={os.environ.get('DB_USER', 'app')} 
             password={os.environ.get('DB_PASSWORD', '123qwe')}""") as conn:
             cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-            cur.execute(f"""SELECT id, full_name, modified from content.person
-                            WHERE modified > '{last_update}'
-                            ORDER BY modified""")
+            cur.execute(self.PERSONS_QUERY.format(where=where), params)
             ans = cur.fetchall()
             ans1 = []
             for row in ans:
@@ -149,6 +231,169 @@ class ETL:
 
             return ans1
 
+    @backoff(log=logging, exception=elasticsearch.exceptions.ConnectionError)
+    def index_uuid(self, index: str) -> str:
+        """
+        Метод возвращает uuid индекса, который меняется при каждом пересоздании индекса
+        :param index: индекс или алиас Elasticsearch
+        :return: uuid или пустая строка, если индекса нет
+        """
+        try:
+            settings = self.es.indices.get_settings(index=index, name='index.uuid')
+        except elasticsearch.exceptions.NotFoundError:
+            return ''
+        return next(iter(settings.values()))['settings']['index']['uuid']
+
+    @backoff(log=logging, exception=redis.exceptions.ConnectionError)
+    def check_targets(self) -> None:
+        """
+        Метод сверяет хэши записанных документов с тем, что действительно лежит в хранилищах.
+        Если индекс пересоздан (например, при смене схемы), его хэши сбрасываются, и он
+        заполняется заново: фильмы — с начала прохода, персоны и жанры — с начала времён.
+        Если из Redis пропали рейтинги жанров, сбрасываются хэши фильмов, чтобы проход
+        построил рейтинги заново.
+        :return: метод ничего не возвращает
+        """
+        reset = set()
+        for index in INDEXES:
+            uuid = self.index_uuid(index)
+            stored = self.redis.get(DOC_HASH_INDEX_KEY.format(index))
+            if stored is None or stored.decode() != uuid:
+                reset.add(index)
+                self.redis.delete(DOC_HASH_KEY.format(index))
+                self.redis.set(DOC_HASH_INDEX_KEY.format(index), uuid)
+        if 'movies' not in reset and self.redis.exists(GENRE_TOP_BUILT_KEY, FILM_SHORT_KEY) < 2:
+            reset.add('movies')
+            self.redis.delete(DOC_HASH_KEY.format('movies'))
+        if 'movies' in reset:
+            self.current_id = START_ID
+            self.storage.set_state('last_id', self.current_id)
+        if 'persons' in reset:
+            self.last_persons_update = datetime.datetime(1900, 1, 1)
+            self.storage.set_state('last_persons_update', str(self.last_persons_update))
+        if 'genres' in reset:
+            self.last_genres_update = datetime.datetime(1900, 1, 1)
+            self.storage.set_state('last_genres_update', str(self.last_genres_update))
+        if reset:
+            logging.info(f'document hashes reset, full rewrite of {", ".join(sorted(reset))}')
+
+    @staticmethod
+    def digest(action: dict) -> str:
+        return hashlib.blake2b(json.dumps(action, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+
+    @backoff(log=logging, exception=redis.exceptions.ConnectionError)
+    def changed_only(self, index: str, actions: list) -> list:
+        """
+        Метод оставляет документы, содержимое которых отличается от записанного ранее
+        :param index: индекс Elasticsearch
+        :param actions: документы для записи
+        :return: новые и изменившиеся документы
+        """
+        if not actions:
+            return []
+        stored = self.redis.hmget(DOC_HASH_KEY.format(index), [str(action['_id']) for action in actions])
+        return [action for action, digest in zip(actions, stored)
+                if digest is None or digest.decode() != self.digest(action)]
+
+    @backoff(log=logging, exception=redis.exceptions.ConnectionError)
+    def remember(self, index: str, actions: list) -> None:
+        """
+        Метод запоминает хэши записанных документов; вызывается после публикации изменений,
+        чтобы при сбое между записью и публикацией документ записался и опубликовался снова
+        :param index: индекс Elasticsearch
+        :param actions: записанные документы
+        :return: метод ничего не возвращает
+        """
+        if actions:
+            self.redis.hset(DOC_HASH_KEY.format(index),
+                            mapping={str(action['_id']): self.digest(action) for action in actions})
+
+    def write_changed(self, index: str, actions: list) -> list:
+        """
+        Метод записывает в Elasticsearch и публикует для инвалидации кэша только изменившиеся документы
+        :param index: индекс Elasticsearch
+        :param actions: документы для записи
+        :return: записанные документы
+        """
+        changed = self.changed_only(index, actions)
+        if changed:
+            bulk(self.es, changed)
+            self.publish_changes(index, changed)
+            self.remember(index, changed)
+        return changed
+
+    @backoff(log=logging, exception=redis.exceptions.ConnectionError)
+    def publish_changes(self, index: str, actions: list) -> None:
+        """
+        Метод публикует в Redis идентификаторы документов, записанных bulk-запросом,
+        чтобы API удалил из кэша ответы, в которые они входят
+        :param index: индекс Elasticsearch
+        :param actions: записанные документы
+        :return: метод ничего не возвращает
+        """
+        ids = [action['_id'] for action in actions]
+        if ids:
+            self.redis.publish(CACHE_INVALIDATION_CHANNEL, json.dumps({'index': index, 'ids': ids}, default=str))
+
+    @backoff(log=logging, exception=redis.exceptions.ConnectionError)
+    def update_genre_rankings(self, films: list) -> None:
+        """
+        Метод обновляет в Redis рейтинги фильмов по жанрам для порции записанных фильмов:
+        sorted set genre_top:<genre_id> (id фильма -> рейтинг со знаком минус, чтобы ZRANGE
+        давал порядок сортировки Elasticsearch) и hash films_short с короткими карточками.
+        Из жанров, которых у фильма больше нет, фильм удаляется.
+        :param films: записанные документы фильмов
+        :return: метод ничего не возвращает
+        """
+        if not films:
+            return
+        previous = self.redis.hmget(FILM_GENRES_KEY, [film['_id'] for film in films])
+        pipe = self.redis.pipeline()
+        for film, old_genres in zip(films, previous):
+            genres = set(film['genre'])
+            for genre_id in set(json.loads(old_genres) if old_genres else []) - genres:
+                pipe.zrem(GENRE_TOP_KEY.format(genre_id), film['_id'])
+            for genre_id in genres:
+                pipe.zadd(GENRE_TOP_KEY.format(genre_id), {film['_id']: -(film['imdb_rating'] or 0)})
+            pipe.hset(FILM_SHORT_KEY, film['_id'], json.dumps(
+                {'id': film['id'], 'title': film['title'], 'imdb_rating': film['imdb_rating']}, default=str
+            ))
+            pipe.hset(FILM_GENRES_KEY, film['_id'], json.dumps(sorted(genres)))
+        pipe.execute()
+
+    @backoff(log=logging, exception=redis.exceptions.ConnectionError)
+    def previous_persons(self, film_ids: list) -> set:
+        """
+        Метод возвращает участников фильмов на момент их прошлой записи
+        :param film_ids: id фильмов
+        :return: id персон
+        """
+        if not film_ids:
+            return set()
+        stored = self.redis.hmget(FILM_PERSONS_KEY, film_ids)
+        return {person_id for persons in stored if persons for person_id in json.loads(persons)}
+
+    @backoff(log=logging, exception=redis.exceptions.ConnectionError)
+    def remember_persons(self, film_persons: dict) -> None:
+        """
+        Метод запоминает участников записанных фильмов; вызывается после переиндексации персон
+        :param film_persons: id фильма -> отсортированный список id персон
+        :return: метод ничего не возвращает
+        """
+        if film_persons:
+            self.redis.hset(FILM_PERSONS_KEY,
+                            mapping={film_id: json.dumps(persons) for film_id, persons in film_persons.items()})
+
+    @backoff(log=logging, exception=redis.exceptions.ConnectionError)
+    def mark_rankings_fresh(self) -> None:
+        """
+        Метод отмечает, что ETL жив и рейтинги жанров сверены с БД; API не верит рейтингам,
+        если отметка старше GENRE_TOP_MAX_STALENESS, поэтому она обновляется после каждой
+        порции фильмов, а не только при изменениях
+        :return: метод ничего не возвращает
+        """
+        self.redis.set(GENRE_TOP_UPDATED_KEY, datetime.datetime.now().timestamp())
+
     def transform_one_element_of_movies(self, data_dict: dict) -> dict[str, str | list[Any] | Any]:
         """
         Метод преобразует словарь одной записи Postgresql в словарь документа Elasticsearch
@@ -228,7 +473,13 @@ class ETL:
                 "_index": "persons",
                 "_id": cur_el['id'],
                 "id": cur_el['id'],
-                "full_name": cur_el['full_name']
+                "full_name": cur_el['full_name'],
+                "roles": {
+                    "director": cur_el['director'],
+                    "actor": cur_el['actor'],
+                    "writer": cur_el['writer'],
+                },
+                "film_count": cur_el['film_count'],
             }
 
 
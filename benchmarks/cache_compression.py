@@ -0,0 +1,103 @@
+"""
+Сравнение размера и времени упаковки/распаковки значений кэша для доступных кодеков.
+Полезные нагрузки повторяют то, что сервисы кладут в Redis: страница из 100 FilmShort,
+карточка фильма и персона с идентификаторами фильмов по ролям.
+
+Запуск из корня репозитория:
+    python benchmarks/cache_compression.py
+"""
+import os
+import random
+import sys
+import time
+import uuid
+
+import orjson
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from db.compression import Compressor, available_codecs  # noqa: E402
+
+ROUNDS = 2000
+WORDS = 'star war matrix love story night city dark return king last man time world'.split()
+
+
+def _title():
+    return ' '.join(random.choice(WORDS).capitalize() for _ in range(random.randint(1, 4)))
+
+
+def _name():
+    return f'{random.choice(WORDS).capitalize()} {random.choice(WORDS).capitalize()}'
+
+
+def film_page(size=100):
+    return {
+        'total': 9999,
+        'results': [
+            {'id': str(uuid.uuid4()), 'title': _title(), 'imdb_rating': round(random.uniform(1, 10), 1)}
+            for _ in range(size)
+        ],
+    }
+
+
+def film_details():
+    actors = [{'id': str(uuid.uuid4()), 'name': _name()} for _ in range(12)]
+    writers = [{'id': str(uuid.uuid4()), 'name': _name()} for _ in range(4)]
+    return {
+        'id': str(uuid.uuid4()),
+        'title': _title(),
+        'description': ' '.join(random.choice(WORDS) for _ in range(120)),
+        'imdb_rating': 7.7,
+        'genre': [str(uuid.uuid4()) for _ in range(3)],
+        'director': [_name()],
+        'actors_names': [a['name'] for a in actors],
+        'writers_names': [w['name'] for w in writers],
+        'actors': actors,
+        'writers': writers,
+    }
+
+
+def person(films=150):
+    return {
+        'id': str(uuid.uuid4()),
+        'full_name': _name(),
+        'roles': {
+            'actor': [str(uuid.uuid4()) for _ in range(films)],
+            'writer': [str(uuid.uuid4()) for _ in range(films // 10)],
+            'director': None,
+        },
+    }
+
+
+def measure(compressor, raw):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        packed = compressor.pack(raw)
+    pack_us = (time.perf_counter() - start) / ROUNDS * 1e6
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        compressor.unpack(packed)
+    unpack_us = (time.perf_counter() - start) / ROUNDS * 1e6
+    return len(packed), pack_us, unpack_us
+
+
+def main():
+    random.seed(1)
+    payloads = {
+        'films page[size]=100': film_page(),
+        'film details': film_details(),
+        'person with roles': person(),
+    }
+    print(f'{"payload":<22} {"codec":<6} {"bytes":>8} {"ratio":>6} {"pack us":>9} {"unpack us":>10}')
+    for name, payload in payloads.items():
+        raw = orjson.dumps(payload)
+        for codec in [None] + available_codecs():
+            size, pack_us, unpack_us = measure(Compressor(codec, threshold=0), raw)
+            print(
+                f'{name:<22} {codec or "plain":<6} {size:>8} {len(raw) / size:>6.2f} '
+                f'{pack_us:>9.1f} {unpack_us:>10.1f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Время сборки и сериализации ответа /api/v1/films для page[size]=100.
+Сравниваются три пути:
+  pydantic + response_model — как было: FilmShort и AllShortFilms, затем FastAPI
+      ещё раз проверяет ответ по response_model и прогоняет через jsonable_encoder;
+  pydantic (debug) — build_response в режиме отладки: модель с валидацией и orjson;
+  fast path — build_response без валидации: dict по полям модели и orjson.
+
+Запуск из корня репозитория:
+    python benchmarks/response_serialization.py
+"""
+import os
+import random
+import sys
+import time
+import uuid
+
+import orjson
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic.fields import ModelField  # noqa: E402
+
+from models.film import AllShortFilms, FilmShort  # noqa: E402
+from models import responses  # noqa: E402
+
+ROUNDS = 2000
+WORDS = 'star war matrix love story night city dark return king last man time world'.split()
+
+
+def film_page(size=100):
+    return {
+        'total': 9999,
+        'results': [
+            {
+                'id': str(uuid.uuid4()),
+                'title': ' '.join(random.choice(WORDS) for _ in range(3)),
+                'imdb_rating': round(random.uniform(1, 10), 1),
+            }
+            for _ in range(size)
+        ],
+    }
+
+
+RESPONSE_FIELD = ModelField(
+    name='response', type_=AllShortFilms, class_validators={}, model_config=AllShortFilms.__config__
+)
+
+
+def pydantic_response_model(page):
+    response = AllShortFilms(
+        page_size=100,
+        page_number=1,
+        results=[FilmShort(**source) for source in page['results']],
+        amount_results=page['total'],
+    )
+    value, _ = RESPONSE_FIELD.validate(response.dict(), {}, loc=('response',))
+    return orjson.dumps(jsonable_encoder(value))
+
+
+def build_response(page):
+    payload = responses.build_response(AllShortFilms, {
+        'page_size': 100,
+        'page_number': 1,
+        'results': page['results'],
+        'amount_results': page['total'],
+    })
+    if isinstance(payload, AllShortFilms):
+        payload = payload.dict()
+    return orjson.dumps(payload)
+
+
+def measure(func, page):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        func(page)
+    return (time.perf_counter() - start) / ROUNDS * 1e6
+
+
+def main():
+    random.seed(1)
+    page = film_page()
+    baseline = measure(pydantic_response_model, page)
+    responses.RESPONSE_VALIDATION = True
+    debug = measure(build_response, page)
+    responses.RESPONSE_VALIDATION = False
+    fast = measure(build_response, page)
+
+    print(f'{"path":<28} {"us/request":>10} {"speedup":>8}')
+    runs = (('pydantic + response_model', baseline), ('pydantic (debug)', debug), ('fast path', fast))
+    for name, us in runs:
+        print(f'{name:<28} {us:>10.1f} {baseline / us:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
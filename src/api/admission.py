@@ -0,0 +1,146 @@
+"""
+Контроль нагрузки по эндпоинтам. У каждого эндпоинта с бюджетом свой лимит
+одновременных запросов и своя ограниченная очередь: тяжёлый поиск, заняв свои места,
+не задерживает карточки фильмов. Маршруты с кэшем ответов занимают место только
+при промахе, пока ответ собирается (admit), попадания в кэш бюджет не тратят.
+Остальные занимают его зависимостью маршрута (admission) и держат, пока ответ
+не отправлен целиком, у выгрузки — до конца потока.
+Если очередь полна или место не освободилось за время ожидания, запрос сразу
+получает 503 с Retry-After.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional
+
+from core.config import ADMISSION_BUDGETS, ADMISSION_RETRY_AFTER, ADMISSION_WAIT_TIMEOUT
+
+
+class Overloaded(Exception):
+    """Эндпоинт исчерпал бюджет: запрос отклонён, не дожидаясь обработки"""
+
+    def __init__(self, endpoint: str, retry_after: int):
+        super().__init__(f'{endpoint} is overloaded')
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class Limiter:
+    """
+    Не больше concurrency запросов одновременно и не больше queue_size ожидающих.
+    Ожидание места ограничено wait_timeout секундами.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        concurrency: int,
+        queue_size: int,
+        wait_timeout: float,
+        retry_after: int,
+    ):
+        self.endpoint = endpoint
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.wait_timeout = wait_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def _acquire(self) -> None:
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            return
+        if self.waiting >= self.queue_size:
+            self.shed += 1
+            raise Overloaded(self.endpoint, self.retry_after)
+        self.waiting += 1
+        # не asyncio.wait_for: в Python 3.10 он может отменить ожидание уже после того,
+        # как семафор захвачен, и место потеряется навсегда
+        acquire = asyncio.ensure_future(self._semaphore.acquire())
+        try:
+            await asyncio.wait({acquire}, timeout=self.wait_timeout)
+        except asyncio.CancelledError:
+            self._abandon(acquire)
+            raise
+        finally:
+            self.waiting -= 1
+        if not acquire.done():
+            self._abandon(acquire)
+            self.timed_out += 1
+            raise Overloaded(self.endpoint, self.retry_after)
+
+    def _abandon(self, acquire: asyncio.Future) -> None:
+        """Отменяет ожидание места; если место всё же досталось, возвращает его"""
+        acquire.cancel()
+        acquire.add_done_callback(self._release_if_acquired)
+
+    def _release_if_acquired(self, acquire: asyncio.Future) -> None:
+        if not acquire.cancelled() and acquire.exception() is None:
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self._acquire()
+        self.active += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict:
+        return {
+            'concurrency': self.concurrency,
+            'queue_size': self.queue_size,
+            'active': self.active,
+            'waiting': self.waiting,
+            'admitted': self.admitted,
+            'shed': self.shed,
+            'timed_out': self.timed_out,
+        }
+
+
+limiters: Dict[str, Limiter] = {}
+
+
+def get_limiter(endpoint: str) -> Optional[Limiter]:
+    """Ограничитель эндпоинта; None, если бюджет для эндпоинта не задан"""
+    if endpoint not in limiters and endpoint in ADMISSION_BUDGETS:
+        concurrency, queue_size = ADMISSION_BUDGETS[endpoint]
+        limiters[endpoint] = Limiter(
+            endpoint, concurrency, queue_size, ADMISSION_WAIT_TIMEOUT, ADMISSION_RETRY_AFTER
+        )
+    return limiters.get(endpoint)
+
+
+@asynccontextmanager
+async def admit(endpoint: str):
+    limiter = get_limiter(endpoint)
+    if limiter is None:
+        yield
+        return
+    async with limiter.slot():
+        yield
+
+
+def admission(endpoint: str) -> Callable[[], AsyncIterator[None]]:
+    """
+    Зависимость маршрута, которая занимает место в бюджете эндпоинта.
+    FastAPI закрывает такие зависимости после отправки ответа, поэтому место
+    освобождается только тогда, когда ответ (и поток StreamingResponse) отдан.
+    """
+
+    async def hold_slot():
+        async with admit(endpoint):
+            yield
+
+    return hold_slot
+
+
+def stats() -> Dict:
+    return {endpoint: get_limiter(endpoint).stats() for endpoint in sorted(ADMISSION_BUDGETS)}
@@ -0,0 +1,192 @@
+"""
+Кэш готовых ответов API. В кэше лежат байты тела ответа вместе с content type,
+ETag и моментом истечения, поэтому при попадании маршрут не вызывает сервис,
+не собирает pydantic-модели и не сериализует ответ заново: это один GET в кэш
+и запись в сокет, а если у клиента та же версия — ответ 304 без тела.
+"""
+import functools
+import hashlib
+import inspect
+import logging
+import time
+from collections import Counter
+from http import HTTPStatus
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+import orjson
+from fastapi import Depends, Request, Response
+from pydantic import BaseModel
+
+from api.admission import admit
+from core.config import get_cache_policy
+from db.abstract import AsyncCacheStorage
+from db.cache import get_cache
+from services import codecs
+from services.base import cache_sources, degraded
+from services.cache_keys import cache_key, normalize_query
+
+logger = logging.getLogger(__name__)
+
+# сколько ответов каждого эндпоинта отдано из кэша и сколько собрано заново
+hits: Counter = Counter()
+misses: Counter = Counter()
+
+
+# значения аргументов маршрута, которые попадают в ключ как есть
+KEY_VALUE_TYPES = (str, int, float, bool)
+
+
+def response_key(request: Request, arguments: Dict[str, Any]) -> str:
+    """
+    Ключ ответа строится из проверенных аргументов маршрута, а не из строки запроса:
+    значения по умолчанию подставлены, лишние параметры (?_=123) не влияют на ключ.
+    Параметры пути уже есть в пути, сервисы и прочие зависимости в ключ не попадают.
+    """
+    params = {}
+    for name, value in arguments.items():
+        if name in request.path_params:
+            continue
+        if hasattr(value, 'cache_params'):
+            params.update(value.cache_params)
+        elif isinstance(value, KEY_VALUE_TYPES) or (
+            isinstance(value, (list, tuple)) and all(isinstance(item, KEY_VALUE_TYPES) for item in value)
+        ):
+            params[name] = normalize_query(value) if name == 'query' else value
+    return cache_key(f'{request.url.path.strip("/")}:response', **params)
+
+
+class CachedResponse(NamedTuple):
+    media_type: str
+    etag: str
+    expire_at: float
+    body: bytes
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def pack(response: CachedResponse) -> bytes:
+    head = f'{response.media_type}\n{response.etag}\n{response.expire_at}\n'
+    return head.encode() + response.body
+
+
+def unpack(value: bytes) -> Optional[CachedResponse]:
+    parts = value.split(b'\n', 3)
+    if len(parts) != 4:
+        return None
+    media_type, etag, expire_at, body = parts
+    try:
+        return CachedResponse(media_type.decode(), etag.decode(), float(expire_at), body)
+    except ValueError:
+        return None
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    tags = {tag.strip() for tag in if_none_match.split(',')}
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+
+def to_response(request: Request, cached: CachedResponse) -> Response:
+    """Ответ из кэша: 304, если у клиента та же версия, иначе тело целиком"""
+    max_age = max(int(cached.expire_at - time.time()), 0)
+    headers = {'ETag': cached.etag, 'Cache-Control': f'max-age={max_age}'}
+    if not_modified(request, cached.etag):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type=cached.media_type, headers=headers)
+
+
+def cached_response(endpoint: str) -> Callable:
+    """
+    Декоратор маршрута: ответ 200 сохраняется в кэше на мягкий TTL эндпоинта,
+    но не дольше, чем свежи данные, из которых он собран, и помечается ключами
+    кэша сервисов, из которых собран (если их нет — id документов из тела),
+    чтобы его удаляла инвалидация от ETL.
+    ETag считается один раз при записи, If-None-Match с ним даёт ответ 304.
+    Ошибки (HTTPException), ответы-объекты Response и ответы из устаревших данных
+    при недоступном Elasticsearch не кэшируются.
+    Место в бюджете эндпоинта (api.admission) занимает только промах, пока ответ
+    собирается: попадания в кэш не конкурируют с ним и не отклоняются при всплеске промахов.
+    Декоратор ставится под @router.get, чтобы FastAPI видел его сигнатуру.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        parameters = list(signature.parameters.values())
+        # маршруту добавляются запрос и кэш, FastAPI подставит их
+        # как зависимости
+        parameters.extend([
+            inspect.Parameter(
+                '_request', inspect.Parameter.KEYWORD_ONLY, annotation=Request
+            ),
+            inspect.Parameter(
+                '_response_cache',
+                inspect.Parameter.KEYWORD_ONLY,
+                annotation=AsyncCacheStorage,
+                default=Depends(get_cache),
+            ),
+        ])
+
+        @functools.wraps(func)
+        async def wrapper(
+            *args, _request: Request, _response_cache: AsyncCacheStorage, **kwargs
+        ):
+            key = response_key(_request, kwargs)
+            value = await _response_cache.get(key)
+            cached = unpack(value) if value is not None else None
+            if cached is not None:
+                hits[endpoint] += 1
+                return to_response(_request, cached)
+
+            misses[endpoint] += 1
+            degraded.set(False)
+            sources = []
+            token = cache_sources.set(sources)
+            try:
+                async with admit(endpoint):
+                    result = await func(*args, **kwargs)
+            finally:
+                cache_sources.reset(token)
+            if isinstance(result, Response):
+                return result
+            payload = result.dict() if isinstance(result, BaseModel) else result
+            body = orjson.dumps(payload)
+            if degraded.get():
+                # данные из кэша при недоступном Elasticsearch: отдаём, но не запоминаем
+                return Response(
+                    content=body,
+                    media_type='application/json',
+                    headers={'Cache-Control': 'no-store', 'Warning': '110 - "Response is Stale"'},
+                )
+            ttl = get_cache_policy(endpoint).soft_ttl
+            if sources:
+                # ответ свеж не дольше данных, из которых собран: собранный из устаревшей
+                # записи (stale-while-revalidate) не кэшируется и уходит с max-age=0.
+                # Ключи данных живут в Redis дольше ответа, и инвалидация находит его по ним
+                ttl = min(ttl, int(min(expire_at for _, expire_at in sources) - time.time()))
+                tags = [source for source, _ in sources]
+            else:
+                tags = codecs.tags(payload)
+            cached = CachedResponse('application/json', make_etag(body), time.time() + ttl, body)
+            if ttl > 0:
+                try:
+                    await _response_cache.set(key, pack(cached), expire=ttl)
+                    await _response_cache.tag(key, tags, expire=ttl)
+                except Exception as e:
+                    logger.warning('response cache write failed %s: %s', key, e)
+            return to_response(_request, cached)
+
+        wrapper.__signature__ = signature.replace(parameters=parameters)
+        return wrapper
+
+    return decorator
+
+
+def stats() -> Dict:
+    return {
+        endpoint: {'hits': hits[endpoint], 'misses': misses[endpoint]}
+        for endpoint in sorted(set(hits) | set(misses))
+    }
@@ -3,6 +3,9 @@ from fastapi import APIRouter
 from .films import router as films_router
 from .genres import router as genres_router
 from .persons import router as persons_router
+from .search import router as search_router
+from .stats import router as stats_router
+from .suggest import router as suggest_router
 
 
 router = APIRouter()
@@ -10,3 +13,6 @@ router = APIRouter()
 router.include_router(films_router, prefix="/films", tags=['films'])
 router.include_router(genres_router, prefix="/genres", tags=['genres'])
 router.include_router(persons_router, prefix="/persons", tags=["persons"])
+router.include_router(search_router, prefix="/search", tags=["search"])
+router.include_router(stats_router, prefix="/stats", tags=["stats"])
+router.include_router(suggest_router, prefix="/suggest", tags=["suggest"])
@@ -1,57 +1,144 @@
+from contextlib import aclosing
 from http import HTTPStatus
+from typing import Optional
 
-from fastapi import APIRouter, Depends, Request, HTTPException
-from models.film import AllShortFilms, Film, FilmShort
-from models.paginators import PaginateModel
-from models.query_filters import QueryFilterModel
+import orjson
+from fastapi import APIRouter, Depends, Query, Request, HTTPException
+from fastapi.responses import StreamingResponse
+from api.admission import admission
+from api.response_cache import cached_response
+from models.film import AllShortFilms, Film, FilmIds, FilmsBatch
+from models.paginators import CursorPaginateModel, next_cursor
+from models.responses import build_response
+from models.query_filters import FILM_SEARCH_SORT, GENRE_TOP_SORT, QueryFilterModel, SortModel
 
+from services import codecs
+from services.cache_keys import cache_key, normalize_query
 from services.film import FilmService, get_film_service
+from services.genre_catalogue import GenreCatalogue, get_genre_catalogue
 
 
 router = APIRouter()
 
 
+# маршрут объявлен раньше /{film_id}, иначе export попадёт в film_id
+@router.get(
+    path='/export',
+    response_class=StreamingResponse,
+    description='Whole film catalogue as NDJSON, one film per line',
+    summary='Stream all films',
+    dependencies=[Depends(admission('films_export'))],
+)
+async def films_export(
+    fields: Optional[str] = Query(
+        default=None, description='Comma-separated film fields, all fields by default.'
+    ),
+    filter_by: QueryFilterModel = Depends(QueryFilterModel),
+    film_service: FilmService = Depends(get_film_service),
+    catalogue: GenreCatalogue = Depends(get_genre_catalogue),
+) -> StreamingResponse:
+    selected = None
+    if fields:
+        selected = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = set(selected) - set(Film.__fields__)
+        if unknown:
+            raise HTTPException(
+                status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+                detail=f'unknown fields: {", ".join(sorted(unknown))}',
+            )
+    if filter_by.filter_by_genre:
+        filter_by.filter_by_genre = catalogue.resolve_id(filter_by.filter_by_genre)
+
+    async def lines():
+        # aclosing закрывает выгрузку, а с ней и point-in-time, сразу при обрыве ответа
+        batches = film_service.export_movies(selected, filter_by.get_filter_for_elastic())
+        async with aclosing(batches):
+            async for films in batches:
+                yield b''.join(orjson.dumps(film) + b'\n' for film in films)
+
+    return StreamingResponse(lines(), media_type='application/x-ndjson')
+
+
 @router.get(
     path='/{film_id}',
     response_model=Film,
     description='Film detail informations',
     summary='Get full film info by id(uuid)',
 )
+@cached_response('film_details')
 async def film_details(
     film_id: str, film_service: FilmService = Depends(get_film_service)
 ) -> Film:
-    redis_key = f'api/v1/films/{film_id}'
+    redis_key = cache_key(f'api/v1/films/{film_id}')
     film = await film_service.get_by_id(redis_key, film_id)
     if not film:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='film not found')
-    film = Film(**film['hits']['hits'][0].get('_source'))
-    return film
+    return build_response(Film, film)
+
+
+@router.post(
+    path='/batch',
+    response_model=FilmsBatch,
+    description='Film detail informations for several films',
+    summary='Get full info of several films by ids(uuid)',
+    dependencies=[Depends(admission('films_batch'))],
+)
+async def films_batch(
+    body: FilmIds, film_service: FilmService = Depends(get_film_service)
+) -> FilmsBatch:
+    """Use {"ids": ["<uuid>", ...]}, unknown ids are returned in not_found"""
+    film_ids = list(dict.fromkeys(body.ids))
+    redis_keys = {film_id: cache_key(f'api/v1/films/{film_id}') for film_id in film_ids}
+    films = await film_service.get_by_ids(redis_keys)
+    return FilmsBatch(
+        results=[Film(**films[film_id]) for film_id in film_ids if film_id in films],
+        not_found=[film_id for film_id in film_ids if film_id not in films],
+    )
 
 
-# http://127.0.0.1:8104/api/v1/films?filter[genre]=Comedy&page[size]=3&page[number]=6&sort=-imdb_rating&sort=created
+# http://127.0.0.1:8104/api/v1/films?filter[genre]=Comedy&page[size]=3&page[number]=6&sort=-imdb_rating&sort=title
 @router.get(path='', response_model=AllShortFilms, summary='All films with main info')
+@cached_response('films')
 async def get_film_list(
     filter_by: QueryFilterModel = Depends(QueryFilterModel),
-    pagination: PaginateModel = Depends(PaginateModel),
+    sort: SortModel = Depends(SortModel),
+    pagination: CursorPaginateModel = Depends(CursorPaginateModel),
     film_service: FilmService = Depends(get_film_service),
+    catalogue: GenreCatalogue = Depends(get_genre_catalogue),
 ) -> AllShortFilms:
     """Returns list of films with id, title, imdb_rating """
-    redis_key = f'api/v1/films/pnum:{pagination.page_number}-psize:{pagination.page_size}-filter:{filter_by.filter_by_genre}:{filter_by.filter_by_director}'
+    if filter_by.filter_by_genre:
+        # в индексе фильмов жанр хранится по id, название переводим по каталогу жанров
+        filter_by.filter_by_genre = catalogue.resolve_id(filter_by.filter_by_genre)
+    pagination.check_sort(sort.fields)
+    redis_key = cache_key(
+        'api/v1/films',
+        pnum=None if pagination.cursor else pagination.page_number,
+        psize=pagination.page_size,
+        cursor=pagination.cursor,
+        genre=filter_by.filter_by_genre,
+        director=filter_by.filter_by_director,
+        sort=sort.key,
+    )
     film = await film_service.get_paginated_movies(
         redis_key,
         offset=pagination.offset,
         limit=pagination.page_size,
         filter_by=filter_by.get_filter_for_elastic(),
+        sort=sort.get_sort_for_elastic(),
+        search_after=pagination.search_after,
+        pit_id=pagination.pit_id,
     )
 
-    to_res = [FilmShort(**source['_source']) for source in film['hits']['hits']]
-    amount = film['hits']['total']['value']
-    responce = AllShortFilms(
-        page_size=pagination.page_size,
-        page_number=pagination.page_number,
-        results=to_res,
-        amount_results=amount,
-    )
+    responce = build_response(AllShortFilms, {
+        'page_size': pagination.page_size,
+        'page_number': pagination.page_number,
+        'sort': sort.get_sort_for_api(),
+        'results': film['results'],
+        'amount_results': film['total'],
+        'amount_results_display': codecs.total_display(film),
+        'next_cursor': next_cursor(film, sort.fields),
+    })
     return responce
 
 
@@ -60,26 +147,34 @@ async def get_film_list(
     response_model=AllShortFilms,
     summary='Search match films from words in query',
 )
+@cached_response('films_search')
 async def search_film_by_query(
     query: str,
-    pagination: PaginateModel = Depends(PaginateModel),
+    pagination: CursorPaginateModel = Depends(CursorPaginateModel),
     film_service: FilmService = Depends(get_film_service),
 ) -> AllShortFilms:
     """Use /?query=Matrix Revolution"""
-    redis_key = f'api/v1/films/search:query={query}:pnum={pagination.page_number}:psize={pagination.page_size}'
+    pagination.check_sort(FILM_SEARCH_SORT)
+    redis_key = cache_key(
+        'api/v1/films/search',
+        query=normalize_query(query),
+        pnum=None if pagination.cursor else pagination.page_number,
+        psize=pagination.page_size,
+        cursor=pagination.cursor,
+    )
     film = await film_service.get_items_by_query(
         redis_key=redis_key, query=query, pagination=pagination
     )
     if not film:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='film by query not found')
-    search_res = [FilmShort(**source['_source']) for source in film['hits']['hits']]
-    amount = film['hits']['total']['value']
-    responce = AllShortFilms(
-        results=search_res,
-        amount_results=amount,
-        page_size=pagination.page_size,
-        page_number=pagination.page_number,
-    )
+    responce = build_response(AllShortFilms, {
+        'results': film['results'],
+        'amount_results': film['total'],
+        'amount_results_display': codecs.total_display(film),
+        'page_size': pagination.page_size,
+        'page_number': pagination.page_number,
+        'next_cursor': next_cursor(film, FILM_SEARCH_SORT),
+    })
     return responce
 
 
@@ -90,13 +185,20 @@ async def search_film_by_query(
     response_model=AllShortFilms,
     summary='Returns top films from genre (uuid)',
 )
+@cached_response('genre_top_films')
 async def get_top_films_by_genre(
     genre_id: str,
-    pagination: PaginateModel = Depends(PaginateModel),
+    pagination: CursorPaginateModel = Depends(CursorPaginateModel),
     film_service: FilmService = Depends(get_film_service),
 ):
     """Returns list of top films of genre, sorted by imdb_rating from top to bottom rating"""
-    redis_key = f'api/v1/films/genre_top_films/{genre_id}:pnum:{pagination.page_number}-psize:{pagination.page_size}'
+    pagination.check_sort(GENRE_TOP_SORT)
+    redis_key = cache_key(
+        f'api/v1/films/genre_top_films/{genre_id}',
+        pnum=None if pagination.cursor else pagination.page_number,
+        psize=pagination.page_size,
+        cursor=pagination.cursor,
+    )
     films = await film_service.get_top_films_by_genre_id(
         redis_key=redis_key, genre_id=genre_id, pagination=pagination
     )
@@ -104,12 +206,12 @@ async def get_top_films_by_genre(
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail='top-films by genre not found'
         )
-    to_res = [FilmShort(**source['_source']) for source in films['hits']['hits']]
-    amount_match = films['hits']['total']['value']
-    result = AllShortFilms(
-        results=to_res,
-        page_number=pagination.page_number,
-        page_size=pagination.page_size,
-        amount_results=amount_match,
-    )
+    result = build_response(AllShortFilms, {
+        'results': films['results'],
+        'page_number': pagination.page_number,
+        'page_size': pagination.page_size,
+        'amount_results': films['total'],
+        'amount_results_display': codecs.total_display(films),
+        'next_cursor': next_cursor(films, GENRE_TOP_SORT),
+    })
     return result
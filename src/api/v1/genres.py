@@ -1,57 +1,83 @@
+import time
 from http import HTTPStatus
 from pprint import pprint
+from typing import Any, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import ValidationError
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from pydantic import BaseModel, ValidationError
+from api.admission import admission
+from api.response_cache import CachedResponse, make_etag, to_response
+from core.config import get_cache_policy
 from models.film import AllGenres, Genre
 from models.paginators import PaginateModel
+from models.responses import build_response
 
+from services.cache_keys import cache_key
 from services.genres import GenreService, get_genre_service
 
 
 router = APIRouter()
 
 
-@router.get(path='', response_model=AllGenres, summary='Returns all Genres')
+def snapshot_response(request: Request, endpoint: str, etag: Optional[str], output: Any) -> Response:
+    """
+    Жанры отдаются из каталога в памяти, кэш ответов в Redis им не нужен.
+    ETag строится из версии снимка каталога и параметров запроса и меняется вместе
+    со снимком; ответ из Elasticsearch (каталог не загружен) получает ETag по телу.
+    """
+    payload = output.dict() if isinstance(output, BaseModel) else output
+    body = orjson.dumps(payload)
+    expire_at = time.time() + get_cache_policy(endpoint).soft_ttl
+    return to_response(request, CachedResponse('application/json', etag or make_etag(body), expire_at, body))
+
+
+@router.get(
+    path='',
+    response_model=AllGenres,
+    summary='Returns all Genres',
+    dependencies=[Depends(admission('genres'))],
+)
 async def get_genres(
+    request: Request,
     pagination: PaginateModel = Depends(PaginateModel),
     genre_service: GenreService = Depends(get_genre_service),
 ):
     """returns genres with names and genre.uuid"""
-    redis_key = f'api/v1/genres:pnum={pagination.page_number}:psize={pagination.page_size}'
-    genres = await genre_service.get_genres(redis_key)
+    version = genre_service.catalogue_version()
+    redis_key = cache_key('api/v1/genres')
+    genres = await genre_service.get_genres(redis_key, pagination)
     if not genres:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='Genres not found')
 
-    genre_name_id = [
-        {'id': genre.get('_id'), 'name': genre.get('_source').get('name')}
-        for genre in genres['hits']['hits']
-    ]
-    output = AllGenres(results=genre_name_id)
-    return output
+    output = build_response(AllGenres, {
+        'results': [build_response(Genre, genre) for genre in genres],
+    })
+    etag = f'"genres-{version}-{pagination.page_number}-{pagination.page_size}"' if version else None
+    return snapshot_response(request, 'genres', etag, output)
 
 
-@router.get(path='/{genre_id}', response_model=Genre, summary='Get Genre')
-async def get_by_id(genre_id: str, genre_service: GenreService = Depends(get_genre_service)):
+@router.get(
+    path='/{genre_id}',
+    response_model=Genre,
+    summary='Get Genre',
+    dependencies=[Depends(admission('genre_details'))],
+)
+async def get_by_id(
+    genre_id: str, request: Request, genre_service: GenreService = Depends(get_genre_service)
+):
     """returns info about single genre"""
-    redis_key = f'api/v1/genres/{genre_id}'
+    version = genre_service.catalogue_version(genre_id)
+    redis_key = cache_key(f'api/v1/genres/{genre_id}')
     genre = await genre_service.get_genre_by_id(redis_key=redis_key, genre_id=genre_id)
-    try:
-        genre_body = genre['hits']['hits'][0]
-    except IndexError as ind_err:
-        pprint({'error': ind_err})
-        genre_body = None
-    if not genre_body:
+    if not genre:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail=f'genre with id {genre_id} not found'
         )
     try:
-        genre_body = {
-            'id': genre_body.get('_id'),
-            'name': genre_body.get('_source').get('name'),
-        }
-        output = Genre(**genre_body)
+        output = build_response(Genre, genre)
     except ValidationError as val_er:
         pprint({'val error': val_er})
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=f'{val_er.errors}')
-    return output
+    etag = f'"genre-{version}-{genre_id}"' if version else None
+    return snapshot_response(request, 'genre_details', etag, output)
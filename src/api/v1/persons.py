@@ -1,29 +1,34 @@
 import json
 from http import HTTPStatus
 from fastapi import APIRouter, Depends, HTTPException
-from models.film import Person, AllShortFilms, FilmShort, Persons
+from api.response_cache import cached_response
+from models.film import Person, AllShortFilms, Persons
 from models.paginators import PaginateModel
+from models.responses import build_response
+from services.cache_keys import cache_key, normalize_query
 from services.persons import PersonService, get_persons_service
 
 router = APIRouter()
 
 
 @router.get(path='/{person_id}', response_model=Person, summary='Get info about Person')
+@cached_response('person_details')
 async def person_details(
     person_id: str, person_service: PersonService = Depends(get_persons_service)
 ) -> Person:
     """return info about single person"""
-    redis_key = f'api/v1/persons/{person_id}'
+    redis_key = cache_key(f'api/v1/persons/{person_id}')
     person = await person_service.get_person_by_id(redis_key, person_id)
 
     if not person:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='person not found')
-    return Person(**person)
+    return build_response(Person, person)
 
 
 @router.get(
     path='/{person_id}/film/', response_model=AllShortFilms, summary='Get person films'
 )
+@cached_response('person_films')
 async def get_person_film_list(
     person_id: str,
     # sort: str = None,
@@ -34,23 +39,26 @@ async def get_person_film_list(
         returns all person roles and films by role
         example: /api/v1/persons/00395304-dd52-4c7b-be0d-c2cd7a495684/film/
     """
-    redis_key = f'api/v1/persons/{person_id}/film/'
+    redis_key = cache_key(
+        f'api/v1/persons/{person_id}/film',
+        pnum=pagination.page_number,
+        psize=pagination.page_size,
+    )
     film = await person_service.get_films_by_person_id(
         redis_key, offset=pagination.offset, limit=pagination.page_size, person_id=person_id
     )
 
-    to_res = [FilmShort(**source['_source']) for source in film]
-    amount = len(to_res)
-    responce = AllShortFilms(
-        page_size=pagination.page_size,
-        page_number=pagination.page_number,
-        results=to_res,
-        amount_results=amount,
-    )
+    responce = build_response(AllShortFilms, {
+        'page_size': pagination.page_size,
+        'page_number': pagination.page_number,
+        'results': film,
+        'amount_results': len(film),
+    })
     return responce
 
 
 @router.get(path='/search/', response_model=Persons, summary='Search match Persons')
+@cached_response('persons_search')
 async def search_persons_by_query(
     query: str,
     pagination: PaginateModel = Depends(PaginateModel),
@@ -60,7 +68,12 @@ async def search_persons_by_query(
         Returns list of matched persons from query\n
         example: persons/?query=Tom Cruse
     """
-    redis_key = f'api/v1/persons/search:query={query}:pnum={pagination.page_number}:psize={pagination.page_size}'
+    redis_key = cache_key(
+        'api/v1/persons/search',
+        query=normalize_query(query),
+        pnum=pagination.page_number,
+        psize=pagination.page_size,
+    )
     person = await person_service.search_person_by_query(
         redis_key=redis_key, query=query, pagination=pagination
     )
@@ -69,11 +82,7 @@ async def search_persons_by_query(
             status_code=HTTPStatus.NOT_FOUND, detail='persons by query not found'
         )
 
-    amount = len(person)
-    responce = Persons(
-        results=[Person(**i) for i in person],
-        amount_results=amount,
-        page_size=pagination.page_size,
-        page_number=pagination.page_number,
-    )
+    responce = build_response(Persons, {
+        'results': [build_response(Person, i) for i in person],
+    })
     return responce
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, Query
+
+from api.response_cache import cached_response
+from models.film import SearchResults
+from models.responses import build_response
+from services.cache_keys import cache_key, normalize_query
+from services.search import SearchService, get_search_service
+
+
+router = APIRouter()
+
+
+@router.get(path='', response_model=SearchResults, summary='Search films, persons and genres')
+@cached_response('search')
+async def search_everywhere(
+    query: str = Query(..., min_length=1),
+    size: int = Query(default=10, ge=1, le=50, description='Items amount in each group.'),
+    search_service: SearchService = Depends(get_search_service),
+):
+    """
+        returns top matched films, persons and genres with total matches of each
+        example: /api/v1/search?query=star
+    """
+    redis_key = cache_key('api/v1/search', query=normalize_query(query), size=size)
+    found = await search_service.search_everywhere(redis_key, query=query, size=size)
+    return build_response(SearchResults, found)
@@ -0,0 +1,76 @@
+from fastapi import APIRouter, Depends
+
+from api import admission, response_cache
+from db.breaker import BreakerSearchEngine
+from db.cache import TwoTierCache, get_cache
+from db.elastic import get_elastic
+from db.invalidation import CacheInvalidator, get_invalidator
+from db.rankings import GenreRankings, get_genre_rankings
+from db.singleflight import SingleFlight, get_single_flight
+from services.base import BaseService
+from services.genre_catalogue import GenreCatalogue, get_genre_catalogue
+
+
+router = APIRouter()
+
+
+@router.get(path='/cache', summary='Cache hit/miss counters of the current worker')
+async def cache_stats(cache: TwoTierCache = Depends(get_cache)) -> dict:
+    """returns counters of in-process (L1) and Redis (L2) cache tiers"""
+    return cache.stats()
+
+
+@router.get(path='/responses', summary='Cached API responses served by the current worker')
+async def response_cache_stats() -> dict:
+    """returns per-endpoint hits and misses of the serialized response cache"""
+    return response_cache.stats()
+
+
+@router.get(path='/admission', summary='Per-endpoint concurrency budgets of the current worker')
+async def admission_stats() -> dict:
+    """returns active, queued, admitted and shed requests for every endpoint budget"""
+    return admission.stats()
+
+
+@router.get(path='/single-flight', summary='Coalesced cache misses of the current worker')
+async def single_flight_stats(flight: SingleFlight = Depends(get_single_flight)) -> dict:
+    """returns how many cache misses went to Elasticsearch and how many waited for them"""
+    return flight.stats()
+
+
+@router.get(path='/stale', summary='Stale cached responses served by the current worker')
+async def stale_stats() -> dict:
+    """returns per-endpoint count of stale-while-revalidate responses"""
+    return dict(BaseService.stale_served)
+
+
+@router.get(path='/degraded', summary='Responses served from cache while Elasticsearch was down')
+async def degraded_stats() -> dict:
+    """returns per-endpoint count of stale or last-good responses served instead of an error"""
+    return dict(BaseService.degraded_served)
+
+
+@router.get(path='/search-engine', summary='Circuit breaker in front of Elasticsearch')
+async def search_engine_stats(text_search: BreakerSearchEngine = Depends(get_elastic)) -> dict:
+    """returns breaker state, recent failures, trips and rejected calls of the current worker"""
+    return text_search.stats()
+
+
+@router.get(path='/invalidation', summary='Cache invalidation events handled by the current worker')
+async def invalidation_stats(invalidator: CacheInvalidator = Depends(get_invalidator)) -> dict:
+    """returns how many ETL change events were received and how many keys they evicted"""
+    return invalidator.stats()
+
+
+@router.get(path='/genre-rankings', summary='Genre top-film pages served from Redis rankings')
+async def genre_rankings_stats(rankings: GenreRankings = Depends(get_genre_rankings)) -> dict:
+    """returns how many genre top pages were served from Redis and how many fell back to ES"""
+    return {**rankings.stats(), 'ready': await rankings.is_ready()}
+
+
+@router.get(path='/genre-catalogue', summary='In-memory genre catalogue of the current worker')
+async def genre_catalogue_stats(
+    catalogue: GenreCatalogue = Depends(get_genre_catalogue),
+) -> dict:
+    """returns whether the catalogue is loaded and how many times it was refreshed"""
+    return catalogue.stats()
@@ -0,0 +1,34 @@
+import time
+
+from fastapi import APIRouter, Depends, Query, Request, Response
+
+from api.admission import admission
+from api.response_cache import CachedResponse, make_etag, to_response
+from core.config import SUGGEST_CACHE_TTL
+from models.film import Suggestions
+from services.suggest import SuggestService, get_suggest_service
+
+
+router = APIRouter()
+
+
+@router.get(
+    path='',
+    response_model=Suggestions,
+    summary='Films and persons by typed prefix',
+    dependencies=[Depends(admission('suggest'))],
+)
+async def suggest(
+    request: Request,
+    prefix: str = Query(..., min_length=1, max_length=100),
+    suggest_service: SuggestService = Depends(get_suggest_service),
+) -> Response:
+    """
+        returns films (id, title) and persons (id, full_name) for search-as-you-type
+        example: /api/v1/suggest?prefix=star wa
+    """
+    body = await suggest_service.suggest(prefix)
+    # подсказки не проходят через кэш ответов, но ETag и max-age у них те же:
+    # клиент не спрашивает тот же префикс повторно, пока он свеж в памяти воркера
+    cached = CachedResponse('application/json', make_etag(body), time.time() + SUGGEST_CACHE_TTL, body)
+    return to_response(request, cached)
@@ -1,10 +1,10 @@
 import os
 
 from logging import config as logging_config
-from typing import List, Dict, Any
+from typing import List, Dict, Any, NamedTuple, Optional
 from fastapi.responses import ORJSONResponse
 from core.logger import LOGGING
-from pydantic import BaseSettings, RedisDsn, Field
+from pydantic import BaseSettings, RedisDsn, Field, validator
 
 # Применяем настройки логирования
 logging_config.dictConfig(LOGGING)
@@ -23,6 +23,96 @@ ELASTIC_PORT = int(os.getenv('ELASTIC_PORT', 9200))
 # Время жизни кэшированного запроса
 FILM_CACHE_EXPIRE_IN_SECONDS = int(os.getenv('FILM_CACHE_EXPIRE_IN_SECONDS', 60 * 5))  # 5 минут
 
+# Максимальное количество фильмов в одном запросе /api/v1/films/batch
+FILMS_BATCH_MAX_SIZE = int(os.getenv('FILMS_BATCH_MAX_SIZE', 100))
+
+# Сколько фильмов /api/v1/films/export запрашивает у Elasticsearch за раз
+FILMS_EXPORT_BATCH_SIZE = int(os.getenv('FILMS_EXPORT_BATCH_SIZE', 500))
+
+# Точный подсчёт совпадений по эндпоинтам: до порога total точный, дальше ответ «10000+».
+# Эндпоинты без порога считают совпадения точно
+SEARCH_TRACK_TOTAL_HITS = {
+    endpoint: int(limit)
+    for endpoint, limit in (
+        item.split(':')
+        for item in os.getenv(
+            'SEARCH_TRACK_TOTAL_HITS',
+            'films:10000,films_search:1000,genre_top_films:10000,search:1000',
+        ).split(',')
+        if item
+    )
+}
+# Эндпоинты, для которых результат поиска кэшируется и в shard request cache Elasticsearch
+SEARCH_REQUEST_CACHE_ENDPOINTS = os.getenv(
+    'SEARCH_REQUEST_CACHE_ENDPOINTS', 'films,genre_top_films'
+).split(',')
+
+# Бюджеты эндпоинтов на воркер в виде endpoint:одновременных запросов:длина очереди.
+# Место занято, пока ответ не отдан (у выгрузки — весь поток); эндпоинты без бюджета
+# не ограничены. Ожидающий места дольше ADMISSION_WAIT_TIMEOUT секунд запрос получает 503
+ADMISSION_BUDGETS = {
+    endpoint: (int(concurrency), int(queue_size))
+    for endpoint, concurrency, queue_size in (
+        item.split(':')
+        for item in os.getenv(
+            'ADMISSION_BUDGETS',
+            'film_details:64:256,person_details:32:128,films:16:64,genre_top_films:16:64,'
+            'films_search:8:32,persons_search:8:32,person_films:8:32,search:8:32,'
+            'genres:32:128,genre_details:32:128,suggest:32:128,films_batch:8:32,'
+            'films_export:2:0',
+        ).split(',')
+        if item
+    )
+}
+ADMISSION_WAIT_TIMEOUT = float(os.getenv('ADMISSION_WAIT_TIMEOUT', 0.5))
+ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', 1))
+
+# Подсказки /api/v1/suggest: сколько фильмов и персон отдавать, и ответы на префиксы
+# не длиннее SUGGEST_CACHE_MAX_PREFIX символов хранятся в памяти воркера
+SUGGEST_SIZE = int(os.getenv('SUGGEST_SIZE', 10))
+SUGGEST_CACHE_MAX_PREFIX = int(os.getenv('SUGGEST_CACHE_MAX_PREFIX', 3))
+SUGGEST_CACHE_TTL = int(os.getenv('SUGGEST_CACHE_TTL', 60))
+SUGGEST_CACHE_MAX_ITEMS = int(os.getenv('SUGGEST_CACHE_MAX_ITEMS', 4096))
+
+# Курсорная пагинация: закреплять обход за point-in-time (нужен Elasticsearch 7.10+)
+CURSOR_POINT_IN_TIME = os.getenv('CURSOR_POINT_IN_TIME', 'false').lower() == 'true'
+CURSOR_PIT_KEEP_ALIVE = os.getenv('CURSOR_PIT_KEEP_ALIVE', '1m')
+
+# Жёсткое время жизни записи: после мягкого TTL (FILM_CACHE_EXPIRE_IN_SECONDS) запись
+# ещё может отдаваться устаревшей, пока в фоне не обновится из Elasticsearch
+# (stale-while-revalidate), а у остальных эндпоинтов — только пока Elasticsearch недоступен
+CACHE_HARD_EXPIRE_IN_SECONDS = int(os.getenv('CACHE_HARD_EXPIRE_IN_SECONDS', 60 * 60))  # 1 час
+
+# Ответы API из данных индекса и кэша собираются без валидации pydantic,
+# в режиме отладки каждый ответ строго проверяется моделью
+RESPONSE_VALIDATION = os.getenv('DEBUG', 'false').lower() == 'true'
+
+# Версия ключей кэша: смена версии делает все ранее записанные ключи недоступными
+CACHE_KEY_VERSION = os.getenv('CACHE_KEY_VERSION', 'v1')
+
+# Эндпоинты, для которых включён режим stale-while-revalidate
+CACHE_SWR_ENDPOINTS = os.getenv(
+    'CACHE_SWR_ENDPOINTS',
+    'film_details,films,films_search,genre_top_films,genres,genre_details,'
+    'person_details,person_films,persons_search,search',
+).split(',')
+
+
+class CachePolicy(NamedTuple):
+    soft_ttl: int
+    hard_ttl: int
+    stale_while_revalidate: bool
+
+
+def get_cache_policy(endpoint: str) -> CachePolicy:
+    swr = endpoint in CACHE_SWR_ENDPOINTS
+    return CachePolicy(
+        soft_ttl=FILM_CACHE_EXPIRE_IN_SECONDS,
+        hard_ttl=CACHE_HARD_EXPIRE_IN_SECONDS,
+        stale_while_revalidate=swr,
+    )
+
+
 # Корень проекта
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -43,12 +133,72 @@ class Settings(BaseSettings):
     elastic_uri: str = ''
     ELASTIC_HOST: str = Field('127.0.0.1', env='ELASTIC_HOST')
     ELADTIC_PORT: int = Field(9200, env='ELASTIC_PORT')
+    # Пул соединений с Elasticsearch: соединений на узел и сколько держать простаивающие
+    ELASTIC_MAXSIZE: int = Field(25, env='ELASTIC_MAXSIZE')
+    ELASTIC_KEEPALIVE_TIMEOUT: float = Field(60.0, env='ELASTIC_KEEPALIVE_TIMEOUT')
+    ELASTIC_HTTP_COMPRESS: bool = Field(True, env='ELASTIC_HTTP_COMPRESS')
+    # таймаут запроса и повторы на другом узле; API только читает, повтор безопасен
+    ELASTIC_TIMEOUT: float = Field(5.0, env='ELASTIC_TIMEOUT')
+    ELASTIC_RETRY_ON_TIMEOUT: bool = Field(True, env='ELASTIC_RETRY_ON_TIMEOUT')
+    ELASTIC_MAX_RETRIES: int = Field(2, env='ELASTIC_MAX_RETRIES')
+    # обнаружение узлов кластера; в docker-compose узел один, поэтому выключено
+    ELASTIC_SNIFF_ON_START: bool = Field(False, env='ELASTIC_SNIFF_ON_START')
+    ELASTIC_SNIFF_ON_CONNECTION_FAIL: bool = Field(False, env='ELASTIC_SNIFF_ON_CONNECTION_FAIL')
+    ELASTIC_SNIFFER_TIMEOUT: Optional[float] = Field(None, env='ELASTIC_SNIFFER_TIMEOUT')
+    # сколько соединений открыть при старте
+    ELASTIC_WARMUP_CONNECTIONS: int = Field(10, env='ELASTIC_WARMUP_CONNECTIONS')
+    # Предохранитель перед Elasticsearch: размыкается, когда среди последних WINDOW вызовов
+    # (не меньше MIN_CALLS) доля отказов и вызовов дольше SLOW_CALL секунд достигла
+    # FAILURE_RATIO; разомкнутый OPEN_SECONDS секунд отвечает из кэша или 503
+    SEARCH_BREAKER_FAILURE_RATIO: float = Field(0.5, env='SEARCH_BREAKER_FAILURE_RATIO')
+    SEARCH_BREAKER_WINDOW: int = Field(20, env='SEARCH_BREAKER_WINDOW')
+    SEARCH_BREAKER_MIN_CALLS: int = Field(10, env='SEARCH_BREAKER_MIN_CALLS')
+    SEARCH_BREAKER_SLOW_CALL: float = Field(1.0, env='SEARCH_BREAKER_SLOW_CALL')
+    SEARCH_BREAKER_OPEN_SECONDS: float = Field(10.0, env='SEARCH_BREAKER_OPEN_SECONDS')
+    # общее время вызова вместе с повторами клиента: должно быть больше
+    # ELASTIC_TIMEOUT * (ELASTIC_MAX_RETRIES + 1), иначе оно обрывает повторы клиента;
+    # по умолчанию на секунду больше этого
+    SEARCH_BREAKER_CALL_TIMEOUT: Optional[float] = Field(None, env='SEARCH_BREAKER_CALL_TIMEOUT')
+
+    # L1-кэш в памяти воркера перед Redis
+    CACHE_L1_MAX_ITEMS: int = Field(2048, env='CACHE_L1_MAX_ITEMS')
+    CACHE_L1_MAX_BYTES: int = Field(64 * 1024 * 1024, env='CACHE_L1_MAX_BYTES')
+    CACHE_L1_DEFAULT_TTL: int = Field(5, env='CACHE_L1_DEFAULT_TTL')
+    # время жизни в L1 по префиксу ключа, например {"api/v1/genres": 60}
+    CACHE_L1_PREFIX_TTL: Dict[str, int] = Field(
+        {'api/v1/genres': 60, 'api/v1/films': 10, 'api/v1/persons': 10},
+        env='CACHE_L1_PREFIX_TTL',
+    )
+    # Сжатие значений в Redis: lz4, zstd или zlib; пустая строка отключает сжатие
+    CACHE_COMPRESSION: str = Field('lz4', env='CACHE_COMPRESSION')
+    CACHE_COMPRESSION_THRESHOLD: int = Field(1024, env='CACHE_COMPRESSION_THRESHOLD')
+    CACHE_COMPRESSION_LEVEL: int = Field(1, env='CACHE_COMPRESSION_LEVEL')
+    # Канал Redis, в который ETL публикует изменённые документы
+    CACHE_INVALIDATION_CHANNEL: str = Field('cache:invalidate', env='CACHE_INVALIDATION_CHANNEL')
+    # Рейтинги фильмов по жанрам в Redis считаются устаревшими, если ETL не обновлял их дольше
+    GENRE_TOP_MAX_STALENESS: int = Field(60 * 60, env='GENRE_TOP_MAX_STALENESS')
+    # Каталог жанров в памяти воркера перечитывается с этим периодом и по сообщению ETL
+    GENRE_CATALOGUE_REFRESH_INTERVAL: int = Field(5 * 60, env='GENRE_CATALOGUE_REFRESH_INTERVAL')
+    # Объединение промахов кэша: блокировка в Redis распространяет его на все воркеры
+    SINGLE_FLIGHT_REDIS_LOCK: bool = Field(False, env='SINGLE_FLIGHT_REDIS_LOCK')
+    SINGLE_FLIGHT_LOCK_TIMEOUT: float = Field(10.0, env='SINGLE_FLIGHT_LOCK_TIMEOUT')
 
     allowed_hosts: List[str] = ["*"]
 
     class Config:
          env_file = '.env'
 
+    @validator('SEARCH_BREAKER_CALL_TIMEOUT', always=True)
+    def call_timeout_covers_retries(cls, value, values):
+        client_timeout = values['ELASTIC_TIMEOUT'] * (values['ELASTIC_MAX_RETRIES'] + 1)
+        if value is None:
+            return client_timeout + 1
+        if value <= client_timeout:
+            raise ValueError(
+                f'must be greater than ELASTIC_TIMEOUT * (ELASTIC_MAX_RETRIES + 1) = {client_timeout}'
+            )
+        return value
+
     @property
     def fastapi_kwargs(self) -> Dict[str, Any]:
         return {
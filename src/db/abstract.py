@@ -1,4 +1,9 @@
 from abc import ABC, abstractmethod
+from typing import Iterable, List, Optional, Tuple
+
+
+class PointInTimeNotFound(Exception):
+    """Point-in-time из курсора истёк или никогда не существовал"""
 
 
 class AsyncCacheStorage(ABC):
@@ -9,9 +14,57 @@ class AsyncCacheStorage(ABC):
     @abstractmethod
     async def set(self, key: str, value: str, expire: int, **kwargs):
         pass
+
+    @abstractmethod
+    async def mget(self, *keys: str) -> List:
+        pass
+
+    @abstractmethod
+    async def delete(self, *keys: str):
+        pass
+
+    @abstractmethod
+    def forget(self, *keys: str):
+        """Удалить ключи только из памяти этого процесса"""
+        pass
+
+    @abstractmethod
+    async def tag(self, key: str, tags: Iterable[str], expire: int):
+        """Запомнить, что ключ содержит документы с идентификаторами tags"""
+        pass
+
+    @abstractmethod
+    async def invalidate_tags(self, tags: Iterable[str]) -> List[str]:
+        """Удалить все ключи, помеченные любым из tags, и вернуть их"""
+        pass
     
     
 class AsyncSearchEngine(ABC):
     @abstractmethod
     async def search(self,  **kwargs):
         pass
+
+    @abstractmethod
+    async def get(self, index: str, id: str, **kwargs) -> Optional[dict]:
+        """Документ по _id или None, если его нет"""
+        pass
+
+    @abstractmethod
+    async def mget(self, index: str, ids: List[str], **kwargs) -> List[dict]:
+        """Документы по списку _id в том же порядке, ненайденные помечены found=False"""
+        pass
+
+    @abstractmethod
+    async def msearch(self, searches: List[Tuple[dict, dict]], **kwargs) -> List[dict]:
+        """Несколько поисков за один запрос: пары (заголовок с индексом, тело запроса)"""
+        pass
+
+    @abstractmethod
+    async def open_point_in_time(self, index: str, keep_alive: str) -> str:
+        """Открыть point-in-time, чтобы листать индекс в неизменном состоянии"""
+        pass
+
+    @abstractmethod
+    async def close_point_in_time(self, pit_id: str) -> None:
+        """Закрыть point-in-time, не дожидаясь keep_alive"""
+        pass
@@ -0,0 +1,169 @@
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from db.abstract import AsyncSearchEngine
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class SearchEngineUnavailable(Exception):
+    """Поисковый движок не ответил вовремя или недоступен"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(SearchEngineUnavailable):
+    """Запрос не отправлялся: предохранитель разомкнут"""
+
+
+class CircuitBreaker:
+    """
+    Предохранитель по последним window вызовам. Размыкается, когда среди них
+    не меньше min_calls и доля неудачных достигла failure_ratio; неудачным считается
+    и вызов дольше slow_call секунд. Разомкнутый предохранитель сразу отклоняет вызовы,
+    через open_seconds пропускает один пробный: успех замыкает его, неудача — снова размыкает.
+    """
+
+    def __init__(
+        self,
+        failure_ratio: float = 0.5,
+        window: int = 20,
+        min_calls: int = 10,
+        slow_call: float = 1.0,
+        open_seconds: float = 10.0,
+    ):
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._trial_in_flight = False
+
+    def retry_after(self) -> int:
+        return max(int(self.opened_at + self.open_seconds - time.monotonic()) + 1, 1)
+
+    def before_call(self) -> None:
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+        if self.state == CLOSED:
+            return
+        if self.state == HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return
+        self.rejected += 1
+        raise CircuitOpenError('search engine circuit is open', self.retry_after())
+
+    def record(self, failed: bool, duration: float) -> None:
+        failed = failed or duration >= self.slow_call
+        if self.state == HALF_OPEN:
+            self._trial_in_flight = False
+            if failed:
+                self._open()
+            else:
+                self.state = CLOSED
+                self._outcomes.clear()
+            return
+        self._outcomes.append(failed)
+        failures = sum(self._outcomes)
+        if (
+            self.state == CLOSED
+            and len(self._outcomes) >= self.min_calls
+            and failures / len(self._outcomes) >= self.failure_ratio
+        ):
+            self._open()
+
+    def cancelled(self) -> None:
+        # пробный вызов отменён, не дождавшись ответа: пробным станет следующий
+        self._trial_in_flight = False
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        self._outcomes.clear()
+
+    def stats(self) -> Dict:
+        return {
+            'state': self.state,
+            'recent_calls': len(self._outcomes),
+            'recent_failures': sum(self._outcomes),
+            'trips': self.trips,
+            'rejected': self.rejected,
+            'retry_after': self.retry_after() if self.state != CLOSED else 0,
+        }
+
+
+class BreakerSearchEngine(AsyncSearchEngine):
+    """
+    AsyncSearchEngine за предохранителем. Каждый вызов ограничен call_timeout,
+    отказы движка (их определяет is_failure) и таймауты превращаются
+    в SearchEngineUnavailable, остальные ошибки (например, неверный запрос) — как есть.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncSearchEngine,
+        breaker: CircuitBreaker,
+        is_failure: Callable[[Exception], bool],
+        call_timeout: float = 5.0,
+    ):
+        self.engine = engine
+        self.breaker = breaker
+        self.is_failure = is_failure
+        self.call_timeout = call_timeout
+
+    async def _call(self, method: str, *args, **kwargs):
+        self.breaker.before_call()
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(
+                getattr(self.engine, method)(*args, **kwargs), self.call_timeout
+            )
+        except asyncio.CancelledError:
+            self.breaker.cancelled()
+            raise
+        except asyncio.TimeoutError as e:
+            self.breaker.record(True, time.monotonic() - started)
+            raise SearchEngineUnavailable(f'search engine {method} timed out') from e
+        except Exception as e:
+            failed = self.is_failure(e)
+            self.breaker.record(failed, time.monotonic() - started)
+            if failed:
+                raise SearchEngineUnavailable(f'search engine {method} failed: {e!r}') from e
+            raise
+        self.breaker.record(False, time.monotonic() - started)
+        return result
+
+    async def search(self, **kwargs):
+        return await self._call('search', **kwargs)
+
+    async def get(self, index: str, id: str, **kwargs) -> Optional[dict]:
+        return await self._call('get', index, id, **kwargs)
+
+    async def mget(self, index: str, ids: List[str], **kwargs) -> List[dict]:
+        return await self._call('mget', index, ids, **kwargs)
+
+    async def msearch(self, searches: List[Tuple[dict, dict]], **kwargs) -> List[dict]:
+        return await self._call('msearch', searches, **kwargs)
+
+    async def open_point_in_time(self, index: str, keep_alive: str) -> str:
+        return await self._call('open_point_in_time', index, keep_alive)
+
+    async def close_point_in_time(self, pit_id: str) -> None:
+        return await self._call('close_point_in_time', pit_id)
+
+    async def close(self):
+        await self.engine.close()
+
+    def stats(self) -> Dict:
+        return {**self.breaker.stats(), 'call_timeout': self.call_timeout}
@@ -0,0 +1,182 @@
+import time
+from typing import Dict, Iterable, List, Optional
+
+from db.abstract import AsyncCacheStorage
+from db.compression import Compressor
+from db.memory import MemoryCache
+
+TAG_PREFIX = 'cache:tag:'
+
+# Тег — sorted set помеченных ключей, score — момент истечения ключа. Запись убирает
+# из тега истёкшие ключи и продлевает тег, только если новый ключ живёт дольше него,
+# поэтому в теге лежат лишь живые ключи, а сам тег истекает вместе с последним из них.
+# KEYS — теги, ARGV — ключ, текущее время и момент истечения ключа
+TAG_SCRIPT = """
+local now = tonumber(ARGV[2])
+local ttl = math.ceil(tonumber(ARGV[3]) - now)
+for _, tag in ipairs(KEYS) do
+    redis.call('zremrangebyscore', tag, '-inf', ARGV[2])
+    redis.call('zadd', tag, ARGV[3], ARGV[1])
+    if redis.call('ttl', tag) < ttl then
+        redis.call('expire', tag, ttl)
+    end
+end
+return #KEYS
+"""
+
+# Забирает живые ключи тегов и удаляет сами теги за одну атомарную операцию:
+# событие ETL получает каждый воркер, но ключи достаются только первому из них
+POP_TAGS_SCRIPT = """
+local keys = {}
+for _, tag in ipairs(KEYS) do
+    for _, key in ipairs(redis.call('zrangebyscore', tag, ARGV[1], '+inf')) do
+        keys[#keys + 1] = key
+    end
+    redis.call('del', tag)
+end
+return keys
+"""
+
+
+class TwoTierCache(AsyncCacheStorage):
+    """
+    Двухуровневый кэш: L1 в памяти воркера перед общим для всех воркеров Redis (L2).
+    Время жизни ключа в L1 задаётся по префиксу ключа (побеждает самый длинный префикс),
+    0 — ключи с этим префиксом в L1 не попадают.
+    Значения в Redis сжимаются compressor, в L1 лежат уже распакованными.
+    """
+
+    def __init__(
+        self,
+        storage,
+        memory: MemoryCache,
+        prefix_ttl: Optional[Dict[str, int]] = None,
+        default_ttl: int = 0,
+        compressor: Optional[Compressor] = None,
+    ):
+        self.storage = storage
+        self.memory = memory
+        self.compressor = compressor or Compressor(codec=None)
+        self.prefix_ttl = sorted(
+            (prefix_ttl or {}).items(), key=lambda item: len(item[0]), reverse=True
+        )
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.storage_hits = 0
+        self.storage_misses = 0
+
+    def memory_ttl(self, key: str) -> int:
+        for prefix, ttl in self.prefix_ttl:
+            if key.startswith(prefix):
+                return ttl
+        return self.default_ttl
+
+    async def get(self, key: str, **kwargs):
+        ttl = self.memory_ttl(key)
+        if ttl > 0:
+            value = self.memory.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            # промахом L1 считается только ключ, который мог в нём лежать
+            self.misses += 1
+        value = self.compressor.unpack(await self.storage.get(key))
+        if value is None:
+            self.storage_misses += 1
+            return None
+        self.storage_hits += 1
+        if ttl > 0:
+            # ключ может прожить в L1 чуть дольше, чем в Redis, но не дольше ttl префикса
+            self.memory.set(key, value, ttl)
+        return value
+
+    async def set(self, key: str, value, expire: int, **kwargs):
+        if isinstance(value, str):
+            value = value.encode()
+        await self.storage.set(key, self.compressor.pack(value), expire=expire)
+        ttl = self.memory_ttl(key)
+        if ttl > 0:
+            self.memory.set(key, value, min(ttl, expire) if expire else ttl)
+
+    async def mget(self, *keys: str) -> List:
+        values = [None] * len(keys)
+        missing = []
+        for position, key in enumerate(keys):
+            if self.memory_ttl(key) <= 0:
+                missing.append(position)
+                continue
+            value = self.memory.get(key)
+            if value is None:
+                self.misses += 1
+                missing.append(position)
+            else:
+                self.hits += 1
+                values[position] = value
+        if not missing:
+            return values
+        stored = await self.storage.mget(*(keys[position] for position in missing))
+        for position, value in zip(missing, stored):
+            value = self.compressor.unpack(value)
+            if value is None:
+                self.storage_misses += 1
+                continue
+            self.storage_hits += 1
+            values[position] = value
+            ttl = self.memory_ttl(keys[position])
+            if ttl > 0:
+                self.memory.set(keys[position], value, ttl)
+        return values
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self.memory.delete(key)
+        if keys:
+            await self.storage.delete(*keys)
+
+    def forget(self, *keys: str):
+        for key in keys:
+            self.memory.delete(key)
+
+    async def tag(self, key: str, tags: Iterable[str], expire: int):
+        tags = [TAG_PREFIX + tag for tag in tags]
+        if not tags:
+            return
+        now = time.time()
+        await self.storage.eval(TAG_SCRIPT, keys=tags, args=[key, now, now + expire])
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> List[str]:
+        # ответы API помечены ключами данных, из которых собраны, поэтому ключи,
+        # найденные по тегам документов, в свою очередь служат тегами
+        evicted = []
+        tags = list(tags)
+        while tags:
+            popped = await self.storage.eval(
+                POP_TAGS_SCRIPT, keys=[TAG_PREFIX + tag for tag in tags], args=[time.time()]
+            )
+            tags = [key.decode() for key in popped]
+            evicted.extend(tags)
+        await self.delete(*evicted)
+        return evicted
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'memory_hits': self.hits,
+            'memory_misses': self.misses,
+            'memory_hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'memory_items': len(self.memory),
+            'memory_bytes': self.memory.size,
+            'memory_evictions': self.memory.evictions,
+            'storage_hits': self.storage_hits,
+            'storage_misses': self.storage_misses,
+            'compression': self.compressor.stats(),
+        }
+
+
+cache: Optional[TwoTierCache] = None
+
+
+# Функция понадобится при внедрении зависимостей
+async def get_cache() -> TwoTierCache:
+    return cache
@@ -0,0 +1,87 @@
+"""
+Сжатие значений кэша. Первый байт значения — заголовок с кодеком, поэтому сжатые
+и несжатые значения могут лежать в Redis вместе. Значения без известного заголовка
+(записанные до включения сжатия) возвращаются как есть.
+"""
+import zlib
+from typing import Optional
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover
+    lz4_frame = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+PLAIN = 0
+ZLIB = 1
+LZ4 = 2
+ZSTD = 3
+
+
+def available_codecs() -> list:
+    codecs = ['zlib']
+    if lz4_frame is not None:
+        codecs.append('lz4')
+    if zstandard is not None:
+        codecs.append('zstd')
+    return codecs
+
+
+class Compressor:
+    """
+    Сжимает значения длиннее threshold байт выбранным кодеком.
+    Если библиотека кодека не установлена, используется zlib из стандартной библиотеки.
+    """
+
+    def __init__(self, codec: Optional[str] = 'lz4', threshold: int = 1024, level: int = 1):
+        if codec not in available_codecs():
+            codec = 'zlib' if codec else None
+        self.codec = codec
+        self.threshold = threshold
+        self.level = level
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        if codec == 'zstd':
+            self._zstd_compressor = zstandard.ZstdCompressor(level=level)
+            self._zstd_decompressor = zstandard.ZstdDecompressor()
+
+    def pack(self, value: bytes) -> bytes:
+        self.raw_bytes += len(value)
+        if self.codec is None or len(value) < self.threshold:
+            packed = bytes((PLAIN,)) + value
+        elif self.codec == 'lz4':
+            packed = bytes((LZ4,)) + lz4_frame.compress(value, compression_level=self.level)
+        elif self.codec == 'zstd':
+            packed = bytes((ZSTD,)) + self._zstd_compressor.compress(value)
+        else:
+            packed = bytes((ZLIB,)) + zlib.compress(value, self.level)
+        self.stored_bytes += len(packed)
+        return packed
+
+    def unpack(self, value: Optional[bytes]) -> Optional[bytes]:
+        if not value:
+            return value
+        header, body = value[0], value[1:]
+        if header == PLAIN:
+            return body
+        if header == ZLIB:
+            return zlib.decompress(body)
+        if header == LZ4 and lz4_frame is not None:
+            return lz4_frame.decompress(body)
+        if header == ZSTD and zstandard is not None:
+            if self.codec == 'zstd':
+                return self._zstd_decompressor.decompress(body)
+            return zstandard.ZstdDecompressor().decompress(body)
+        return value
+
+    def stats(self) -> dict:
+        return {
+            'codec': self.codec,
+            'threshold': self.threshold,
+            'raw_bytes': self.raw_bytes,
+            'stored_bytes': self.stored_bytes,
+        }
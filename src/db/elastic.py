@@ -1,9 +1,124 @@
-from typing import Optional
-from elasticsearch import AsyncElasticsearch
+import asyncio
+from typing import List, Optional, Tuple
 
-es: Optional[AsyncElasticsearch] = None
+import aiohttp
+from elasticsearch import (
+    AIOHttpConnection,
+    AsyncElasticsearch,
+    ConnectionError,
+    NotFoundError,
+    RequestError,
+    TransportError,
+)
+from elasticsearch._async.http_aiohttp import ESClientResponse
+from elasticsearch.exceptions import HTTP_EXCEPTIONS
+
+from db.abstract import AsyncSearchEngine, PointInTimeNotFound
+
+
+class KeepAliveConnection(AIOHttpConnection):
+    """
+    Соединение с узлом Elasticsearch, у которого настраивается keep-alive пула.
+    Стандартное соединение создаёт TCPConnector с keepalive_timeout aiohttp
+    по умолчанию, и при паузах в нагрузке соединения закрываются и открываются заново.
+    """
+
+    def __init__(self, *args, keepalive_timeout: float = 15.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.keepalive_timeout = keepalive_timeout
+
+    async def _create_aiohttp_session(self):
+        # повторяет AIOHttpConnection._create_aiohttp_session из elasticsearch 7.9
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+        self.session = aiohttp.ClientSession(
+            headers=self.headers,
+            auto_decompress=True,
+            loop=self.loop,
+            cookie_jar=aiohttp.DummyCookieJar(),
+            response_class=ESClientResponse,
+            connector=aiohttp.TCPConnector(
+                limit=self._limit,
+                keepalive_timeout=self.keepalive_timeout,
+                use_dns_cache=True,
+                ssl=self._ssl_context,
+            ),
+        )
+
+
+def is_unavailable(error: Exception) -> bool:
+    """Отказ кластера, а не ошибка запроса: нет соединения, таймаут или ответ 5xx"""
+    if isinstance(error, ConnectionError):
+        return True
+    return isinstance(error, TransportError) and isinstance(error.status_code, int) \
+        and error.status_code >= 500
+
+
+class ElasticSearchEngine(AsyncSearchEngine):
+    """Реализация AsyncSearchEngine поверх клиента Elasticsearch"""
+
+    def __init__(self, client: AsyncElasticsearch):
+        self.client = client
+
+    async def search(self, **kwargs):
+        try:
+            return await self.client.search(**kwargs)
+        except (NotFoundError, RequestError) as e:
+            # истёкший point-in-time даёт 404, испорченный id — 400 illegal_argument_exception
+            if 'pit' in (kwargs.get('body') or {}) and (
+                isinstance(e, NotFoundError) or e.error == 'illegal_argument_exception'
+            ):
+                raise PointInTimeNotFound(str(e)) from e
+            raise
+
+    async def get(self, index: str, id: str, **kwargs) -> Optional[dict]:
+        # realtime GET идёт в один шард, в отличие от поиска по всем шардам
+        try:
+            return await self.client.get(index=index, id=id, **kwargs)
+        except NotFoundError:
+            return None
+
+    async def mget(self, index: str, ids: List[str], **kwargs) -> List[dict]:
+        result = await self.client.mget(index=index, body={'ids': ids}, **kwargs)
+        return result['docs']
+
+    async def msearch(self, searches: List[Tuple[dict, dict]], **kwargs) -> List[dict]:
+        body = []
+        for header, query in searches:
+            body.extend((header, query))
+        result = await self.client.msearch(body=body, **kwargs)
+        # _msearch отвечает 200, даже если отдельные поиски упали: ошибка поиска
+        # поднимается так же, как ошибка запроса целиком, чтобы 5xx увидел предохранитель,
+        # а пустой результат вместо ошибки не попал в кэш
+        for response in result['responses']:
+            if 'error' in response:
+                status = response.get('status', 500)
+                error = response['error']
+                error_type = error.get('type') if isinstance(error, dict) else error
+                raise HTTP_EXCEPTIONS.get(status, TransportError)(status, error_type, response)
+        return result['responses']
+
+    async def open_point_in_time(self, index: str, keep_alive: str) -> str:
+        # point-in-time появился в Elasticsearch 7.10, в клиенте 7.9 для него нет метода
+        result = await self.client.transport.perform_request(
+            'POST', f'/{index}/_pit', params={'keep_alive': keep_alive}
+        )
+        return result['id']
+
+    async def close_point_in_time(self, pit_id: str) -> None:
+        await self.client.transport.perform_request('DELETE', '/_pit', body={'id': pit_id})
+
+    async def warm_up(self, connections: int) -> bool:
+        """Открывает соединения пула заранее, чтобы первые запросы не ждали их установки"""
+        results = await asyncio.gather(*(self.client.ping() for _ in range(connections)))
+        return all(results)
+
+    async def close(self):
+        await self.client.close()
+
+
+es: Optional[ElasticSearchEngine] = None
 
 # Функция понадобится при внедрении зависимостей
-def get_elastic() -> AsyncElasticsearch:
+def get_elastic() -> ElasticSearchEngine:
     return es
-
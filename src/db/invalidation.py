@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+import aioredis
+import orjson
+
+from db.abstract import AsyncCacheStorage
+
+logger = logging.getLogger(__name__)
+
+Listener = Callable[[str, List[str]], Awaitable[None]]
+
+
+class CacheInvalidator:
+    """
+    Слушает канал Redis, в который ETL после каждого успешного bulk публикует
+    изменённые документы: {"index": "movies", "ids": [...]}.
+    Удаляет ключи кэша, помеченные этими идентификаторами, и оповещает подписчиков.
+    Теги атомарно забирает первый получивший событие воркер: он удаляет ключи из Redis
+    и публикует в тот же канал {"keys": [...]}, по которому все воркеры чистят свой L1.
+    Оборванная подписка восстанавливается с паузой от min_backoff до max_backoff секунд.
+    """
+
+    def __init__(
+        self,
+        cache: AsyncCacheStorage,
+        publisher: aioredis.Redis,
+        address: tuple,
+        channel: str,
+        min_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ):
+        self.cache = cache
+        self.publisher = publisher
+        self.address = address
+        self.channel = channel
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.connected = False
+        self.reconnects = 0
+        self.messages = 0
+        self.evicted = 0
+        self.forgotten = 0
+        self._listeners: List[Listener] = []
+        self._connection: Optional[aioredis.Redis] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def add_listener(self, listener: Listener) -> None:
+        self._listeners.append(listener)
+
+    async def start(self) -> None:
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        backoff = self.min_backoff
+        while True:
+            try:
+                # для подписки нужно отдельное соединение, его нельзя брать из общего пула
+                self._connection = await aioredis.create_redis(self.address)
+                channel, = await self._connection.subscribe(self.channel)
+                self.connected = True
+                backoff = self.min_backoff
+                await self._listen(channel)
+                logger.warning('cache invalidation channel %s closed', self.channel)
+            except (OSError, aioredis.RedisError) as e:
+                logger.warning('cache invalidation channel %s failed: %r', self.channel, e)
+            finally:
+                self.connected = False
+                if self._connection is not None:
+                    self._connection.close()
+                    await self._connection.wait_closed()
+                    self._connection = None
+            # пока подписки нет, события ETL теряются: ключи доживут до своего TTL
+            logger.warning('resubscribing to %s in %.1fs', self.channel, backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+            self.reconnects += 1
+
+    async def _listen(self, channel) -> None:
+        while await channel.wait_message():
+            message = await channel.get()
+            try:
+                event = orjson.loads(message)
+                if 'keys' in event:
+                    self.forget(event['keys'])
+                else:
+                    await self.invalidate(event['index'], event['ids'])
+            except Exception as e:
+                logger.warning('cache invalidation failed for %r: %r', message, e)
+
+    async def invalidate(self, index: str, ids: List[str]) -> None:
+        self.messages += 1
+        # сначала обновляются снимки в памяти (каталог жанров), потом удаляются ключи:
+        # иначе запрос между удалением и обновлением снова запишет в кэш старые данные
+        for listener in self._listeners:
+            await listener(index, ids)
+        keys = await self.cache.invalidate_tags(ids)
+        if keys:
+            self.evicted += len(keys)
+            await self.publisher.publish(self.channel, orjson.dumps({'keys': keys}))
+
+    def forget(self, keys: List[str]) -> None:
+        self.forgotten += len(keys)
+        self.cache.forget(*keys)
+
+    def stats(self) -> dict:
+        return {
+            'channel': self.channel,
+            'connected': self.connected,
+            'reconnects': self.reconnects,
+            'messages': self.messages,
+            'evicted_keys': self.evicted,
+            'forgotten_keys': self.forgotten,
+        }
+
+
+invalidator: Optional[CacheInvalidator] = None
+
+
+# Функция понадобится при внедрении зависимостей
+async def get_invalidator() -> CacheInvalidator:
+    return invalidator
@@ -0,0 +1,52 @@
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class MemoryCache:
+    """
+    LRU-кэш в памяти процесса с TTL на каждый ключ.
+    Ограничен как по количеству ключей, так и по суммарному размеру значений в байтах:
+    при превышении любого из лимитов вытесняются самые давно использованные ключи.
+    """
+
+    def __init__(self, max_items: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._data: 'OrderedDict[str, Tuple[float, bytes]]' = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expire_at, value = item
+        if expire_at <= time.monotonic():
+            self.delete(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: bytes, expire: int) -> None:
+        self.delete(key)
+        if expire <= 0 or len(value) > self.max_bytes:
+            return
+        self._data[key] = (time.monotonic() + expire, value)
+        self.size += len(value)
+        while len(self._data) > self.max_items or self.size > self.max_bytes:
+            _, (_, evicted) = self._data.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.size -= len(item[1])
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,69 @@
+import time
+from typing import Dict, Optional
+
+import orjson
+from aioredis import Redis
+
+# Ключи материализованных рейтингов, которые ведёт ETL (см. ETL.update_genre_rankings)
+GENRE_TOP_KEY = 'genre_top:{}'
+GENRE_TOP_BUILT_KEY = 'genre_top:built'
+GENRE_TOP_UPDATED_KEY = 'genre_top:updated'
+FILM_SHORT_KEY = 'films_short'
+
+
+class GenreRankings:
+    """
+    Топ фильмов жанра из Redis: sorted set genre_top:<genre_id> с отрицательным рейтингом
+    в качестве score (ZRANGE даёт порядок «рейтинг по убыванию, id по возрастанию», как
+    сортировка в Elasticsearch) и hash films_short с короткими карточками фильмов.
+    """
+
+    def __init__(self, redis: Redis, max_staleness: int):
+        self.redis = redis
+        self.max_staleness = max_staleness
+        self.hits = 0
+        self.fallbacks = 0
+
+    async def is_ready(self) -> bool:
+        """Представление построено полным проходом ETL и обновлялось не слишком давно"""
+        built, updated = await self.redis.mget(GENRE_TOP_BUILT_KEY, GENRE_TOP_UPDATED_KEY)
+        if built is None or updated is None:
+            return False
+        return time.time() - float(updated) <= self.max_staleness
+
+    async def top_films(self, genre_id: str, offset: int, limit: int) -> Optional[Dict]:
+        """Страница в формате codecs.film_page или None, если представлению нельзя верить"""
+        if not await self.is_ready():
+            self.fallbacks += 1
+            return None
+        key = GENRE_TOP_KEY.format(genre_id)
+        pipe = self.redis.pipeline()
+        pipe.zcard(key)
+        pipe.zrange(key, offset, offset + limit - 1, withscores=True, encoding='utf-8')
+        total, ranked = await pipe.execute()
+        if not total:
+            self.fallbacks += 1
+            return None
+        self.hits += 1
+        page = {'total': total, 'results': []}
+        if not ranked:
+            return page
+        payloads = await self.redis.hmget(FILM_SHORT_KEY, *(film_id for film_id, _ in ranked))
+        page['results'] = [orjson.loads(payload) for payload in payloads if payload]
+        if len(ranked) == limit:
+            # search_after для продолжения обхода курсором через Elasticsearch
+            last_id, last_score = ranked[-1]
+            page['after'] = [-last_score, last_id]
+            page['pit'] = None
+        return page
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'fallbacks': self.fallbacks}
+
+
+genre_rankings: Optional[GenreRankings] = None
+
+
+# Функция понадобится при внедрении зависимостей
+async def get_genre_rankings() -> GenreRankings:
+    return genre_rankings
@@ -0,0 +1,106 @@
+import asyncio
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aioredis import Redis
+
+# Удаляем блокировку, только если она всё ещё наша
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Объединяет конкурентные промахи кэша по одному ключу: в воркере выполняется
+    только один запрос в поисковый движок, остальные ждут его результат.
+    Если передан Redis, то дополнительно берётся распределённая блокировка, и воркеры,
+    не получившие её, ждут появления значения в кэше вместо собственного запроса.
+    """
+
+    def __init__(
+        self,
+        lock_storage: Optional[Redis] = None,
+        lock_timeout: float = 10.0,
+        poll_interval: float = 0.05,
+    ):
+        self.lock_storage = lock_storage
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.leaders = 0
+        self.coalesced = 0
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        reload: Optional[Callable[[], Awaitable[Any]]] = None,
+    ):
+        """
+        :param fetch: загружает значение из источника и кладёт его в кэш
+        :param reload: перечитывает значение из кэша (нужно для режима с блокировкой в Redis)
+        """
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(self._run(key, fetch, reload))
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        # отмена одного из ожидающих запросов не должна отменять общую загрузку
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Future) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    async def _run(self, key, fetch, reload):
+        if self.lock_storage is None or reload is None:
+            return await fetch()
+
+        lock_key = f'lock:{key}'
+        token = uuid.uuid4().hex
+        acquired = await self.lock_storage.set(
+            lock_key,
+            token,
+            pexpire=int(self.lock_timeout * 1000),
+            exist=Redis.SET_IF_NOT_EXIST,
+        )
+        if acquired:
+            try:
+                return await fetch()
+            finally:
+                await self.lock_storage.eval(RELEASE_LOCK_SCRIPT, keys=[lock_key], args=[token])
+
+        # значение уже загружает другой воркер, ждём его в кэше
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + self.lock_timeout
+        while loop.time() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            value = await reload()
+            if value is not None:
+                return value
+            if not await self.lock_storage.exists(lock_key):
+                break
+        return await fetch()
+
+    def stats(self) -> Dict:
+        return {
+            'leaders': self.leaders,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._calls),
+            'redis_lock': self.lock_storage is not None,
+        }
+
+
+single_flight: Optional[SingleFlight] = None
+
+
+# Функция понадобится при внедрении зависимостей
+async def get_single_flight() -> SingleFlight:
+    return single_flight
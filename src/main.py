@@ -3,13 +3,24 @@ import logging
 import aioredis
 import uvicorn
 from elasticsearch import AsyncElasticsearch
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.responses import ORJSONResponse
 
 from api import router as api_router
+from api.admission import Overloaded
 from core import config
 from core.logger import LOGGING
-from db import elastic, redis
+from db import cache, elastic, invalidation, rankings, redis, singleflight
+from db.breaker import BreakerSearchEngine, CircuitBreaker, SearchEngineUnavailable
+from db.cache import TwoTierCache
+from db.compression import Compressor
+from db.elastic import ElasticSearchEngine, KeepAliveConnection, is_unavailable
+from db.invalidation import CacheInvalidator
+from db.memory import MemoryCache
+from db.rankings import GenreRankings
+from db.singleflight import SingleFlight
+from services import genre_catalogue
+from services.genre_catalogue import GenreCatalogue
 
 settings = config.Settings()
 
@@ -20,16 +31,94 @@ async def startup():
     redis.redis = await aioredis.create_redis_pool(
         (settings.REDIS_HOST, settings.REDIS_PORT), minsize=10, maxsize=20
     )
-    elastic.es = AsyncElasticsearch(hosts=[f'{settings.ELASTIC_HOST}:{settings.ELADTIC_PORT}'])
+    cache.cache = TwoTierCache(
+        redis.redis,
+        MemoryCache(settings.CACHE_L1_MAX_ITEMS, settings.CACHE_L1_MAX_BYTES),
+        prefix_ttl=settings.CACHE_L1_PREFIX_TTL,
+        default_ttl=settings.CACHE_L1_DEFAULT_TTL,
+        compressor=Compressor(
+            settings.CACHE_COMPRESSION or None,
+            threshold=settings.CACHE_COMPRESSION_THRESHOLD,
+            level=settings.CACHE_COMPRESSION_LEVEL,
+        ),
+    )
+    invalidation.invalidator = CacheInvalidator(
+        cache.cache,
+        redis.redis,
+        (settings.REDIS_HOST, settings.REDIS_PORT),
+        settings.CACHE_INVALIDATION_CHANNEL,
+    )
+    await invalidation.invalidator.start()
+    rankings.genre_rankings = GenreRankings(redis.redis, settings.GENRE_TOP_MAX_STALENESS)
+    singleflight.single_flight = SingleFlight(
+        redis.redis if settings.SINGLE_FLIGHT_REDIS_LOCK else None,
+        lock_timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT,
+    )
+    engine = ElasticSearchEngine(
+        AsyncElasticsearch(
+            hosts=[f'{settings.ELASTIC_HOST}:{settings.ELADTIC_PORT}'],
+            connection_class=KeepAliveConnection,
+            maxsize=settings.ELASTIC_MAXSIZE,
+            keepalive_timeout=settings.ELASTIC_KEEPALIVE_TIMEOUT,
+            http_compress=settings.ELASTIC_HTTP_COMPRESS,
+            timeout=settings.ELASTIC_TIMEOUT,
+            retry_on_timeout=settings.ELASTIC_RETRY_ON_TIMEOUT,
+            max_retries=settings.ELASTIC_MAX_RETRIES,
+            sniff_on_start=settings.ELASTIC_SNIFF_ON_START,
+            sniff_on_connection_fail=settings.ELASTIC_SNIFF_ON_CONNECTION_FAIL,
+            sniffer_timeout=settings.ELASTIC_SNIFFER_TIMEOUT,
+        )
+    )
+    if not await engine.warm_up(settings.ELASTIC_WARMUP_CONNECTIONS):
+        logging.getLogger(__name__).warning('Elasticsearch is not reachable at startup')
+    elastic.es = BreakerSearchEngine(
+        engine,
+        CircuitBreaker(
+            failure_ratio=settings.SEARCH_BREAKER_FAILURE_RATIO,
+            window=settings.SEARCH_BREAKER_WINDOW,
+            min_calls=settings.SEARCH_BREAKER_MIN_CALLS,
+            slow_call=settings.SEARCH_BREAKER_SLOW_CALL,
+            open_seconds=settings.SEARCH_BREAKER_OPEN_SECONDS,
+        ),
+        is_unavailable,
+        call_timeout=settings.SEARCH_BREAKER_CALL_TIMEOUT,
+    )
+    genre_catalogue.genre_catalogue = GenreCatalogue(
+        elastic.es, settings.GENRE_CATALOGUE_REFRESH_INTERVAL
+    )
+    await genre_catalogue.genre_catalogue.start()
+    invalidation.invalidator.add_listener(genre_catalogue.genre_catalogue.on_change)
 
 
 @app.on_event('shutdown')
 async def shutdown():
+    await invalidation.invalidator.stop()
+    await genre_catalogue.genre_catalogue.stop()
     redis.redis.close()
     await redis.redis.wait_closed()
     await elastic.es.close()
 
 
+@app.exception_handler(SearchEngineUnavailable)
+async def search_engine_unavailable(request: Request, exc: SearchEngineUnavailable):
+    # ни кэша, ни ответа Elasticsearch: клиенту быстрый отказ вместо ожидания
+    return ORJSONResponse(
+        status_code=503,
+        content={'detail': 'search engine is unavailable'},
+        headers={'Retry-After': str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(Overloaded)
+async def overloaded(request: Request, exc: Overloaded):
+    # бюджет эндпоинта исчерпан: отказ сразу, пока очередь не растянула задержки
+    return ORJSONResponse(
+        status_code=503,
+        content={'detail': str(exc)},
+        headers={'Retry-After': str(exc.retry_after)},
+    )
+
+
 app.include_router(api_router, prefix='/api', tags=['v1'])
 
 if __name__ == '__main__':
@@ -3,6 +3,8 @@ import orjson
 import uuid
 from pydantic import BaseModel, Field
 
+from core.config import FILMS_BATCH_MAX_SIZE
+
 
 def orjson_dumps(v, *, default):
     # orjson.dumps возвращает bytes, а pydantic требует unicode, поэтому декодируем
@@ -42,6 +44,20 @@ class Film(UUIDMixin):
     writers: Optional[List[UUIDNameMixin]] = []
 
 
+class FilmIds(BaseOrjsonModel):
+    """
+        Тело запроса карточек нескольких фильмов.
+        POST /api/v1/films/batch
+    """
+
+    ids: List[str] = Field(..., min_items=1, max_items=FILMS_BATCH_MAX_SIZE)
+
+
+class FilmsBatch(BaseOrjsonModel):
+    results: List[Film] = []
+    not_found: List[str] = []
+
+
 class FilmShort(UUIDMixin):
     """
        Поиск, фильтр и отображение фильмов на главной странице.
@@ -67,6 +83,10 @@ class AllShortFilms(BaseOrjsonModel):
     sort: Optional[dict] = {}
     results: List[FilmShort]
     amount_results: Optional[int] = 0
+    # amount_results для показа: «10000+», если точный подсчёт ограничен порогом
+    amount_results_display: Optional[str] = None
+    # курсор следующей страницы для page[cursor], None на последней странице
+    next_cursor: Optional[str] = None
 
 
 class ByRoles(BaseOrjsonModel):
@@ -91,6 +111,53 @@ class AllGenres(BaseOrjsonModel):
     results: List[Genre] = []
 
 
+class PersonShort(UUIDMixin):
+    full_name: str
+
+
+class FilmSuggestion(UUIDMixin):
+    title: str
+
+
+class Suggestions(BaseOrjsonModel):
+    """
+        Подсказки при наборе текста.
+        /api/v1/suggest?prefix=<text>
+    """
+
+    films: List[FilmSuggestion] = []
+    persons: List[PersonShort] = []
+
+
+class FilmsFound(BaseOrjsonModel):
+    total: int = 0
+    total_display: Optional[str] = None
+    results: List[FilmShort] = []
+
+
+class PersonsFound(BaseOrjsonModel):
+    total: int = 0
+    total_display: Optional[str] = None
+    results: List[PersonShort] = []
+
+
+class GenresFound(BaseOrjsonModel):
+    total: int = 0
+    total_display: Optional[str] = None
+    results: List[Genre] = []
+
+
+class SearchResults(BaseOrjsonModel):
+    """
+        Поиск сразу по фильмам, персонам и жанрам.
+        /api/v1/search?query=<text>
+    """
+
+    films: FilmsFound = FilmsFound()
+    persons: PersonsFound = PersonsFound()
+    genres: GenresFound = GenresFound()
+
+
 class GenrePopularFilms(Genre):
     """
         Популярные фильмы в жанре.
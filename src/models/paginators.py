@@ -1,6 +1,49 @@
-from typing import Optional
+import base64
+import binascii
+from http import HTTPStatus
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-from fastapi import Query
+import orjson
+from fastapi import HTTPException, Query
+
+
+# Типы значений search_after по полю сортировки API; после них всегда идёт id фильма
+CURSOR_VALUE_TYPES = {'imdb_rating': (int, float), 'title': (str,), '_score': (int, float)}
+
+
+def encode_cursor(search_after: List, pit_id: Optional[str], sort: Sequence[str]) -> str:
+    """
+    Непрозрачный курсор: значения сортировки последнего документа, id point-in-time
+    и сортировка, для которой выдан курсор
+    """
+    payload = orjson.dumps({'after': search_after, 'pit': pit_id, 'sort': ','.join(sort)})
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def next_cursor(page: dict, sort: Sequence[str]) -> Optional[str]:
+    """Курсор следующей страницы для страницы, закэшированной сервисом"""
+    if not page.get('after'):
+        return None
+    return encode_cursor(page['after'], page.get('pit'), sort)
+
+
+def decode_cursor(cursor: str) -> Tuple[List, Optional[str], Optional[str]]:
+    try:
+        payload = orjson.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return list(payload['after']), payload.get('pit'), payload.get('sort')
+    except (binascii.Error, ValueError, TypeError, KeyError, AttributeError):
+        raise HTTPException(status_code=HTTPStatus.UNPROCESSABLE_ENTITY, detail='invalid cursor')
+
+
+def cursor_matches(search_after: List, sort: Sequence[str]) -> bool:
+    """Значения search_after подходят сортировке: по одному на поле и id, нужных типов"""
+    if len(search_after) != len(sort) + 1:
+        return False
+    types = [CURSOR_VALUE_TYPES.get(field.lstrip('-'), ()) for field in sort] + [(str,)]
+    return all(
+        value is None or (isinstance(value, value_types) and not isinstance(value, bool))
+        for value, value_types in zip(search_after, types)
+    )
 
 
 class PaginateModel:
@@ -24,6 +67,18 @@ class PaginateModel:
         self.page_size = page_size
         self.limit = page_size
         self.offset = (self.limit * self.page_number) - self.page_size
+        self.cursor = None
+        self.search_after = None
+        self.pit_id = None
+
+    @property
+    def cache_params(self) -> Dict[str, Any]:
+        """Параметры для ключа кэша ответа; с курсором номер страницы не важен"""
+        return {
+            'pnum': None if self.cursor else self.page_number,
+            'psize': self.page_size,
+            'cursor': self.cursor,
+        }
 
     def paginate_list(self, obj: list):
         stop = self.limit * self.page_number
@@ -36,3 +91,47 @@ class PaginateModel:
             return value
         else:
             return int(value) + 1
+
+
+class CursorPaginateModel(PaginateModel):
+    """Пагинация по номеру страницы или по курсору (search_after) для глубоких страниц"""
+
+    def __init__(
+        self,
+        page_size: Optional[int] = Query(
+            default=50,
+            ge=1,  # greater than or equal
+            le=100,  # less than or equal
+            alias='page[size]',
+            description='Items amount on page.',
+        ),
+        page_number: Optional[int] = Query(
+            default=1,
+            ge=1,  # greater than or equal
+            alias='page[number]',
+            description='Page number for pagination.',
+        ),
+        cursor: Optional[str] = Query(
+            default=None,
+            alias='page[cursor]',
+            description='next_cursor from the previous page, page[number] is ignored.',
+        ),
+    ):
+        super().__init__(page_size, page_number)
+        self.cursor = cursor
+        self.cursor_sort = None
+        if cursor:
+            self.search_after, self.pit_id, self.cursor_sort = decode_cursor(cursor)
+
+    def check_sort(self, sort: Sequence[str]) -> None:
+        """
+        Курсор годится только для сортировки, с которой он выдан: иначе search_after
+        не совпадёт с полями сортировки и Elasticsearch отклонит запрос
+        """
+        if self.cursor is None:
+            return
+        if self.cursor_sort != ','.join(sort) or not cursor_matches(self.search_after, sort):
+            raise HTTPException(
+                status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+                detail='cursor was issued for another sort',
+            )
@@ -1,6 +1,15 @@
 from collections import namedtuple
-from typing import Optional
-from fastapi import Query
+from http import HTTPStatus
+from typing import Dict, List, Optional
+from fastapi import HTTPException, Query
+
+# поле сортировки в API и поле индекса movies, по которому сортирует Elasticsearch
+FILM_SORT_FIELDS = {'imdb_rating': 'imdb_rating', 'title': 'title.raw'}
+# сортировка по умолчанию совпадает с сортировкой индекса (index.sort)
+FILM_DEFAULT_SORT = ('-imdb_rating',)
+# сортировки списков без параметра sort, к ним привязаны курсоры этих списков
+FILM_SEARCH_SORT = ('-_score',)
+GENRE_TOP_SORT = ('-imdb_rating',)
 
 
 class QueryFilterModel:
@@ -13,6 +22,10 @@ class QueryFilterModel:
         self.filter_by_genre = filter_by_genre
         self.filter_by_director = filter_by_director
 
+    @property
+    def cache_params(self) -> Dict[str, Optional[str]]:
+        return {'genre': self.filter_by_genre, 'director': self.filter_by_director}
+
     def check_if_filter(self) -> namedtuple:
         filter_selector = {'genre': self.filter_by_genre, 'director': self.filter_by_director}
         for name, value in filter_selector.items():
@@ -26,3 +39,52 @@ class QueryFilterModel:
         if filter_by is not None:
             return {filter_by.name: filter_by.value}
         return None
+
+
+class SortModel:
+    """
+    Сортировка по нескольким полям: sort=-imdb_rating&sort=title или sort=-imdb_rating,title.
+    Минус перед полем — по убыванию. Повторы полей отбрасываются.
+    """
+
+    def __init__(
+        self,
+        sort: Optional[List[str]] = Query(
+            default=None,
+            description=f'Sort fields: {", ".join(FILM_SORT_FIELDS)}, "-" for descending.',
+        ),
+    ):
+        fields = []
+        for item in sort or []:
+            for field in item.split(','):
+                field = field.strip()
+                if field and field.lstrip('-') not in {f.lstrip('-') for f in fields}:
+                    fields.append(field)
+        unknown = [field for field in fields if field.lstrip('-') not in FILM_SORT_FIELDS]
+        if unknown:
+            raise HTTPException(
+                status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+                detail=f'unknown sort fields: {", ".join(unknown)}',
+            )
+        self.fields = tuple(fields) or FILM_DEFAULT_SORT
+
+    @property
+    def key(self) -> Optional[str]:
+        """Сортировка для ключа кэша, None для сортировки по умолчанию"""
+        if self.fields == FILM_DEFAULT_SORT:
+            return None
+        return ','.join(self.fields)
+
+    @property
+    def cache_params(self) -> Dict[str, Optional[str]]:
+        return {'sort': self.key}
+
+    def get_sort_for_api(self) -> Dict[str, str]:
+        return {
+            field.lstrip('-'): 'desc' if field.startswith('-') else 'asc' for field in self.fields
+        }
+
+    def get_sort_for_elastic(self) -> List[Dict[str, str]]:
+        return [
+            {FILM_SORT_FIELDS[name]: order} for name, order in self.get_sort_for_api().items()
+        ]
@@ -0,0 +1,28 @@
+"""
+Быстрая сборка ответов API из доверенных данных: документов нашего индекса и записей
+нашего кэша, которые кодеки сервисов уже привели к полям моделей.
+Ответ собирается обычным dict по полям модели и сериализуется orjson напрямую,
+без создания вложенных pydantic-моделей. В режиме отладки ответ строится моделью
+с полной валидацией.
+"""
+from functools import lru_cache
+from typing import Any, Dict, Type, Union
+
+from pydantic import BaseModel
+
+from core.config import RESPONSE_VALIDATION
+
+
+@lru_cache()
+def _defaults(model: Type[BaseModel]) -> Dict[str, Any]:
+    return {
+        name: field.get_default() for name, field in model.__fields__.items() if not field.required
+    }
+
+
+def build_response(model: Type[BaseModel], data: Dict) -> Union[BaseModel, Dict]:
+    """Поля модели из data, отсутствующие поля — значения по умолчанию модели"""
+    if RESPONSE_VALIDATION:
+        return model(**data)
+    defaults = _defaults(model)
+    return {name: data[name] if name in data else defaults.get(name) for name in model.__fields__}
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+from core.config import CachePolicy, get_cache_policy
+from db.abstract import AsyncCacheStorage
+from db.abstract import AsyncSearchEngine
+from db.breaker import SearchEngineUnavailable
+from db.singleflight import SingleFlight
+from services import codecs
+
+logger = logging.getLogger(__name__)
+
+# выставляется, когда запрос обслужен устаревшими данными из-за недоступности Elasticsearch;
+# такой ответ не сохраняется в кэше ответов
+degraded: ContextVar[bool] = ContextVar('degraded', default=False)
+# ключи кэша, из которых собран ответ, с моментом, до которого свежи их данные;
+# кэш ответов помечает ответ этими ключами и не хранит его дольше этого момента
+cache_sources: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar(
+    'cache_sources', default=None
+)
+
+
+class BaseService:
+    """Общая для сервисов работа с кэшем: чтение, запись и загрузка при промахе."""
+
+    # сколько раз каждый эндпоинт отдал устаревшую запись, общий для всех сервисов
+    stale_served: Counter = Counter()
+    # сколько раз эндпоинт ответил из кэша, потому что Elasticsearch недоступен
+    degraded_served: Counter = Counter()
+    # ссылки на фоновые обновления, чтобы задачи не собрал сборщик мусора
+    _refresh_tasks: Set[asyncio.Task] = set()
+
+    def __init__(
+        self, cache: AsyncCacheStorage, text_search: AsyncSearchEngine, flight: SingleFlight,
+    ):
+        self.cache = cache
+        self.text_search = text_search
+        self.flight = flight
+
+    async def _get_or_load(
+        self, redis_key: str, load: Callable[[], Awaitable[Any]], endpoint: str
+    ):
+        """
+        Возвращает значение из кэша, а при промахе загружает его через load.
+        Конкурентные промахи по одному ключу объединяются в одну загрузку.
+        Если для эндпоинта включён stale-while-revalidate, то запись после мягкого TTL
+        отдаётся сразу, а в фоне запускается одно обновление из источника.
+        Если Elasticsearch недоступен, отдаётся устаревшая запись, пока она не удалена
+        по жёсткому TTL, а без неё ошибка SearchEngineUnavailable уходит выше.
+        """
+        policy = get_cache_policy(endpoint)
+
+        async def fetch():
+            result = await load()
+            if result is not None:
+                await self._put_result_to_cache(redis_key, result, policy)
+            return result
+
+        entry = await self._from_cache(redis_key)
+        if entry is not None:
+            data, expire_at = entry
+            if expire_at > time.time():
+                self._used(redis_key, expire_at)
+                return data
+            if policy.stale_while_revalidate:
+                self.stale_served[endpoint] += 1
+                self._revalidate(redis_key, fetch)
+                self._used(redis_key, expire_at)
+                return data
+
+        try:
+            result = await self.flight.do(
+                redis_key, fetch, lambda: self._fresh_from_cache(redis_key)
+            )
+        except SearchEngineUnavailable:
+            if entry is None:
+                raise
+            self.degraded_served[endpoint] += 1
+            degraded.set(True)
+            return entry[0]
+        self._used(redis_key, time.time() + policy.soft_ttl)
+        return result
+
+    @staticmethod
+    def _used(redis_key: str, expire_at: float) -> None:
+        sources = cache_sources.get()
+        if sources is not None:
+            sources.append((redis_key, expire_at))
+
+    def _revalidate(self, redis_key: str, fetch: Callable[[], Awaitable[Any]]) -> None:
+        task = asyncio.ensure_future(self.flight.do(redis_key, fetch))
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_done)
+
+    def _refresh_done(self, task: asyncio.Task) -> None:
+        self._refresh_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning('background cache refresh failed: %r', task.exception())
+
+    async def _fresh_from_cache(self, redis_key: str):
+        entry = await self._from_cache(redis_key)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[0]
+
+    async def _from_cache(self, redis_key: str) -> Optional[tuple]:
+        """Возвращает пару (данные, момент истечения мягкого TTL) или None."""
+        return self._decode(redis_key, await self.cache.get(redis_key))
+
+    async def _many_from_cache(self, redis_keys: List[str]) -> List[Optional[tuple]]:
+        """То же, что _from_cache, но для списка ключей за один MGET."""
+        values = await self.cache.mget(*redis_keys)
+        return [self._decode(key, data) for key, data in zip(redis_keys, values)]
+
+    @staticmethod
+    def _decode(redis_key: str, data) -> Optional[tuple]:
+        if data is None:
+            return None
+        try:
+            return codecs.decode(data)
+        except ValueError as out_e:
+            logger.warning('broken cache value %s: %s', redis_key, out_e)
+            return None
+
+    async def _put_result_to_cache(self, redis_key: str, data, policy: CachePolicy):
+        # Сохраняем данные вместе с моментом истечения мягкого TTL, используя команду set
+        # https://redis.io/commands/set
+        if data:
+            try:
+                d = codecs.encode(data, time.time() + policy.soft_ttl)
+                await self.cache.set(redis_key, value=d, expire=policy.hard_ttl)
+                await self.cache.tag(redis_key, codecs.tags(data), expire=policy.hard_ttl)
+            except Exception as e:
+                logger.warning('cache write failed %s: %s', redis_key, e)
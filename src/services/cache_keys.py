@@ -0,0 +1,53 @@
+"""
+Ключи кэша. Ключи всех эндпоинтов строятся здесь, чтобы одинаковые по смыслу запросы
+попадали в одну запись: параметры сортируются по имени, пустые отбрасываются,
+поисковые запросы нормализуются, а слишком длинные параметры заменяются хэшем.
+Ключ начинается с пути эндпоинта, поэтому по нему работают префиксы L1-кэша.
+"""
+import hashlib
+from typing import Any
+
+from core.config import CACHE_KEY_VERSION
+
+# параметры длиннее (поисковые запросы, курсоры) хранятся в ключе хэшем
+MAX_PARAMS_LENGTH = 128
+# операторы query_string регистрозависимы, их нельзя переводить в нижний регистр
+QUERY_OPERATORS = ('AND', 'OR', 'NOT', 'TO')
+# поля, фразы и диапазоны: значения в них могут быть регистрозависимыми (title.raw:"The Matrix")
+QUERY_SYNTAX = frozenset(':"[]{}')
+
+
+def normalize_query(query: str) -> str:
+    """
+    Поисковый запрос для ключа кэша: без лишних пробелов и в нижнем регистре,
+    кроме операторов. Запрос с полями, фразами или диапазонами в нижний регистр
+    не переводится. В Elasticsearch уходит исходный запрос, а не этот.
+    """
+    words = query.split()
+    if QUERY_SYNTAX.intersection(query):
+        return ' '.join(words)
+    return ' '.join(word if word in QUERY_OPERATORS else word.lower() for word in words)
+
+
+def _param(value: Any) -> str:
+    if isinstance(value, (list, tuple)):
+        return ','.join(_param(item) for item in value)
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def cache_key(namespace: str, /, **params: Any) -> str:
+    """
+    :param namespace: путь эндпоинта вместе с id документа, например api/v1/films/<id>
+    :param params: параметры запроса, None равносилен отсутствию параметра
+    """
+    key = f'{namespace}:{CACHE_KEY_VERSION}'
+    canonical = '&'.join(
+        f'{name}={_param(value)}' for name, value in sorted(params.items()) if value is not None
+    )
+    if not canonical:
+        return key
+    if len(canonical) > MAX_PARAMS_LENGTH:
+        canonical = '#' + hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+    return f'{key}?{canonical}'
@@ -0,0 +1,111 @@
+"""
+Кодеки кэша: из ответа Elasticsearch сохраняются только те поля, которые нужны эндпоинту,
+в виде, из которого сразу собирается ответ API. В Redis данные лежат в orjson.
+"""
+from typing import Dict, List, Optional, Set, Tuple
+
+import orjson
+
+FILM_SHORT_FIELDS = ('id', 'title', 'imdb_rating')
+PERSON_ROLES = ('director', 'actor', 'writer')
+
+
+def encode(data, expire_at: float) -> bytes:
+    return orjson.dumps({'expire_at': expire_at, 'data': data})
+
+
+def decode(raw: bytes) -> Optional[Tuple]:
+    """Возвращает пару (данные, момент истечения мягкого TTL) или None."""
+    out = orjson.loads(raw)
+    if not isinstance(out, dict) or not out.get('data'):
+        return None
+    return out['data'], out.get('expire_at', 0)
+
+
+def film_short(source: Dict) -> Dict:
+    return {field: source.get(field) for field in FILM_SHORT_FIELDS}
+
+
+def film_short_list(hits: List[Dict]) -> List[Dict]:
+    return [film_short(hit['_source']) for hit in hits]
+
+
+def film_page(result: Dict, limit: Optional[int] = None) -> Dict:
+    """
+    Страница фильмов для AllShortFilms: общее количество и короткие карточки.
+    Для полной страницы сохраняются значения сортировки последнего фильма (search_after
+    следующей страницы) и id point-in-time, если поиск шёл по нему.
+    """
+    hits = result['hits']['hits']
+    total = result['hits']['total']
+    page = {
+        'total': total['value'],
+        'results': film_short_list(hits),
+    }
+    if total.get('relation') == 'gte':
+        # подсчёт остановлен на пороге track_total_hits
+        page['total_relation'] = 'gte'
+    if limit and len(hits) == limit and 'sort' in hits[-1]:
+        page['after'] = hits[-1]['sort']
+        page['pit'] = result.get('pit_id')
+    return page
+
+
+def person_short(hit: Dict) -> Dict:
+    return {'id': hit['_id'], 'full_name': hit['_source'].get('full_name')}
+
+
+def found(response: Dict, project) -> Dict:
+    """Группа единого поиска: общее количество и документы"""
+    hits = response['hits']
+    total = hits['total']
+    counted = {'total': total['value'], 'total_relation': total.get('relation')}
+    return {
+        'total': total['value'],
+        'total_display': total_display(counted),
+        'results': [project(hit) for hit in hits['hits']],
+    }
+
+
+def total_display(page: Dict) -> str:
+    """Количество совпадений для показа: «10000+», если подсчёт был ограничен"""
+    suffix = '+' if page.get('total_relation') == 'gte' else ''
+    return f"{page['total']}{suffix}"
+
+
+def genre(hit: Dict) -> Dict:
+    return {'id': hit.get('_id'), 'name': hit['_source'].get('name')}
+
+
+def genre_list(result: Dict) -> List[Dict]:
+    return [genre(hit) for hit in result['hits']['hits']]
+
+
+def person_roles(roles: Dict) -> Dict:
+    """Фильмы по ролям в формате API: роль без фильмов отдаётся как null."""
+    return {role: roles.get(role) or None for role in PERSON_ROLES}
+
+
+def tags(data) -> Set[str]:
+    """
+    Идентификаторы документов, из которых собрано значение кэша.
+    По ним ключ удаляется, когда ETL сообщает об изменении документа.
+    """
+    if isinstance(data, list):
+        return set().union(*(tags(item) for item in data))
+    if not isinstance(data, dict):
+        return set()
+    found = set()
+    if data.get('id'):
+        found.add(str(data['id']))
+    for item in data.get('results') or []:
+        found |= tags(item)
+    for film_ids in (data.get('roles') or {}).values():
+        found.update(film_ids or [])
+    for person in (data.get('actors') or []) + (data.get('writers') or []):
+        found.add(str(person['id']))
+    # группы результатов единого поиска
+    for group in ('films', 'persons', 'genres'):
+        if isinstance(data.get(group), dict):
+            found |= tags(data[group])
+    return found
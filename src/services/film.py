@@ -1,164 +1,279 @@
-from functools import cache, lru_cache
-from typing import Dict, Optional
-import json
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, Optional
 from fastapi import Depends
 
+from core.config import (
+    CURSOR_PIT_KEEP_ALIVE,
+    CURSOR_POINT_IN_TIME,
+    FILMS_EXPORT_BATCH_SIZE,
+    get_cache_policy,
+)
 from db.abstract import AsyncCacheStorage
-from db.abstract import AsyncSearchEngine
+from db.abstract import AsyncSearchEngine, PointInTimeNotFound
 from db.elastic import get_elastic
-from db.redis import get_redis
+from db.cache import get_cache
+from db.rankings import GenreRankings, get_genre_rankings
+from db.singleflight import SingleFlight, get_single_flight
 
 from models.film import Film
-from core.config import FILM_CACHE_EXPIRE_IN_SECONDS
+from services import codecs
+from services.base import BaseService
+from services.search_options import apply_search_options
 
+logger = logging.getLogger(__name__)
 
-class FilmService:
-    def __init__(self, cache: AsyncCacheStorage, text_search: AsyncSearchEngine):
-        self.cache = cache
-        self.text_search = text_search
+# поля фильма, по которым идёт полнотекстовый поиск
+FILM_SEARCH_FIELDS = [
+    'title',
+    'description',
+    'writers_names',
+    'actors_names',
+    'director',
+]
+
+
+class FilmService(BaseService):
+    def __init__(
+        self,
+        cache: AsyncCacheStorage,
+        text_search: AsyncSearchEngine,
+        flight: SingleFlight,
+        rankings: GenreRankings,
+    ):
+        super().__init__(cache, text_search, flight)
+        self.rankings = rankings
 
     # get_by_id возвращает объект фильма. Он опционален, так как фильм может отсутствовать в базе
     async def get_by_id(self, redis_key: str, film_id: str) -> Optional[Film]:
-        film = await self._film_from_cache(redis_key)
-        if not film:
-            # Если фильма нет в кеше, то ищем его в Elasticsearch
-            # film = await self._get_film_from_elastic(film_id)
-            film = await self._get_movie_by_id(film_id)
-            if not film:
-                # Если он отсутствует в Elasticsearch, значит, фильма вообще нет в базе
-                return None
-            # Сохраняем фильм  в кеш
-            await self._put_result_to_cache(redis_key, film)
-        return film
+        # Если фильма нет в кеше, то ищем его в Elasticsearch и сохраняем в кеш.
+        # Если он отсутствует в Elasticsearch, значит, фильма вообще нет в базе
+        return await self._get_or_load(
+            redis_key, lambda: self._get_movie_by_id(film_id), 'film_details'
+        )
 
     async def get_paginated_movies(
-        self, redis_key, offset=0, limit=10, filter_by=None, sort=None
+        self, redis_key, offset=0, limit=10, filter_by=None, sort=None,
+        search_after=None, pit_id=None,
     ):
-        film = await self._film_from_cache(redis_key)
-        if film is None:
-            film = await self._get_movies_from_elastic(offset, limit, filter_by, sort)
-            if film is None:
-                return None
-            await self._put_result_to_cache(redis_key, film)
-        return film
+        return await self._get_page(
+            redis_key,
+            lambda pit: self._get_movies_from_elastic(
+                offset, limit, filter_by, sort, search_after, pit
+            ),
+            'films',
+            search_after,
+            pit_id,
+        )
 
     async def get_top_films_by_genre_id(self, redis_key, genre_id, pagination):
-        films = await self._film_from_cache(redis_key)
-        if films is None:
-            films = await self._get_films_by_genre_id_from_elastic(
-                genre_id, pagination.offset, pagination.limit
-            )
-            if films is None:
-                return None
-            await self._put_result_to_cache(redis_key, films)
-        return films
+        # страницы по номеру отдаём из рейтингов, которые ETL ведёт в Redis,
+        # в Elasticsearch идём, только если их нет или они устарели
+        if pagination.search_after is None:
+            films = await self.rankings.top_films(genre_id, pagination.offset, pagination.limit)
+            if films is not None:
+                # страница за концом рейтинга — такой же промах, как пустой ответ Elasticsearch
+                return films if films['results'] else None
+        return await self._get_page(
+            redis_key,
+            lambda pit: self._get_films_by_genre_id_from_elastic(
+                genre_id, pagination.offset, pagination.limit,
+                search_after=pagination.search_after, pit_id=pit,
+            ),
+            'genre_top_films',
+            pagination.search_after,
+            pagination.pit_id,
+        )
 
     async def get_items_by_query(self, redis_key, query, pagination):
-        films = await self._film_from_cache(redis_key)
-        if films is None:
-            films = await self._get_films_by_search_query_elastic(
-                query, pagination.offset, pagination.limit
-            )
-            if films is None:
-                return None
-            await self._put_result_to_cache(redis_key, films)
+        return await self._get_page(
+            redis_key,
+            lambda pit: self._get_films_by_search_query_elastic(
+                query, pagination.offset, pagination.limit,
+                search_after=pagination.search_after, pit_id=pit,
+            ),
+            'films_search',
+            pagination.search_after,
+            pagination.pit_id,
+        )
+
+    async def _get_page(self, redis_key, load, endpoint, search_after=None, pit_id=None):
+        """
+        Страница списка фильмов. Страницы по номеру и по курсору кэшируются,
+        а обход по point-in-time всегда идёт в Elasticsearch: он привязан к снимку индекса.
+        Истёкший или чужой point-in-time из курсора заменяется новым.
+        """
+        if search_after is not None and CURSOR_POINT_IN_TIME:
+            if pit_id is not None:
+                try:
+                    return await load(pit_id)
+                except PointInTimeNotFound:
+                    # курсор пролежал дольше keep_alive: обход продолжается по новому снимку
+                    logger.info('cursor point-in-time is gone, opening a new one')
+            pit_id = await self.text_search.open_point_in_time('movies', CURSOR_PIT_KEEP_ALIVE)
+            return await load(pit_id)
+        return await self._get_or_load(redis_key, lambda: load(None), endpoint)
+
+    async def get_by_ids(self, redis_keys: Dict[str, str]) -> Dict[str, Dict]:
+        """
+        Возвращает фильмы по id: сначала одним MGET из кэша, остальные одним mget
+        из Elasticsearch. Ненайденных фильмов в ответе нет.
+        :param redis_keys: ключи кэша карточек фильмов по id
+        """
+        films = {}
+        now = time.time()
+        entries = await self._many_from_cache(list(redis_keys.values()))
+        for film_id, entry in zip(redis_keys, entries):
+            if entry is not None and entry[1] > now:
+                films[film_id] = entry[0]
+
+        missing = [film_id for film_id in redis_keys if film_id not in films]
+        if missing:
+            policy = get_cache_policy('film_details')
+            docs = await self.text_search.mget(index='movies', ids=missing)
+            found = {doc['_id']: doc['_source'] for doc in docs if doc.get('found')}
+            await asyncio.gather(*(
+                self._put_result_to_cache(redis_keys[film_id], film, policy)
+                for film_id, film in found.items()
+            ))
+            films.update(found)
         return films
 
+    async def export_movies(
+        self,
+        fields: Optional[List[str]] = None,
+        filter_by: Optional[Dict] = None,
+        batch_size: int = FILMS_EXPORT_BATCH_SIZE,
+    ) -> AsyncIterator[List[Dict]]:
+        """
+        Весь каталог пачками по batch_size фильмов в порядке id, мимо кэша.
+        Следующая пачка запрашивается, только когда предыдущая отдана клиенту,
+        поэтому в памяти держится не больше одной пачки.
+        """
+        query = {'match_all': {}}
+        if filter_by is not None:
+            query = {'bool': {'filter': {'match': {**filter_by}}}}
+        pit_id = None
+        if CURSOR_POINT_IN_TIME:
+            pit_id = await self.text_search.open_point_in_time('movies', CURSOR_PIT_KEEP_ALIVE)
+        search_after = None
+        try:
+            while True:
+                query_body = {'query': query, '_source': fields or True, 'track_total_hits': False}
+                result = await self._search_movies(
+                    query_body, 0, batch_size, search_after, pit_id, endpoint='films_export'
+                )
+                hits = result['hits']['hits']
+                if hits:
+                    yield [hit['_source'] for hit in hits]
+                if len(hits) < batch_size:
+                    return
+                search_after = hits[-1]['sort']
+                pit_id = result.get('pit_id', pit_id)
+        finally:
+            # и после последней пачки, и при обрыве выгрузки клиентом
+            if pit_id is not None:
+                await self._close_point_in_time(pit_id)
+
+    async def _close_point_in_time(self, pit_id: str) -> None:
+        try:
+            await self.text_search.close_point_in_time(pit_id)
+        except Exception as e:
+            # point-in-time всё равно закроется сам по истечении keep_alive
+            logger.warning('closing point-in-time failed: %r', e)
+
     async def _get_films_by_search_query_elastic(
         self,
         query: str,
         offset: int = 0,
         limit: int = 10,
-        filter_by: Dict = None,
-        sort: Dict = None,
+        search_after: List = None,
+        pit_id: str = None,
     ):
-        if filter_by is None:
-            default_fields_list = [
-                'title',
-                'description',
-                'writers_names',
-                'actors_names',
-                'director',
-            ]
-            query_body = {
-                'query': {'query_string': {'fields': default_fields_list, 'query': query},},
-            }
-            result = await self.text_search.search(
-                index='movies', body=query_body, from_=offset, size=limit
-            )
-            if len(result['hits']['hits']) == 0:
-                return None
-        return result
+        query_body = {
+            'query': {'query_string': {'fields': FILM_SEARCH_FIELDS, 'query': query},},
+            'sort': ['_score'],
+        }
+        result = await self._search_movies(
+            query_body, offset, limit, search_after, pit_id, endpoint='films_search'
+        )
+        if len(result['hits']['hits']) == 0:
+            return None
+        return codecs.film_page(result, limit)
 
     async def _get_movie_by_id(self, film_id: str):
-        query_body = {'query': {'match': {'id': film_id}}}
-        result = await self.text_search.search(index='movies', body=query_body)
-        try:
-            film = result['hits']['hits'][0]
-        except IndexError:
+        film = await self.text_search.get(index='movies', id=film_id)
+        if film is None:
             return None
-        return result
+        return film['_source']
 
     async def _get_films_by_genre_id_from_elastic(
-        self, genre_id, offset=0, limit=15, filter_by=None, sort=None
+        self, genre_id, offset=0, limit=15, search_after=None, pit_id=None
     ):
         sort = {'imdb_rating': 'desc'}
         query_body = {'query': {'match': {'genre': genre_id}}, 'sort': [sort]}
-        result = await self.text_search.search(
-            index='movies', body=query_body, from_=offset, size=limit
+        result = await self._search_movies(
+            query_body, offset, limit, search_after, pit_id, endpoint='genre_top_films'
         )
         if len(result['hits']['hits']) == 0:
             return None
-        return result
+        return codecs.film_page(result, limit)
 
     async def _get_movies_from_elastic(
-        self, offset: int = 0, limit: int = 10, filter_by: Dict = None, sort: Dict = None
+        self,
+        offset: int = 0,
+        limit: int = 10,
+        filter_by: Dict = None,
+        sort: List[Dict] = None,
+        search_after: List = None,
+        pit_id: str = None,
     ):
 
         if sort is None:
-            sort = {'imdb_rating': 'desc'}
+            sort = [{'imdb_rating': 'desc'}]
 
         if filter_by is None:
             query_body = {
                 'query': {'match_all': {},},
-                'sort': [sort],
+                'sort': [*sort],
             }
-            result = await self.elastic.search(
-                index='movies', body=query_body, from_=offset, size=limit
-            )
-            return result
         else:
             query_body = {
                 'query': {'bool': {'filter': {'match': {**filter_by}}}},
-                'sort': [sort],
+                'sort': [*sort],
             }
-            result = await self.elastic.search(
-                index='movies', body=query_body, from_=offset, size=limit
-            )
-
-            return result
+        result = await self._search_movies(query_body, offset, limit, search_after, pit_id)
+        return codecs.film_page(result, limit)
 
-    async def _film_from_cache(self, redis_key: str):
-        data = await self.cache.get(redis_key)
-        out = None
-        try:
-            out = json.loads(data)
-        except Exception as out_e:
-            print('out_e', out_e)
-        if not out:
-            return None
-        return out
-
-    async def _put_result_to_cache(self, redis_key, data):
-        # Сохраняем данные о фильме, используя команду set
-        # https://redis.io/commands/set
-        # pydantic позволяет сериализовать модель в json
-        if data:
-            try:
-                d = json.dumps(data)
-                await self.cache.set(redis_key, value=d, expire=FILM_CACHE_EXPIRE_IN_SECONDS)
-            except Exception as e:
-                print('exep', e)
+    async def _search_movies(
+        self,
+        query_body: Dict,
+        offset: int,
+        limit: int,
+        search_after=None,
+        pit_id=None,
+        endpoint: str = 'films',
+    ):
+        # id как последний ключ сортировки: без него search_after пропускает фильмы
+        # с одинаковым рейтингом на границе страниц
+        query_body['sort'] = [*query_body.get('sort', []), {'id': 'asc'}]
+        # списки отдают только FilmShort: описание и массивы персон не читаем с диска
+        # и не гоняем по сети, если запрос сам не выбрал поля
+        query_body.setdefault('_source', list(codecs.FILM_SHORT_FIELDS))
+        index = 'movies'
+        if search_after is not None:
+            query_body['search_after'] = search_after
+            offset = 0
+        if pit_id is not None:
+            # при поиске по point-in-time индекс задаётся самим point-in-time
+            query_body['pit'] = {'id': pit_id, 'keep_alive': CURSOR_PIT_KEEP_ALIVE}
+            index = None
+        params = apply_search_options(query_body, endpoint, pit_id)
+        return await self.text_search.search(
+            index=index, body=query_body, from_=offset, size=limit, **params
+        )
 
 
 # get_film_service — это провайдер FilmService.
@@ -167,7 +282,9 @@ class FilmService:
 # Используем lru_cache-декоратор, чтобы создать объект сервиса в едином экземпляре (синглтона)
 @lru_cache()
 def get_film_service(
-    cache: AsyncCacheStorage = Depends(get_redis),
+    cache: AsyncCacheStorage = Depends(get_cache),
     text_search: AsyncSearchEngine = Depends(get_elastic),
+    flight: SingleFlight = Depends(get_single_flight),
+    rankings: GenreRankings = Depends(get_genre_rankings),
 ) -> FilmService:
-    return FilmService(cache, text_search)
+    return FilmService(cache, text_search, flight, rankings)
@@ -0,0 +1,101 @@
+import asyncio
+import hashlib
+import logging
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import orjson
+
+from db.abstract import AsyncSearchEngine
+from services import codecs
+
+logger = logging.getLogger(__name__)
+
+# Жанров единицы, но запас нужен, чтобы каталог всегда загружался одним запросом
+GENRES_MAX = 1000
+
+
+class GenreCatalogue:
+    """
+    Все жанры в памяти воркера. Снимок неизменяемый: при обновлении он собирается заново
+    и подменяется целиком, поэтому чтение не требует ни блокировок, ни обращений к сети.
+    Обновляется по таймеру и по сообщению ETL об изменении индекса genres.
+    Версия снимка — хэш его содержимого, поэтому у всех воркеров она одна и та же.
+    """
+
+    def __init__(self, text_search: AsyncSearchEngine, refresh_interval: int):
+        self.text_search = text_search
+        self.refresh_interval = refresh_interval
+        self.loaded = False
+        self.version = ''
+        self.refreshes = 0
+        self.failures = 0
+        self._genres: Tuple[Dict, ...] = ()
+        self._by_id: Mapping[str, Dict] = MappingProxyType({})
+        self._by_name: Mapping[str, str] = MappingProxyType({})
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await self.refresh()
+        self._task = asyncio.ensure_future(self._refresh_periodically())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+    async def refresh(self) -> None:
+        try:
+            result = await self.text_search.search(
+                index='genres',
+                body={'query': {'match_all': {}}, 'sort': [{'name.raw': 'asc'}]},
+                size=GENRES_MAX,
+            )
+        except Exception as e:
+            # остаёмся на предыдущем снимке, сервис в это время ходит в Elasticsearch
+            self.failures += 1
+            logger.warning('genre catalogue refresh failed: %r', e)
+            return
+        genre_list = codecs.genre_list(result)
+        genres = tuple(MappingProxyType(genre) for genre in genre_list)
+        self._by_id = MappingProxyType({genre['id']: genre for genre in genres})
+        self._by_name = MappingProxyType({genre['name'].lower(): genre['id'] for genre in genres})
+        self._genres = genres
+        self.version = hashlib.blake2b(orjson.dumps(genre_list), digest_size=8).hexdigest()
+        self.loaded = True
+        self.refreshes += 1
+
+    async def on_change(self, index: str, ids: List[str]) -> None:
+        if index == 'genres':
+            await self.refresh()
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh()
+
+    def all(self) -> Tuple[Dict, ...]:
+        return self._genres
+
+    def get(self, genre_id: str) -> Optional[Dict]:
+        return self._by_id.get(genre_id)
+
+    def resolve_id(self, genre: str) -> str:
+        """id жанра по его названию; id и неизвестные значения возвращаются как есть"""
+        return self._by_name.get(genre.lower(), genre)
+
+    def stats(self) -> Dict:
+        return {
+            'loaded': self.loaded,
+            'version': self.version,
+            'genres': len(self._genres),
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+        }
+
+
+genre_catalogue: Optional[GenreCatalogue] = None
+
+
+# Функция понадобится при внедрении зависимостей
+async def get_genre_catalogue() -> GenreCatalogue:
+    return genre_catalogue
@@ -1,39 +1,62 @@
-import json
-import functools
+from functools import lru_cache
+from typing import Optional
 
 from fastapi import Depends
 
 from db.abstract import AsyncCacheStorage
 from db.abstract import AsyncSearchEngine
 from db.elastic import get_elastic
-from db.redis import get_redis
-from core.config import FILM_CACHE_EXPIRE_IN_SECONDS
+from db.cache import get_cache
+from db.singleflight import SingleFlight, get_single_flight
+from services import codecs
+from services.base import BaseService
+from services.genre_catalogue import GENRES_MAX, GenreCatalogue, get_genre_catalogue
 
 
-class GenreService:
-    def __init__(self, cache: AsyncCacheStorage, text_search: AsyncSearchEngine):
-        self.cache = cache
-        self.text_search = text_search
+class GenreService(BaseService):
+    def __init__(
+        self,
+        cache: AsyncCacheStorage,
+        text_search: AsyncSearchEngine,
+        flight: SingleFlight,
+        catalogue: GenreCatalogue,
+    ):
+        super().__init__(cache, text_search, flight)
+        self.catalogue = catalogue
 
-    async def get_genres(self, redis_key):
-        genres = await self._film_from_cache(redis_key)
-        if genres is None:
-            genres = await self._get_genres_from_elastic(
-                offset=0, limit=30, filter_by=None, sort=None
+    def catalogue_version(self, genre_id: Optional[str] = None) -> Optional[str]:
+        """
+        Версия снимка каталога, из которого будет ответ, или None, если ответ придёт
+        из Elasticsearch: каталог не загружен или в нём нет жанра genre_id
+        """
+        if not self.catalogue.loaded:
+            return None
+        if genre_id is not None and self.catalogue.get(genre_id) is None:
+            return None
+        return self.catalogue.version
+
+    async def get_genres(self, redis_key, pagination):
+        # жанры отдаём из каталога в памяти, в Elasticsearch идём, только пока он не загружен
+        if self.catalogue.loaded:
+            genres = self.catalogue.all()
+        else:
+            genres = await self._get_or_load(
+                redis_key,
+                lambda: self._get_genres_from_elastic(
+                    offset=0, limit=GENRES_MAX, filter_by=None, sort=None
+                ),
+                'genres',
             )
-            if genres is None:
-                return None
-            await self._put_result_to_cache(redis_key, genres)
-        return genres
+        return pagination.paginate_list(genres or [])
 
     async def get_genre_by_id(self, redis_key, genre_id):
-        genre = await self._film_from_cache(redis_key)
-        if genre is None:
-            genre = await self._get_genre_by_id_from_elastic(genre_id)
-            if genre is None:
-                return None
-            await self._put_result_to_cache(redis_key, genre)
-        return genre
+        genre = self.catalogue.get(genre_id)
+        if genre is not None:
+            return genre
+        # жанр мог появиться после последнего обновления каталога
+        return await self._get_or_load(
+            redis_key, lambda: self._get_genre_by_id_from_elastic(genre_id), 'genre_details'
+        )
 
     async def _get_genres_from_elastic(self, offset=0, limit=30, filter_by=None, sort=None):
         if filter_by is None:
@@ -43,40 +66,21 @@ class GenreService:
             result = await self.text_search.search(
                 index='genres', body=query_body, from_=offset, size=limit
             )
-            return result
+            return codecs.genre_list(result)
 
     async def _get_genre_by_id_from_elastic(self, genre_id: str):
-        query_body = {'query': {'match': {'_id': genre_id}}}
-        genre = await self.text_search.search(index='genres', body=query_body)
-        return genre
-
-    async def _put_result_to_cache(self, redis_key, data):  # TODO Проверить модель Film
-        # Сохраняем данные о фильме, используя команду set
-        # https://redis.io/commands/set
-        # pydantic позволяет сериализовать модель в json
-        if data:
-            try:
-                d = json.dumps(data)
-                await self.cache.set(redis_key, value=d, expire=FILM_CACHE_EXPIRE_IN_SECONDS)
-            except Exception as e:
-                print('exep', e)
-
-    async def _film_from_cache(self, redis_key: str):
-        data = await self.cache.get(redis_key)
-        out = None
-        try:
-            out = json.loads(data)
-        except Exception as out_e:
-            print('out_e', out_e)
-        if not out:
+        genre = await self.text_search.get(index='genres', id=genre_id)
+        if genre is None:
             return None
-        return out
+        return codecs.genre(genre)
 
 
 # Используем lru_cache-декоратор, чтобы создать объект сервиса в едином экземпляре (синглтона)
 @lru_cache()
 def get_genre_service(
-    cache: AsyncCacheStorage = Depends(get_redis),
+    cache: AsyncCacheStorage = Depends(get_cache),
     text_search: AsyncSearchEngine = Depends(get_elastic),
+    flight: SingleFlight = Depends(get_single_flight),
+    catalogue: GenreCatalogue = Depends(get_genre_catalogue),
 ) -> GenreService:
-    return GenreService(cache, text_search)
+    return GenreService(cache, text_search, flight, catalogue)
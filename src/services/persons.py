@@ -1,140 +1,146 @@
-import json
 from http import HTTPStatus
-from typing import Dict
+from typing import Dict, List, Optional
 
 from fastapi import Depends, HTTPException
 from pydantic.tools import lru_cache
-from core.config import FILM_CACHE_EXPIRE_IN_SECONDS
 from db.abstract import AsyncCacheStorage
 from db.abstract import AsyncSearchEngine
 from db.elastic import get_elastic
-from db.redis import get_redis
+from db.cache import get_cache
+from db.singleflight import SingleFlight, get_single_flight
 from models.film import Person
+from services import codecs
+from services.base import BaseService
 
+# поле фильма с именами персон и название роли в ответе API
+PERSON_ROLES = (
+    ('director', 'director'),
+    ('actors_names', 'actor'),
+    ('writers_names', 'writer'),
+)
 
-class PersonService:
-    def __init__(self, cache: AsyncCacheStorage, text_search: AsyncSearchEngine):
-        self.cache = cache
-        self.text_search = text_search
 
+class PersonService(BaseService):
     async def get_person_by_id(self, redis_key, person_id: str):
-        films = await self._person_from_cache(redis_key)
-        if films is not None:
-            return films
-        result = {'id': person_id}
-        result['full_name'] = await self._get_person_full_name_by_id(person_id)
-        if result['full_name'] is None:
-            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='person not found')
-        types = [
-            ('director', 'director'),
-            ('actors_names', 'actor'),
-            ('writers_names', 'writer'),
-        ]
-        result['roles'] = dict()
-        for t in types:
-            result['roles'][t[1]] = await self._get_films_by_person_full_name(
-                type=t[0], person_name=result['full_name']
-            )
-        await self._put_result_to_cache(redis_key, result)
-        return result
+        return await self._get_or_load(
+            redis_key, lambda: self._get_person_from_elastic(person_id), 'person_details'
+        )
 
     # http://localhost:8106/api/v1/persons/search/?query=Mary&page[number]=1&page[size]=50
     async def search_person_by_query(self, redis_key, query, pagination):
-        films = await self._person_from_cache(redis_key)
+        return await self._get_or_load(
+            redis_key,
+            lambda: self._search_persons_from_elastic(
+                query, pagination.offset, pagination.limit
+            ),
+            'persons_search',
+        )
 
-        if films is not None:
-            return films
-        persons = await self._get_persons_by_search_query_elastic(
-            query, pagination.offset, pagination.limit
+    async def get_films_by_person_id(
+            self, redis_key, offset=0, limit=10, person_id=None, sort=None
+    ):
+        return await self._get_or_load(
+            redis_key,
+            lambda: self._get_films_by_person_id_from_elastic(offset, limit, person_id, sort),
+            'person_films',
         )
+
+    async def _get_person_from_elastic(self, person_id: str):
+        person = await self.text_search.get(
+            index='persons', id=person_id, _source=['full_name', 'roles']
+        )
+        if person is None:
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='person not found')
+        result = {'id': person_id, 'full_name': person['_source']['full_name']}
+        roles = person['_source'].get('roles')
+        if roles is None:
+            # документ проиндексирован без ролей, собираем их по фильмам
+            roles = (await self._get_roles_by_full_names([result['full_name']]))[0]
+        result['roles'] = codecs.person_roles(roles)
+        return result
+
+    async def _search_persons_from_elastic(self, query, offset, limit):
+        persons = await self._get_persons_by_search_query_elastic(query, offset, limit)
         if persons is None:
             raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='person not found')
-        persons = [i['_source']['full_name'] for i in persons]
         results = []
+        without_roles = []
         for person in persons:
-            result = dict()
-            result['id'] = '86f1f44b-39f5-41a6-8b3b-af5a9ed09858'
-            result['full_name'] = person
-            types = [
-                ('director', 'director'),
-                ('actors_names', 'actor'),
-                ('writers_names', 'writer'),
-            ]
-            result['roles'] = dict()
-            for t in types:
-                result['roles'][t[1]] = await self._get_films_by_person_full_name(
-                    type=t[0], person_name=result['full_name']
-                )
+            source = person['_source']
+            result = {
+                'id': source.get('id', person['_id']),
+                'full_name': source['full_name'],
+                'roles': source.get('roles'),
+            }
+            if result['roles'] is None:
+                without_roles.append(result)
             results.append(result)
+        # роли берём из индекса persons, поиском по фильмам добираем только недостающие
+        if without_roles:
+            found = await self._get_roles_by_full_names(
+                [result['full_name'] for result in without_roles]
+            )
+            for result, roles in zip(without_roles, found):
+                result['roles'] = roles
+        for result in results:
+            result['roles'] = codecs.person_roles(result['roles'])
+        return results
 
-        await self._put_result_to_cache(redis_key, results)
+    async def _get_roles_by_full_names(self, full_names: List[str]) -> List[Dict]:
+        """
+        Фильмы по ролям для списка персон: все поиски (персона, роль) уходят одним _msearch
+        """
+        searches = [
+            ({'index': 'movies'}, {'query': {'match_phrase': {field: full_name}}, '_source': False})
+            for full_name in full_names
+            for field, _ in PERSON_ROLES
+        ]
+        responses = iter(await self.text_search.msearch(searches))
+        result = []
+        for _ in full_names:
+            roles = dict()
+            for _, role in PERSON_ROLES:
+                roles[role] = self._film_ids_from_response(next(responses))
+            result.append(roles)
+        return result
 
-        return results
+    @staticmethod
+    def _film_ids_from_response(response: Dict) -> Optional[List[str]]:
+        hits = response.get('hits', {}).get('hits')
+        if not hits:
+            return None
+        return [i['_id'] for i in hits]
 
-    async def get_films_by_person_id(
-            self, redis_key, offset=0, limit=10, person_id=None, sort=None
-    ):
-        films = await self._person_from_cache(redis_key)
-        if films is not None:
-            return films
+    async def _get_films_by_person_id_from_elastic(self, offset, limit, person_id, sort):
         full_name = await self._get_person_full_name_by_id(person_id)
         if full_name is None:
             raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='person not found')
-        result = list()
-        for i in ['director', 'actors_names', 'writers_names']:
-            response = await self._get_movies_from_elastic(offset, limit, {i: full_name}, sort)
-            result.extend(response['hits']['hits'])
-
-        roles = sorted(result, key=lambda x: x['sort'], reverse=True)
-        await self._put_result_to_cache(redis_key, roles)
-        return roles
-
-    async def _get_person_full_name_by_id(self, person_id: str):
-        query_body = {'query': {'match': {'id': person_id}}}
-        result = await self.text_search.search(index='persons', body=query_body)
-        try:
-            return result['hits']['hits'][0]['_source']['full_name']
-        except IndexError:
-            return None
-
-    async def _get_films_by_person_full_name(self, type, person_name: str):
-        query_body = {'query': {'match_phrase': {type: person_name}}}
-        try:
-            result = await self.text_search.search(index='movies', body=query_body)
-
-            if len(result['hits']['hits']) > 0:
-                return [i['_id'] for i in result['hits']['hits']]
-            else:
-                return None
-        except Exception:
-            return None
-
-    async def _get_movies_from_elastic(
-            self, offset: int = 0, limit: int = 10, filter_by: Dict = None, sort: Dict = None
-    ):
-
         if sort is None:
             sort = {'imdb_rating': 'desc'}
-
-        if filter_by is None:
-            query_body = {
-                'query': {'match_all': {}, },
-                'sort': {**sort},
-            }
-            result = await self.text_search.search(
-                index='movies', body=query_body, from_=offset, size=limit
-            )
-            return result
-        else:
-            query_body = {
-                'query': {'bool': {'filter': {'match': {**filter_by}}}},
-                'sort': {**sort},
-            }
-            result = await self.text_search.search(
-                index='movies', body=query_body, from_=offset, size=limit
+        searches = [
+            (
+                {'index': 'movies'},
+                {
+                    'query': {'bool': {'filter': {'match': {field: full_name}}}},
+                    '_source': list(codecs.FILM_SHORT_FIELDS),
+                    'sort': {**sort},
+                    'from': offset,
+                    'size': limit,
+                },
             )
+            for field, _ in PERSON_ROLES
+        ]
+        responses = await self.text_search.msearch(searches)
+        result = [hit for response in responses for hit in response.get('hits', {}).get('hits', [])]
 
-            return result
+        result = sorted(result, key=lambda x: x['sort'], reverse=True)
+        return codecs.film_short_list(result)
+
+    async def _get_person_full_name_by_id(self, person_id: str):
+        person = await self.text_search.get(index='persons', id=person_id, _source=['full_name'])
+        if person is None:
+            return None
+        return person['_source']['full_name']
 
     async def _get_persons_by_search_query_elastic(
             self, query: str, offset: int = 0, limit: int = 10,
@@ -142,6 +148,7 @@ class PersonService:
 
         query_body = {
             'query': {'query_string': {'default_field': 'full_name', 'query': query}, },
+            '_source': ['id', 'full_name', 'roles'],
         }
         result = await self.text_search.search(
             index='persons', body=query_body, from_=offset, size=limit
@@ -151,32 +158,11 @@ class PersonService:
             return None
         return result['hits']['hits']
 
-    async def _person_from_cache(self, redis_key: str):
-        data = await self.cache.get(redis_key)
-        out = None
-        try:
-            out = json.loads(data)
-        except Exception as out_e:
-            print('out_e', out_e)
-        if not out:
-            return None
-        return out
-
-    async def _put_result_to_cache(self, redis_key, data):
-        # Сохраняем данные о фильме, используя команду set
-        # https://redis.io/commands/set
-        # pydantic позволяет сериализовать модель в json
-        if data:
-            try:
-                d = json.dumps(data)
-                await self.cache.set(redis_key, value=d, expire=FILM_CACHE_EXPIRE_IN_SECONDS)
-            except Exception as e:
-                print('exep', e)
-
 
 @lru_cache()
 def get_persons_service(
-    cache: AsyncCacheStorage = Depends(get_redis),
+    cache: AsyncCacheStorage = Depends(get_cache),
     text_search: AsyncSearchEngine = Depends(get_elastic),
+    flight: SingleFlight = Depends(get_single_flight),
 ) -> PersonService:
-    return PersonService(cache, text_search)
+    return PersonService(cache, text_search, flight)
@@ -0,0 +1,68 @@
+from functools import lru_cache
+
+from fastapi import Depends
+
+from db.abstract import AsyncCacheStorage
+from db.abstract import AsyncSearchEngine
+from db.elastic import get_elastic
+from db.cache import get_cache
+from db.singleflight import SingleFlight, get_single_flight
+from services import codecs
+from services.base import BaseService
+from services.film import FILM_SEARCH_FIELDS
+from services.search_options import apply_search_options
+
+
+class SearchService(BaseService):
+    """Поиск сразу по фильмам, персонам и жанрам одним _msearch"""
+
+    async def search_everywhere(self, redis_key, query: str, size: int):
+        return await self._get_or_load(
+            redis_key, lambda: self._search_everywhere_elastic(query, size), 'search'
+        )
+
+    async def _search_everywhere_elastic(self, query: str, size: int):
+        searches = [
+            (
+                {'index': 'movies'},
+                {
+                    'query': {'query_string': {'fields': FILM_SEARCH_FIELDS, 'query': query}},
+                    '_source': list(codecs.FILM_SHORT_FIELDS),
+                    'size': size,
+                },
+            ),
+            (
+                {'index': 'persons'},
+                {
+                    'query': {'query_string': {'default_field': 'full_name', 'query': query}},
+                    '_source': ['full_name'],
+                    'size': size,
+                },
+            ),
+            (
+                {'index': 'genres'},
+                {
+                    'query': {'match': {'name': query}},
+                    '_source': ['name'],
+                    'size': size,
+                },
+            ),
+        ]
+        searches = [
+            ({**header, **apply_search_options(body, 'search')}, body) for header, body in searches
+        ]
+        films, persons, genres = await self.text_search.msearch(searches)
+        return {
+            'films': codecs.found(films, lambda hit: codecs.film_short(hit['_source'])),
+            'persons': codecs.found(persons, codecs.person_short),
+            'genres': codecs.found(genres, codecs.genre),
+        }
+
+
+@lru_cache()
+def get_search_service(
+    cache: AsyncCacheStorage = Depends(get_cache),
+    text_search: AsyncSearchEngine = Depends(get_elastic),
+    flight: SingleFlight = Depends(get_single_flight),
+) -> SearchService:
+    return SearchService(cache, text_search, flight)
@@ -0,0 +1,49 @@
+"""
+Параметры выполнения поисковых запросов в Elasticsearch по эндпоинтам:
+- track_total_hits ограничивает точный подсчёт совпадений, дальше total — нижняя граница;
+- request_cache включает shard request cache и для запросов с size > 0;
+- preference по запросу без учёта страницы направляет одинаковые запросы
+  на одни и те же копии шардов, чтобы они попадали в их request cache.
+Запросы по point-in-time preference не принимают, для них он не задаётся.
+"""
+import hashlib
+from typing import Dict, NamedTuple, Optional, Union
+
+import orjson
+
+from core.config import SEARCH_REQUEST_CACHE_ENDPOINTS, SEARCH_TRACK_TOTAL_HITS
+
+
+class SearchOptions(NamedTuple):
+    track_total_hits: Union[bool, int]
+    request_cache: bool
+
+
+def get_search_options(endpoint: str) -> SearchOptions:
+    return SearchOptions(
+        track_total_hits=SEARCH_TRACK_TOTAL_HITS.get(endpoint, True),
+        request_cache=endpoint in SEARCH_REQUEST_CACHE_ENDPOINTS,
+    )
+
+
+def preference(query_body: Dict) -> str:
+    stable = {'query': query_body.get('query'), 'sort': query_body.get('sort')}
+    digest = hashlib.blake2b(orjson.dumps(stable, option=orjson.OPT_SORT_KEYS), digest_size=8)
+    return digest.hexdigest()
+
+
+def apply_search_options(
+    query_body: Dict, endpoint: str, pit_id: Optional[str] = None
+) -> Dict[str, Union[str, bool]]:
+    """
+    Дополняет тело запроса и возвращает параметры запроса для search
+    (или заголовка _msearch). Заданный в теле track_total_hits не меняется.
+    """
+    options = get_search_options(endpoint)
+    query_body.setdefault('track_total_hits', options.track_total_hits)
+    if pit_id is not None:
+        return {}
+    params = {'preference': preference(query_body)}
+    if options.request_cache:
+        params['request_cache'] = True
+    return params
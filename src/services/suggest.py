@@ -0,0 +1,86 @@
+from functools import lru_cache
+from typing import Dict, List
+
+import orjson
+from fastapi import Depends
+
+from core.config import (
+    SUGGEST_CACHE_MAX_ITEMS,
+    SUGGEST_CACHE_MAX_PREFIX,
+    SUGGEST_CACHE_TTL,
+    SUGGEST_SIZE,
+)
+from db.abstract import AsyncSearchEngine
+from db.elastic import get_elastic
+from db.memory import MemoryCache
+
+# индекс, поле с подполем search_as_you_type и ключ группы в ответе
+SUGGEST_SOURCES = (
+    ('movies', 'title', 'films'),
+    ('persons', 'full_name', 'persons'),
+)
+
+
+class SuggestService:
+    """
+    Подсказки при наборе текста: id и названия фильмов и имена персон по префиксу,
+    одним _msearch по подполям search_as_you_type. Готовые ответы на самые короткие
+    префиксы, на которые приходится большая часть запросов, хранятся в памяти воркера.
+    """
+
+    def __init__(self, text_search: AsyncSearchEngine, memory: MemoryCache):
+        self.text_search = text_search
+        self.memory = memory
+
+    async def suggest(self, prefix: str) -> bytes:
+        """Возвращает тело ответа Suggestions, сериализованное в JSON"""
+        prefix = ' '.join(prefix.lower().split())
+        cacheable = len(prefix) <= SUGGEST_CACHE_MAX_PREFIX
+        if cacheable:
+            body = self.memory.get(prefix)
+            if body is not None:
+                return body
+        body = orjson.dumps(await self._suggest_from_elastic(prefix))
+        if cacheable:
+            self.memory.set(prefix, body, SUGGEST_CACHE_TTL)
+        return body
+
+    async def _suggest_from_elastic(self, prefix: str) -> Dict[str, List[Dict]]:
+        if not prefix:
+            return {group: [] for _, _, group in SUGGEST_SOURCES}
+        searches = [
+            (
+                {'index': index},
+                {
+                    'query': {
+                        'multi_match': {
+                            'query': prefix,
+                            'type': 'bool_prefix',
+                            'fields': [
+                                f'{field}.suggest',
+                                f'{field}.suggest._2gram',
+                                f'{field}.suggest._3gram',
+                            ],
+                        },
+                    },
+                    '_source': [field],
+                    'size': SUGGEST_SIZE,
+                },
+            )
+            for index, field, _ in SUGGEST_SOURCES
+        ]
+        responses = await self.text_search.msearch(searches)
+        return {
+            group: [
+                {'id': hit['_id'], field: hit['_source'].get(field)}
+                for hit in response['hits']['hits']
+            ]
+            for (_, field, group), response in zip(SUGGEST_SOURCES, responses)
+        }
+
+
+@lru_cache()
+def get_suggest_service(
+    text_search: AsyncSearchEngine = Depends(get_elastic),
+) -> SuggestService:
+    return SuggestService(text_search, MemoryCache(max_items=SUGGEST_CACHE_MAX_ITEMS))
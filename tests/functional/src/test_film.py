@@ -4,7 +4,7 @@ from http import HTTPStatus
 import pytest
 
 from tests.functional.settings import test_settings_films
-from ..utils.helpers import _get_from_redis_cache, _put_result_to_redis_cache
+from ..utils.helpers import _cache_key, _get_from_redis_cache, _put_result_to_redis_cache
 
 
 @pytest.mark.asyncio
@@ -31,13 +31,43 @@ async def test_film_id(elasticsearch_client, session_client, redis_client):
         status = response.status
 
     # 4. Загружаем кэш из Redis
-    redis_key = f'api/v1/films/{str(es_data[settings.es_id_field])}'
+    redis_key = _cache_key(f'api/v1/films/{str(es_data[settings.es_id_field])}')
     redis_response = await _get_from_redis_cache(redis_client, redis_key)
 
-    # 5. Проверяем ответ
+    # 5. Повторный запрос отдаётся из кэша готовых ответов
+    async with session_client.get(url) as response:
+        cached_body = await response.json()
+    response_key = _cache_key(f'api/v1/films/{str(es_data[settings.es_id_field])}:response')
+    cached_response = await redis_client.get(response_key)
+
+    # 6. Проверяем ответ
     assert status == HTTPStatus.OK
     assert body['id'] == es_data[settings.es_id_field]
-    assert redis_response['hits']['hits'][0]['_id'] == es_data[settings.es_id_field]
+    assert redis_response['id'] == es_data[settings.es_id_field]
+    assert cached_response is not None
+    assert cached_body == body
+
+
+@pytest.mark.asyncio
+async def test_film_etag(session_client):
+    settings = test_settings_films
+    es_data = settings.es_data[-1]
+    url = settings.service_url + settings.api_uri + '/' + str(es_data[settings.es_id_field])
+    # 1. Первый ответ отдаёт ETag и время жизни для клиента
+    async with session_client.get(url) as response:
+        etag = response.headers['ETag']
+        cache_control = response.headers['Cache-Control']
+
+    # 2. С тем же ETag в If-None-Match ответ 304 без тела
+    async with session_client.get(url, headers={'If-None-Match': etag}) as response:
+        status = response.status
+        body = await response.read()
+        repeated_etag = response.headers['ETag']
+
+    assert cache_control.startswith('max-age=')
+    assert status == HTTPStatus.NOT_MODIFIED
+    assert body == b''
+    assert repeated_etag == etag
 
 
 @pytest.mark.asyncio
@@ -54,3 +84,133 @@ async def test_films(session_client):
     assert len(body['results']) == 50
     # правильность сортировки
     assert body['results'] == sorted(body['results'], key=lambda x: x['imdb_rating'], reverse=True)
+    # до порога track_total_hits количество точное, дальше «<порог>+»
+    assert body['amount_results_display'] in (str(body['amount_results']), '10000+')
+
+
+@pytest.mark.asyncio
+async def test_films_batch(elasticsearch_client, session_client, redis_client):
+    settings = test_settings_films
+    # 1. Генерируем данные для ES: один фильм уже в кэше, второй только в ES
+    cached, stored = settings.es_data[-4], settings.es_data[-5]
+    bulk_query = []
+    for row in (cached, stored):
+        bulk_query.extend([
+            json.dumps({'index': {'_index': settings.es_index,
+                                  '_id': row[settings.es_id_field]}}),
+            json.dumps(row)
+        ])
+    str_query = '\n'.join(bulk_query) + '\n'
+
+    # 2. Загружаем данные в ES и кладём первый фильм в кэш
+    response = await elasticsearch_client.bulk(str_query, refresh=True)
+    if response['errors']:
+        raise Exception('Ошибка записи данных в Elasticsearch', response)
+    await _put_result_to_redis_cache(redis_client, _cache_key(f'api/v1/films/{cached["id"]}'), cached)
+
+    # 3. Запрашиваем данные по API
+    url = settings.service_url + settings.api_uri + '/batch'
+    missing_id = '00000000-0000-0000-0000-000000000000'
+    payload = {'ids': [cached['id'], stored['id'], missing_id]}
+    async with session_client.post(url, json=payload) as response:
+        body = await response.json()
+        status = response.status
+
+    # 4. Проверяем ответ и то, что второй фильм попал в кэш
+    redis_response = await _get_from_redis_cache(
+        redis_client, _cache_key(f'api/v1/films/{stored["id"]}')
+    )
+    assert status == HTTPStatus.OK
+    assert [film['id'] for film in body['results']] == [cached['id'], stored['id']]
+    assert body['not_found'] == [missing_id]
+    assert redis_response['id'] == stored['id']
+
+
+@pytest.mark.asyncio
+async def test_films_cursor(session_client):
+    settings = test_settings_films
+    # 1. Первая страница по номеру отдаёт курсор следующей
+    url = settings.service_url + settings.api_uri
+    async with session_client.get(url, params={'page[size]': 10}) as response:
+        first_page = await response.json()
+    async with session_client.get(url, params={'page[size]': 10, 'page[number]': 2}) as response:
+        second_page = await response.json()
+
+    # 2. Вторая страница по курсору совпадает со второй страницей по номеру
+    params = {'page[size]': 10, 'page[cursor]': first_page['next_cursor']}
+    async with session_client.get(url, params=params) as response:
+        body = await response.json()
+        status = response.status
+
+    assert status == HTTPStatus.OK
+    assert [i['id'] for i in body['results']] == [i['id'] for i in second_page['results']]
+    assert body['next_cursor']
+
+
+@pytest.mark.asyncio
+async def test_films_cursor_of_another_sort(session_client):
+    settings = test_settings_films
+    # 1. Курсор выдан для сортировки по умолчанию
+    url = settings.service_url + settings.api_uri
+    async with session_client.get(url, params={'page[size]': 10}) as response:
+        first_page = await response.json()
+
+    # 2. С другой сортировкой он не подходит: search_after не совпал бы с её полями
+    params = {'page[size]': 10, 'page[cursor]': first_page['next_cursor'], 'sort': 'title'}
+    async with session_client.get(url, params=params) as response:
+        status = response.status
+
+    assert status == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+async def test_films_export(elasticsearch_client, session_client):
+    settings = test_settings_films
+    # 1. Генерируем данные для ES
+    bulk_query = []
+    for row in settings.es_data:
+        bulk_query.extend([
+            json.dumps({'index': {'_index': settings.es_index,
+                                  '_id': row[settings.es_id_field]}}),
+            json.dumps(row)
+        ])
+    str_query = '\n'.join(bulk_query) + '\n'
+
+    # 2. Загружаем данные в ES
+    response = await elasticsearch_client.bulk(str_query, refresh=True)
+    if response['errors']:
+        raise Exception('Ошибка записи данных в Elasticsearch', response)
+
+    # 3. Выгружаем каталог только с двумя полями
+    url = settings.service_url + settings.api_uri + '/export'
+    async with session_client.get(url, params={'fields': 'id,title'}) as response:
+        status = response.status
+        content_type = response.headers['Content-Type']
+        lines = [json.loads(line) async for line in response.content if line.strip()]
+
+    # 4. Проверяем, что выгружены все фильмы, по одному на строку и без лишних полей
+    exported = {film['id'] for film in lines}
+    assert status == HTTPStatus.OK
+    assert content_type.startswith('application/x-ndjson')
+    assert {row['id'] for row in settings.es_data} <= exported
+    assert len(exported) == len(lines)
+    assert all(set(film) <= {'id', 'title'} for film in lines)
+
+
+@pytest.mark.asyncio
+async def test_films_sort(session_client):
+    settings = test_settings_films
+    url = settings.service_url + settings.api_uri
+    # 1. Сортировка по рейтингу по возрастанию отражается в ответе
+    async with session_client.get(url, params={'sort': 'imdb_rating'}) as response:
+        body = await response.json()
+        status = response.status
+    # 2. Неизвестное поле сортировки отклоняется
+    async with session_client.get(url, params={'sort': '-created'}) as response:
+        unknown_status = response.status
+
+    ratings = [film['imdb_rating'] for film in body['results']]
+    assert status == HTTPStatus.OK
+    assert body['sort'] == {'imdb_rating': 'asc'}
+    assert ratings == sorted(ratings)
+    assert unknown_status == HTTPStatus.UNPROCESSABLE_ENTITY
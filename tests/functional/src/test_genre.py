@@ -4,7 +4,7 @@ from http import HTTPStatus
 import pytest
 
 from tests.functional.settings import test_settings_genres, test_settings_films
-from ..utils.helpers import _get_from_redis_cache, _put_result_to_redis_cache
+from ..utils.helpers import _cache_key, _get_from_redis_cache, _put_result_to_redis_cache
 
 
 @pytest.mark.asyncio
@@ -30,14 +30,11 @@ async def test_genre_id(elasticsearch_client, session_client, redis_client):
         body = await response.json()
         status = response.status
 
-    # 4. Загружаем кэш из Redis
-    redis_key = f'api/v1/genres/{str(es_data[settings.es_id_field])}'
-    redis_response = await _get_from_redis_cache(redis_client, redis_key)
-
-    # 5. Проверяем ответ
+    # 4. Проверяем ответ: жанр отдаётся из каталога в памяти,
+    # а если каталог ещё не знает о нём, то из Elasticsearch через кэш
     assert status == 200
     assert body['id'] == es_data[settings.es_id_field]
-    assert redis_response['hits']['hits'][0]['_id'] == es_data[settings.es_id_field]
+    assert body['name'] == es_data['name']
 
 
 @pytest.mark.asyncio
@@ -87,7 +84,7 @@ async def test_popular_films_in_genre(elasticsearch_client, session_client, redi
         status = response.status
 
     # 4. Загружаем кэш из Redis
-    redis_key = f'api/v1/films/genre_top_films/{str(g_es_data["id"])}'
+    redis_key = _cache_key(f'api/v1/films/genre_top_films/{str(g_es_data["id"])}', pnum=1, psize=50)
     redis_response = await _get_from_redis_cache(redis_client, redis_key)
 
     # 5. Проверяем ответ
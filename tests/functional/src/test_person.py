@@ -4,7 +4,7 @@ from http import HTTPStatus
 import pytest
 
 from tests.functional.settings import test_settings_persons, test_settings_films
-from ..utils.helpers import _get_from_redis_cache, _put_result_to_redis_cache
+from ..utils.helpers import _cache_key, _get_from_redis_cache, _put_result_to_redis_cache
 
 
 @pytest.mark.asyncio
@@ -36,7 +36,7 @@ async def test_persons_id(elasticsearch_client, session_client, redis_client):
 
     # 4. Загружаем кэш из Redis
 
-    redis_key = f'api/v1/persons/{str(es_data[settings.es_id_field])}'
+    redis_key = _cache_key(f'api/v1/persons/{str(es_data[settings.es_id_field])}')
 
     redis_response = await _get_from_redis_cache(redis_client, redis_key)
 
@@ -80,11 +80,12 @@ async def test_persons_films_by_id(elasticsearch_client, session_client, redis_c
         status = response.status
 
     # 4. Загружаем кэш из Redis
-    redis_key = f'api/v1/persons/{str(p_es_data["id"])}/film/'
+    redis_key = _cache_key(f'api/v1/persons/{str(p_es_data["id"])}/film', pnum=1, psize=50)
     redis_response = await _get_from_redis_cache(redis_client, redis_key)
 
     # 5. Проверяем ответ
     assert status == HTTPStatus.OK
     assert f_es_data[p_settings.es_id_field] in (i['id'] for i in body['results'])
-    film = list(filter(lambda x: x['_id'] == f_es_data['id'], redis_response))
-    assert p_es_data["id"] in list((i['id'] for i in film[0]['_source']['actors']))
+    # в кэше хранятся только поля FilmShort
+    assert f_es_data['id'] in (i['id'] for i in redis_response)
+    assert set(redis_response[0]) == {'id', 'title', 'imdb_rating'}
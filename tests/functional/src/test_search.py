@@ -4,7 +4,7 @@ from http import HTTPStatus
 import pytest
 
 from tests.functional.settings import test_settings_films, test_settings_persons
-from ..utils.helpers import _get_from_redis_cache, _put_result_to_redis_cache
+from ..utils.helpers import _cache_key, _get_from_redis_cache, _put_result_to_redis_cache
 
 
 #  Название теста должно начинаться со слова `test_`
@@ -36,13 +36,15 @@ async def test_search_films(elasticsearch_client, session_client, redis_client):
         status = response.status
 
     # 4. Загружаем кэш из Redis
-    redis_key = f'api/v1/films/search:query={settings.query_data["query"]}:pnum=1:psize=50'
+    redis_key = _cache_key(
+        'api/v1/films/search', pnum=1, psize=50, query=settings.query_data['query'].lower()
+    )
     redis_response = await _get_from_redis_cache(redis_client, redis_key)
 
     # 5. Проверяем ответ
     assert status == HTTPStatus.OK
     assert len(body['results']) == 50
-    assert len(redis_response['hits']['hits']) == 50
+    assert len(redis_response['results']) == 50
 
 
 @pytest.mark.asyncio
@@ -71,10 +73,53 @@ async def test_search_persons(elasticsearch_client, session_client, redis_client
         status = response.status
 
     # 4. Загружаем кэш из Redis
-    redis_key = f'api/v1/persons/search:query={settings.query_data["query"]}:pnum=1:psize=50'
+    redis_key = _cache_key(
+        'api/v1/persons/search', pnum=1, psize=50, query=settings.query_data['query'].lower()
+    )
     redis_response = await _get_from_redis_cache(redis_client, redis_key)
 
     # 5. Проверяем ответ
     assert status == HTTPStatus.OK
     assert len(body['results']) == 50
     assert len(redis_response) == 50
+
+
+@pytest.mark.asyncio
+async def test_suggest(session_client):
+    settings = test_settings_films
+    # 1. Запрашиваем подсказки по короткому префиксу дважды: второй ответ из памяти воркера
+    url = settings.service_url + '/api/v1/suggest'
+    prefix = settings.query_data['query'][:3]
+    async with session_client.get(url, params={'prefix': prefix}) as response:
+        body = await response.json()
+        status = response.status
+    async with session_client.get(url, params={'prefix': prefix.upper()}) as response:
+        cached_body = await response.json()
+
+    # 2. Проверяем ответ: в подсказках только id и название
+    assert status == HTTPStatus.OK
+    assert set(body) == {'films', 'persons'}
+    assert all(set(film) == {'id', 'title'} for film in body['films'])
+    assert all(set(person) == {'id', 'full_name'} for person in body['persons'])
+    assert cached_body == body
+
+
+@pytest.mark.asyncio
+async def test_search_everywhere(session_client, redis_client):
+    settings = test_settings_films
+    # 1. Фильмы для запроса уже загружены в ES тестом test_search_films
+    url = settings.service_url + '/api/v1/search'
+    async with session_client.get(url, params={**settings.query_data, 'size': 5}) as response:
+        body = await response.json()
+        status = response.status
+
+    # 2. Загружаем кэш из Redis: все три группы лежат одной записью
+    redis_key = _cache_key('api/v1/search', query=settings.query_data['query'].lower(), size=5)
+    redis_response = await _get_from_redis_cache(redis_client, redis_key)
+
+    # 3. Проверяем ответ
+    assert status == HTTPStatus.OK
+    assert set(body) == {'films', 'persons', 'genres'}
+    assert len(body['films']['results']) == 5
+    assert body['films']['total'] >= 50
+    assert redis_response['films']['results'] == body['films']['results']
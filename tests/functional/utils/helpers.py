@@ -1,24 +1,60 @@
+import hashlib
 import json
 import os
+import time
+import zlib
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
 
 FILM_CACHE_EXPIRE_IN_SECONDS = int(os.getenv('FILM_CACHE_EXPIRE_IN_SECONDS', 60 * 5))
+CACHE_KEY_VERSION = os.getenv('CACHE_KEY_VERSION', 'v1')
+
+
+def _cache_key(namespace: str, /, **params) -> str:
+    # повторяет services.cache_keys.cache_key для уже нормализованных параметров
+    key = f'{namespace}:{CACHE_KEY_VERSION}'
+    canonical = '&'.join(
+        f'{name}={value}' for name, value in sorted(params.items()) if value is not None
+    )
+    if not canonical:
+        return key
+    if len(canonical) > 128:
+        canonical = '#' + hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+    return f'{key}?{canonical}'
+
+
+def _unpack(data: bytes) -> bytes:
+    # первый байт значения в Redis — заголовок кодека сжатия
+    header, body = data[0], data[1:]
+    if header == 0:
+        return body
+    if header == 1:
+        return zlib.decompress(body)
+    if header == 2 and lz4_frame is not None:
+        return lz4_frame.decompress(body)
+    return data
+
 
 async def _get_from_redis_cache(redis, redis_key: str):
     data = await redis.get(redis_key)
     out = None
     try:
-        out = json.loads(data)
+        out = json.loads(_unpack(data))
     except Exception as out_e:
         print('out_e', out_e)
     if not out:
         return None
-    return out
+    # в кэше лежит конверт с моментом истечения мягкого TTL
+    return out['data']
 
 
 async def _put_result_to_redis_cache(redis, redis_key: str, data):
     if data:
         try:
-            d = json.dumps(data)
-            await redis.set(redis_key, value=d, expire=FILM_CACHE_EXPIRE_IN_SECONDS)
+            d = json.dumps({'expire_at': time.time() + FILM_CACHE_EXPIRE_IN_SECONDS, 'data': data})
+            await redis.set(redis_key, value=b'\x00' + d.encode(), expire=FILM_CACHE_EXPIRE_IN_SECONDS)
         except Exception as e:
             print('exep', e)
@@ -0,0 +1,24 @@
+import asyncio
+import os
+import sys
+
+import aioredis
+import pytest
+import pytest_asyncio
+
+# код сервиса импортируется так же, как в контейнере: из каталога src
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))), 'src'))
+
+
+@pytest_asyncio.fixture
+async def redis_pool():
+    """Настоящий Redis для проверки Lua-скриптов; без него такие тесты пропускаются"""
+    address = (os.getenv('REDIS_HOST', '127.0.0.1'), int(os.getenv('REDIS_PORT', 6379)))
+    try:
+        pool = await asyncio.wait_for(aioredis.create_redis_pool(address), 1)
+    except (OSError, asyncio.TimeoutError):
+        pytest.skip('Redis is not available')
+    yield pool
+    pool.close()
+    await pool.wait_closed()
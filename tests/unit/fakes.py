@@ -0,0 +1,160 @@
+import asyncio
+from typing import Dict, List
+
+from fastapi import Request
+
+from db.abstract import PointInTimeNotFound
+
+
+def make_request(path: str = '/api/v1/films/1', query_string: bytes = b'', headers=()) -> Request:
+    return Request({
+        'type': 'http', 'method': 'GET', 'path': path,
+        'query_string': query_string, 'headers': list(headers),
+    })
+
+
+class Clock:
+    """Подменяет модуль time там, где нужен только time.monotonic()"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeStorage:
+    """Хранилище с интерфейсом пула aioredis для get/set/mget/delete, без TTL"""
+
+    def __init__(self):
+        self.data: Dict[str, bytes] = {}
+        self.gets = 0
+
+    async def get(self, key: str):
+        self.gets += 1
+        return self.data.get(key)
+
+    async def set(self, key: str, value: bytes, expire: int = 0):
+        self.data[key] = value
+
+    async def mget(self, *keys: str):
+        self.gets += len(keys)
+        return [self.data.get(key) for key in keys]
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+class FakeCache:
+    """Кэш сервисов в памяти: TTL не истекает сам, а запоминается в expires"""
+
+    def __init__(self):
+        self.data: Dict[str, bytes] = {}
+        self.expires: Dict[str, int] = {}
+        self.tags: Dict[str, set] = {}
+        self.forgotten: List[str] = []
+
+    async def get(self, key: str, **kwargs):
+        return self.data.get(key)
+
+    async def set(self, key: str, value, expire: int, **kwargs):
+        self.data[key] = value
+        self.expires[key] = expire
+
+    async def mget(self, *keys: str):
+        return [self.data.get(key) for key in keys]
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def forget(self, *keys: str):
+        self.forgotten.extend(keys)
+
+    async def tag(self, key: str, tags, expire: int):
+        for tag in tags:
+            self.tags.setdefault(tag, set()).add(key)
+
+    async def invalidate_tags(self, tags):
+        keys = sorted(set().union(*(self.tags.pop(tag, set()) for tag in tags)))
+        await self.delete(*keys)
+        return keys
+
+
+class CountingLoader:
+    """Источник данных, который считает обращения к себе"""
+
+    def __init__(self, value, delay: float = 0.01):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.value
+
+
+class FakePublisher:
+    def __init__(self):
+        self.published: List[tuple] = []
+
+    async def publish(self, channel: str, message: bytes):
+        self.published.append((channel, message))
+
+
+class FakeSearchEngine:
+    """Поиск по списку фильмов в порядке id со search_after и учётом point-in-time"""
+
+    def __init__(self, films: List[Dict]):
+        self.films = sorted(films, key=lambda film: film['id'])
+        self.searches = 0
+        self.opened: List[str] = []
+        self.closed: List[str] = []
+
+    async def search(self, index=None, body=None, from_=0, size=10, **kwargs):
+        self.searches += 1
+        if 'pit' in body and body['pit']['id'] not in set(self.opened) - set(self.closed):
+            raise PointInTimeNotFound(body['pit']['id'])
+        after = (body.get('search_after') or [''])[0]
+        hits = [film for film in self.films if film['id'] > after][from_:from_ + size]
+        result = {'hits': {
+            'total': {'value': len(self.films), 'relation': 'eq'},
+            'hits': [{'_id': film['id'], '_source': film, 'sort': [film['id']]} for film in hits],
+        }}
+        if 'pit' in body:
+            result['pit_id'] = body['pit']['id']
+        return result
+
+    async def open_point_in_time(self, index: str, keep_alive: str) -> str:
+        self.opened.append(f'pit-{len(self.opened) + 1}')
+        return self.opened[-1]
+
+    async def close_point_in_time(self, pit_id: str) -> None:
+        self.closed.append(pit_id)
+
+
+async def call_asgi(app, path: str, query_string: bytes = b'', on_send=None) -> List[Dict]:
+    """Один GET-запрос к ASGI-приложению без HTTP-клиента; возвращает отправленные сообщения"""
+    scope = {
+        'type': 'http', 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': query_string,
+        'headers': [], 'server': ('testserver', 80), 'client': ('testclient', 50000),
+    }
+    messages: List[Dict] = []
+    requests = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        # как у настоящего сервера: дальше receive ждёт, пока клиент не отключится
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+        if on_send is not None:
+            on_send(message)
+
+    await app(scope, receive, send)
+    return messages
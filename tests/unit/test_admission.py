@@ -0,0 +1,154 @@
+import asyncio
+import sys
+
+import pytest
+
+from api import admission
+from api.admission import Limiter, Overloaded
+from api.response_cache import CachedResponse, cached_response, pack, response_key
+from db.singleflight import SingleFlight
+from services.film import FilmService, get_film_service
+
+from .fakes import FakeCache, FakeSearchEngine, call_asgi, make_request
+
+
+def limiter(concurrency=1, queue_size=1, wait_timeout=1.0):
+    return Limiter('films', concurrency, queue_size, wait_timeout, retry_after=3)
+
+
+async def hold(limiter: Limiter, release: asyncio.Event):
+    async with limiter.slot():
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_request_waits_in_queue_for_free_slot():
+    films = limiter()
+    release = asyncio.Event()
+    holder = asyncio.ensure_future(hold(films, release))
+    await asyncio.sleep(0)
+    waiter = asyncio.ensure_future(hold(films, asyncio.Event()))
+    await asyncio.sleep(0)
+    assert (films.active, films.waiting) == (1, 1)
+
+    release.set()
+    await holder
+    await asyncio.sleep(0.01)
+
+    assert (films.active, films.waiting, films.admitted) == (1, 0, 2)
+    waiter.cancel()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_sheds_at_once():
+    films = limiter(queue_size=0)
+    release = asyncio.Event()
+    holder = asyncio.ensure_future(hold(films, release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(Overloaded) as error:
+        await films._acquire()
+
+    assert error.value.retry_after == 3
+    assert films.stats()['shed'] == 1
+    release.set()
+    await holder
+
+
+@pytest.mark.asyncio
+async def test_wait_timeout_and_cancelled_waiters_return_their_slots():
+    films = limiter(queue_size=2, wait_timeout=0.01)
+    release = asyncio.Event()
+    holder = asyncio.ensure_future(hold(films, release))
+    await asyncio.sleep(0)
+    with pytest.raises(Overloaded):
+        await films._acquire()
+    cancelled = asyncio.ensure_future(films._acquire())
+    await asyncio.sleep(0)
+
+    # место освобождается в тот же момент, когда ожидание отменяют
+    release.set()
+    cancelled.cancel()
+    await holder
+    await asyncio.sleep(0)
+
+    assert films.stats()['timed_out'] == 1
+    assert films.stats()['waiting'] == 0
+    assert not films._semaphore.locked()
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    def install(endpoint, **kwargs):
+        limiter = Limiter(endpoint, **{
+            'concurrency': 1, 'queue_size': 0, 'wait_timeout': 0.01, 'retry_after': 3, **kwargs
+        })
+        monkeypatch.setitem(admission.limiters, endpoint, limiter)
+        return limiter
+
+    return install
+
+
+@pytest.fixture
+def app():
+    from main import app
+
+    engine = FakeSearchEngine([{'id': f'film-{number:02}'} for number in range(3)])
+    app.dependency_overrides[get_film_service] = lambda: FilmService(
+        FakeCache(), engine, SingleFlight(), None
+    )
+    yield app
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_overloaded_endpoint_answers_503_with_retry_after(app, budget):
+    suggest = budget('suggest')
+
+    async with suggest.slot():
+        messages = await call_asgi(app, '/api/v1/suggest', b'prefix=star')
+
+    start = messages[0]
+    assert start['status'] == 503
+    assert (b'retry-after', b'3') in start['headers']
+    assert suggest.stats()['shed'] == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_hits_are_served_while_misses_are_shed(budget):
+    film_details = budget('film_details')
+    cache = FakeCache()
+
+    @cached_response('film_details')
+    async def route():
+        return {'id': '1'}
+
+    hit, miss = make_request('/api/v1/films/1'), make_request('/api/v1/films/2')
+    await cache.set(response_key(hit, {}), pack(CachedResponse('application/json', '"1"', 2e9, b'{}')), expire=60)
+
+    async with film_details.slot():
+        assert (await route(_request=hit, _response_cache=cache)).status_code == 200
+        with pytest.raises(Overloaded):
+            await route(_request=miss, _response_cache=cache)
+
+    assert film_details.stats()['shed'] == 1
+
+
+# StreamingResponse из starlette 0.13 не работает на Python 3.11+, сервис собирается на 3.10
+@pytest.mark.skipif(sys.version_info >= (3, 11), reason='starlette 0.13 streams need Python < 3.11')
+@pytest.mark.asyncio
+async def test_export_holds_its_slot_until_stream_ends(app, budget):
+    export = budget('films_export')
+    active_while_streaming = []
+
+    def on_send(message):
+        if message['type'] == 'http.response.body':
+            active_while_streaming.append(export.active)
+
+    messages = await call_asgi(app, '/api/v1/films/export', on_send=on_send)
+
+    assert messages[0]['status'] == 200
+    assert b'film-02' in b''.join(m.get('body', b'') for m in messages)
+    assert active_while_streaming and all(active == 1 for active in active_while_streaming)
+    assert export.active == 0
+    assert not export._semaphore.locked()
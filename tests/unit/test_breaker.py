@@ -0,0 +1,153 @@
+import asyncio
+import time
+
+import pytest
+
+from api.response_cache import cached_response, response_key
+from core.config import get_cache_policy
+from db.breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    BreakerSearchEngine,
+    CircuitBreaker,
+    CircuitOpenError,
+    SearchEngineUnavailable,
+)
+from db.singleflight import SingleFlight
+from services import codecs
+from services.base import BaseService, degraded
+
+from .fakes import Clock, CountingLoader, FakeCache, make_request
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr('db.breaker.time', clock)
+    return clock
+
+
+def test_breaker_opens_half_opens_and_closes(clock):
+    breaker = CircuitBreaker(failure_ratio=0.5, window=4, min_calls=4, open_seconds=10)
+    for failed in (False, True, False, True):
+        breaker.before_call()
+        breaker.record(failed, 0.01)
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_after == 11
+    clock.now += 10
+
+    # после open_seconds проходит один пробный вызов, остальные отклоняются
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record(False, 0.01)
+
+    assert breaker.state == CLOSED
+    assert breaker.stats()['trips'] == 1
+    assert breaker.stats()['rejected'] == 2
+
+
+def test_failed_trial_opens_breaker_again(clock):
+    breaker = CircuitBreaker(window=2, min_calls=2, slow_call=1.0, open_seconds=10)
+    for _ in range(2):
+        breaker.before_call()
+        # медленный вызов считается неудачным
+        breaker.record(False, 1.5)
+    assert breaker.state == OPEN
+    clock.now += 10
+
+    breaker.before_call()
+    breaker.record(True, 0.01)
+
+    assert breaker.state == OPEN
+    assert breaker.opened_at == clock.now
+    assert breaker.stats()['trips'] == 2
+
+
+class SlowEngine:
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = 0
+
+    async def get(self, index, id, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {'id': id}
+
+
+@pytest.mark.asyncio
+async def test_engine_timeouts_open_breaker_and_skip_engine():
+    engine = SlowEngine(delay=1)
+    search = BreakerSearchEngine(
+        engine, CircuitBreaker(window=2, min_calls=2), lambda e: True, call_timeout=0.01
+    )
+    for _ in range(2):
+        with pytest.raises(SearchEngineUnavailable):
+            await search.get('movies', '1')
+
+    with pytest.raises(CircuitOpenError):
+        await search.get('movies', '1')
+    assert engine.calls == 2
+    assert search.stats()['state'] == OPEN
+
+
+async def unavailable():
+    raise SearchEngineUnavailable('search engine circuit is open')
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_served_while_search_engine_is_down():
+    cache = FakeCache()
+    service = BaseService(cache, None, SingleFlight())
+    # эндпоинт без stale-while-revalidate: устаревшую запись он отдаёт только при отказе
+    cache.data['persons:1'] = codecs.encode({'id': '1'}, time.time() - 1)
+    served_before = BaseService.degraded_served['no_swr_endpoint']
+
+    assert await service._get_or_load('persons:1', unavailable, 'no_swr_endpoint') == {'id': '1'}
+
+    assert degraded.get()
+    assert BaseService.degraded_served['no_swr_endpoint'] - served_before == 1
+
+
+@pytest.mark.asyncio
+async def test_miss_while_search_engine_is_down_raises():
+    service = BaseService(FakeCache(), None, SingleFlight())
+
+    with pytest.raises(SearchEngineUnavailable):
+        await service._get_or_load('persons:1', unavailable, 'no_swr_endpoint')
+
+
+@pytest.mark.asyncio
+async def test_entry_stays_for_hard_ttl_without_swr():
+    cache = FakeCache()
+    service = BaseService(cache, None, SingleFlight())
+    policy = get_cache_policy('no_swr_endpoint')
+
+    await service._get_or_load('persons:1', CountingLoader({'id': '1'}), 'no_swr_endpoint')
+
+    # запись переживает мягкий TTL, чтобы было что отдать при отказе Elasticsearch
+    assert not policy.stale_while_revalidate
+    assert cache.expires['persons:1'] == policy.hard_ttl > policy.soft_ttl
+
+
+@pytest.mark.asyncio
+async def test_degraded_response_is_not_stored():
+    cache = FakeCache()
+    service = BaseService(cache, None, SingleFlight())
+    cache.data['persons:1'] = codecs.encode({'id': '1'}, time.time() - 1)
+
+    @cached_response('no_swr_endpoint')
+    async def person_details():
+        return await service._get_or_load('persons:1', unavailable, 'no_swr_endpoint')
+
+    request = make_request('/api/v1/persons/1')
+    response = await person_details(_request=request, _response_cache=cache)
+
+    assert response.body == b'{"id":"1"}'
+    assert response.headers['cache-control'] == 'no-store'
+    assert response_key(request, {}) not in cache.data
@@ -0,0 +1,86 @@
+import pytest
+
+from db.cache import TwoTierCache
+from db.memory import MemoryCache
+
+from .fakes import Clock, FakeStorage
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr('db.memory.time', clock)
+    return clock
+
+
+def test_memory_evicts_least_recently_used():
+    memory = MemoryCache(max_items=2)
+    memory.set('a', b'1', 60)
+    memory.set('b', b'2', 60)
+    # a прочитан последним, поэтому вытесняется b
+    assert memory.get('a') == b'1'
+    memory.set('c', b'3', 60)
+
+    assert memory.get('b') is None
+    assert memory.get('a') == b'1'
+    assert memory.get('c') == b'3'
+    assert memory.evictions == 1
+
+
+def test_memory_expires_by_ttl(clock):
+    memory = MemoryCache()
+    memory.set('a', b'1', 10)
+    clock.now += 9
+    assert memory.get('a') == b'1'
+    clock.now += 1
+
+    assert memory.get('a') is None
+    assert len(memory) == 0
+    assert memory.size == 0
+
+
+def test_memory_bounded_by_bytes():
+    memory = MemoryCache(max_items=100, max_bytes=10)
+    memory.set('a', b'123456', 60)
+    memory.set('b', b'123456', 60)
+
+    assert memory.get('a') is None
+    assert memory.get('b') == b'123456'
+    assert memory.size == 6
+    # значение больше всего лимита не сохраняется и ничего не вытесняет
+    memory.set('c', b'x' * 11, 60)
+    assert memory.get('c') is None
+    assert memory.get('b') == b'123456'
+
+
+@pytest.mark.asyncio
+async def test_two_tier_reads_redis_once_then_memory():
+    storage = FakeStorage()
+    cache = TwoTierCache(storage, MemoryCache(), prefix_ttl={'films': 10})
+    await storage.set('films:1', b'\x00film')
+
+    assert await cache.get('films:1') == b'film'
+    assert await cache.get('films:1') == b'film'
+
+    assert storage.gets == 1
+    stats = cache.stats()
+    assert (stats['memory_hits'], stats['memory_misses']) == (1, 1)
+    assert (stats['storage_hits'], stats['storage_misses']) == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_two_tier_keys_without_memory_ttl_skip_l1():
+    storage = FakeStorage()
+    cache = TwoTierCache(storage, MemoryCache(), prefix_ttl={'films': 10, 'films:export': 0})
+    await cache.set('films:export:1', b'row', expire=60)
+    await cache.set('films:1', b'film', expire=60)
+
+    assert await cache.get('films:export:1') == b'row'
+    assert await cache.mget('films:export:1', 'films:1', 'films:2') == [b'row', b'film', None]
+
+    assert len(cache.memory) == 1
+    stats = cache.stats()
+    # ключи, которым нельзя в L1, не портят долю попаданий в L1
+    assert (stats['memory_hits'], stats['memory_misses']) == (1, 1)
+    assert stats['memory_hit_ratio'] == 0.5
+    assert (stats['storage_hits'], stats['storage_misses']) == (2, 1)
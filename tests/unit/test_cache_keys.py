@@ -0,0 +1,38 @@
+import pytest
+
+from api.v1.search import search_everywhere
+from services.cache_keys import cache_key, normalize_query
+
+from .fakes import FakeCache, make_request
+
+
+def test_plain_query_is_lowercased_except_operators():
+    assert normalize_query('  Star   Wars AND  Trek ') == 'star wars AND trek'
+
+
+@pytest.mark.parametrize('query', ['rating:[5 TO 9]', 'title.raw:"The Matrix"', '"The  Matrix" NOT Reloaded'])
+def test_query_string_syntax_keeps_case(query):
+    assert normalize_query(query) == ' '.join(query.split())
+
+
+class FakeSearchService:
+    def __init__(self):
+        self.calls = []
+
+    async def search_everywhere(self, redis_key, query, size):
+        self.calls.append((redis_key, query))
+        return {'films': [], 'persons': [], 'genres': []}
+
+
+@pytest.mark.asyncio
+async def test_search_engine_gets_original_query():
+    service = FakeSearchService()
+
+    await search_everywhere(
+        query='Title.raw:"The Matrix"', size=5, search_service=service,
+        _request=make_request('/api/v1/search'), _response_cache=FakeCache(),
+    )
+
+    assert service.calls == [
+        (cache_key('api/v1/search', query='Title.raw:"The Matrix"', size=5), 'Title.raw:"The Matrix"')
+    ]
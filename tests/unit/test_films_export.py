@@ -0,0 +1,69 @@
+import pytest
+
+from db.singleflight import SingleFlight
+from models.paginators import CursorPaginateModel
+from services.film import FilmService
+
+from .fakes import FakeCache, FakeSearchEngine
+
+
+@pytest.fixture
+def engine():
+    return FakeSearchEngine([{'id': f'film-{number:02}'} for number in range(5)])
+
+
+@pytest.fixture
+def service(engine, monkeypatch):
+    monkeypatch.setattr('services.film.CURSOR_POINT_IN_TIME', True)
+    return FilmService(FakeCache(), engine, SingleFlight(), None)
+
+
+@pytest.mark.asyncio
+async def test_export_closes_point_in_time_after_last_batch(service, engine):
+    batches = [batch async for batch in service.export_movies(batch_size=2)]
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert engine.opened == ['pit-1']
+    assert engine.closed == ['pit-1']
+
+
+@pytest.mark.asyncio
+async def test_export_closes_point_in_time_when_client_goes_away(service, engine):
+    batches = service.export_movies(batch_size=2)
+    assert len(await batches.__anext__()) == 2
+
+    # StreamingResponse перестал читать выгрузку: генератор закрывается
+    await batches.aclose()
+
+    assert engine.searches == 1
+    assert engine.closed == ['pit-1']
+
+
+@pytest.mark.asyncio
+async def test_cursor_with_expired_point_in_time_continues_on_new_one(service, engine):
+    page = await service.get_paginated_movies(
+        'films:cursor', offset=0, limit=2, search_after=['film-01'], pit_id='expired'
+    )
+
+    assert [film['id'] for film in page['results']] == ['film-02', 'film-03']
+    assert engine.opened == ['pit-1']
+    assert page['pit'] == 'pit-1'
+
+
+class FakeRankings:
+    def __init__(self, page):
+        self.page = page
+
+    async def top_films(self, genre_id, offset, limit):
+        return self.page
+
+
+@pytest.mark.asyncio
+async def test_genre_top_page_past_the_end_is_a_miss(engine):
+    service = FilmService(FakeCache(), engine, SingleFlight(), FakeRankings({'total': 3, 'results': []}))
+
+    films = await service.get_top_films_by_genre_id('genre_top:1', 'genre-1', CursorPaginateModel(2, 5, None))
+
+    # как и пустой ответ Elasticsearch: маршрут отдаст 404
+    assert films is None
+    assert engine.searches == 0
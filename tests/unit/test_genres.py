@@ -0,0 +1,56 @@
+import pytest
+
+from api.v1.genres import get_by_id, get_genres
+from db.singleflight import SingleFlight
+from models.paginators import PaginateModel
+from services.genre_catalogue import GenreCatalogue
+from services.genres import GenreService
+
+from .fakes import FakeCache, make_request
+
+
+class GenreIndex:
+    def __init__(self, names):
+        self.names = names
+
+    async def search(self, index=None, body=None, size=10, **kwargs):
+        return {'hits': {'hits': [
+            {'_id': str(number), '_source': {'name': name}} for number, name in enumerate(self.names)
+        ]}}
+
+
+async def genre_service():
+    index = GenreIndex(['Action', 'Drama'])
+    catalogue = GenreCatalogue(index, refresh_interval=60)
+    await catalogue.refresh()
+    cache = FakeCache()
+    return index, catalogue, cache, GenreService(cache, None, SingleFlight(), catalogue)
+
+
+@pytest.mark.asyncio
+async def test_genres_are_served_from_catalogue_with_version_etag():
+    index, catalogue, cache, service = await genre_service()
+
+    response = await get_genres(make_request('/api/v1/genres'), PaginateModel(50, 1), service)
+
+    assert response.body == b'{"results":[{"id":"0","name":"Action"},{"id":"1","name":"Drama"}]}'
+    assert catalogue.version in response.headers['etag']
+    # ответ собирается из снимка, в Redis ничего не пишется
+    assert cache.data == {}
+
+    request = make_request('/api/v1/genres', headers=[(b'if-none-match', response.headers['etag'].encode())])
+    assert (await get_genres(request, PaginateModel(50, 1), service)).status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_genre_etag_changes_with_catalogue():
+    index, catalogue, cache, service = await genre_service()
+    response = await get_by_id('1', make_request('/api/v1/genres/1'), service)
+    etag = response.headers['etag'].encode()
+
+    index.names = ['Action', 'Comedy']
+    await catalogue.on_change('genres', ['1'])
+    response = await get_by_id('1', make_request('/api/v1/genres/1', headers=[(b'if-none-match', etag)]), service)
+
+    assert response.status_code == 200
+    assert response.body == b'{"id":"1","name":"Comedy"}'
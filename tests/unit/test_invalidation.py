@@ -0,0 +1,150 @@
+import asyncio
+import uuid
+
+import orjson
+import pytest
+
+from db.cache import TAG_PREFIX, TwoTierCache
+from db.invalidation import CacheInvalidator
+from db.memory import MemoryCache
+
+from .fakes import FakeCache, FakePublisher
+
+
+@pytest.mark.asyncio
+async def test_invalidator_broadcasts_evicted_keys():
+    cache = FakeCache()
+    publisher = FakePublisher()
+    invalidator = CacheInvalidator(cache, publisher, ('redis', 6379), 'cache:invalidate')
+    await cache.set('films:1', b'film', expire=60)
+    await cache.tag('films:1', ['1'], expire=60)
+    changed = []
+
+    async def listener(index, ids):
+        # снимки в памяти обновляются до удаления ключей
+        changed.append((index, ids, 'films:1' in cache.data))
+
+    invalidator.add_listener(listener)
+    await invalidator.invalidate('movies', ['1'])
+
+    assert 'films:1' not in cache.data
+    assert publisher.published == [('cache:invalidate', orjson.dumps({'keys': ['films:1']}))]
+    assert changed == [('movies', ['1'], True)]
+    # другой воркер получил то же событие, но ключей ему уже не досталось
+    await invalidator.invalidate('movies', ['1'])
+    assert len(publisher.published) == 1
+    assert invalidator.stats()['evicted_keys'] == 1
+
+
+def test_invalidator_forgets_broadcast_keys_in_memory():
+    cache = FakeCache()
+    invalidator = CacheInvalidator(cache, FakePublisher(), ('redis', 6379), 'cache:invalidate')
+
+    invalidator.forget(['films:1', 'films:2'])
+
+    assert cache.forgotten == ['films:1', 'films:2']
+    assert invalidator.stats()['forgotten_keys'] == 2
+
+
+@pytest.fixture
+def prefix():
+    return f'test:{uuid.uuid4().hex}:'
+
+
+@pytest.mark.asyncio
+async def test_tags_pop_data_keys_and_responses_built_from_them(redis_pool, prefix):
+    cache = TwoTierCache(redis_pool, MemoryCache(), default_ttl=10)
+    film, response = prefix + 'films:1', prefix + 'films:response'
+    await cache.set(film, b'film', expire=60)
+    await cache.tag(film, [prefix + 'doc1', prefix + 'doc2'], expire=60)
+    await cache.set(response, b'body', expire=30)
+    await cache.tag(response, [film], expire=30)
+
+    assert sorted(await cache.invalidate_tags([prefix + 'doc2'])) == [film, response]
+
+    assert await redis_pool.exists(film, response) == 0
+    assert len(cache.memory) == 0
+    # забранные теги удалены: и тег документа, и тег ключа данных
+    assert await redis_pool.exists(TAG_PREFIX + prefix + 'doc2', TAG_PREFIX + film) == 0
+    assert await cache.invalidate_tags([prefix + 'doc2']) == []
+
+
+@pytest.mark.asyncio
+async def test_tag_keeps_only_live_keys(redis_pool, prefix):
+    cache = TwoTierCache(redis_pool, MemoryCache())
+    tag = TAG_PREFIX + prefix + 'doc'
+    await cache.tag(prefix + 'short', [prefix + 'doc'], expire=1)
+    await cache.tag(prefix + 'long', [prefix + 'doc'], expire=60)
+    await asyncio.sleep(1.1)
+
+    await cache.tag(prefix + 'other', [prefix + 'doc'], expire=30)
+
+    members = await redis_pool.zrange(tag, encoding='utf-8')
+    assert sorted(members) == [prefix + 'long', prefix + 'other']
+    # тег живёт, пока жив самый долгий из его ключей, и не дольше
+    assert 55 <= await redis_pool.ttl(tag) <= 60
+
+
+class FakeChannel:
+    """Канал подписки aioredis: отдаёт сообщения, затем закрывается или ждёт дальше"""
+
+    def __init__(self, messages, closes: bool):
+        self.messages = list(messages)
+        self.closes = closes
+
+    async def wait_message(self):
+        if self.messages:
+            return True
+        if not self.closes:
+            await asyncio.Event().wait()
+        return False
+
+    async def get(self):
+        return self.messages.pop(0)
+
+
+class FakeConnection:
+    def __init__(self, channel):
+        self.channel = channel
+        self.closed = False
+
+    async def subscribe(self, name):
+        return [self.channel]
+
+    def close(self):
+        self.closed = True
+
+    async def wait_closed(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_invalidator_resubscribes_after_disconnect(monkeypatch):
+    dropped = FakeConnection(FakeChannel([orjson.dumps({'keys': ['films:1']})], closes=True))
+    alive = FakeConnection(FakeChannel([orjson.dumps({'keys': ['films:2']})], closes=False))
+    attempts = [OSError('connection refused'), dropped, alive]
+
+    async def create_redis(address):
+        attempt = attempts.pop(0)
+        if isinstance(attempt, Exception):
+            raise attempt
+        return attempt
+
+    monkeypatch.setattr('db.invalidation.aioredis.create_redis', create_redis)
+    cache = FakeCache()
+    invalidator = CacheInvalidator(
+        cache, FakePublisher(), ('redis', 6379), 'cache:invalidate', min_backoff=0.01
+    )
+
+    await invalidator.start()
+    for _ in range(100):
+        if cache.forgotten == ['films:1', 'films:2']:
+            break
+        await asyncio.sleep(0.01)
+
+    assert cache.forgotten == ['films:1', 'films:2']
+    assert dropped.closed
+    assert invalidator.stats()['connected']
+    assert invalidator.stats()['reconnects'] == 2
+    await invalidator.stop()
+    assert alive.closed
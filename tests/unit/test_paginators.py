@@ -0,0 +1,37 @@
+import pytest
+from fastapi import HTTPException
+
+from models.paginators import CursorPaginateModel, encode_cursor
+
+
+def paginate(cursor):
+    return CursorPaginateModel(page_size=10, page_number=1, cursor=cursor)
+
+
+def test_cursor_keeps_its_sort():
+    pagination = paginate(encode_cursor([8.5, 'film-1'], 'pit-1', ('-imdb_rating',)))
+
+    pagination.check_sort(('-imdb_rating',))
+    assert pagination.search_after == [8.5, 'film-1']
+    assert pagination.pit_id == 'pit-1'
+
+
+@pytest.mark.parametrize('cursor', [
+    # курсор другой сортировки
+    encode_cursor([8.5, 'film-1'], None, ('-imdb_rating',)),
+    # значений search_after меньше, чем полей сортировки
+    encode_cursor(['The Matrix'], None, ('-imdb_rating', 'title')),
+    # строка вместо рейтинга
+    encode_cursor(['high', 'The Matrix', 'film-1'], None, ('-imdb_rating', 'title')),
+])
+def test_cursor_of_another_sort_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        paginate(cursor).check_sort(('-imdb_rating', 'title'))
+    assert error.value.status_code == 422
+
+
+@pytest.mark.parametrize('cursor', ['not base64!', 'WzEsMl0', 'e30'])
+def test_broken_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        paginate(cursor)
+    assert error.value.status_code == 422
@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+import pytest
+
+from api.response_cache import cached_response, response_key
+from core.config import get_cache_policy
+from db.singleflight import SingleFlight
+from models.paginators import CursorPaginateModel
+from models.query_filters import QueryFilterModel, SortModel
+from services import codecs
+from services.cache_keys import cache_key
+from services.base import BaseService
+
+from .fakes import CountingLoader, FakeCache, make_request
+
+ENDPOINT = 'film_details'
+
+
+@pytest.fixture
+def cache():
+    return FakeCache()
+
+
+@pytest.fixture
+def route(cache):
+    service = BaseService(cache, None, SingleFlight())
+    load = CountingLoader({'id': '1', 'title': 'new'})
+
+    @cached_response(ENDPOINT)
+    async def film_details():
+        return await service._get_or_load('films:1', load, ENDPOINT)
+
+    return film_details
+
+
+@pytest.mark.asyncio
+async def test_response_lives_no_longer_than_its_data(route, cache):
+    # данные свежи ещё 100 секунд из мягкого TTL
+    cache.data['films:1'] = codecs.encode({'id': '1', 'title': 'old'}, time.time() + 100)
+    request = make_request()
+
+    response = await route(_request=request, _response_cache=cache)
+
+    assert get_cache_policy(ENDPOINT).soft_ttl > 100
+    assert 98 <= cache.expires[response_key(request, {})] <= 100
+    assert cache.tags['films:1'] == {response_key(request, {})}
+    assert 98 <= int(response.headers['cache-control'].split('=')[1]) <= 100
+
+
+@pytest.mark.asyncio
+async def test_response_from_stale_data_is_not_stored(route, cache):
+    cache.data['films:1'] = codecs.encode({'id': '1', 'title': 'old'}, time.time() - 1)
+    request = make_request()
+
+    response = await route(_request=request, _response_cache=cache)
+    await asyncio.gather(*BaseService._refresh_tasks)
+
+    assert b'old' in response.body
+    assert response.headers['cache-control'] == 'max-age=0'
+    assert response_key(request, {}) not in cache.data
+    # следующий запрос собирается из обновлённых данных, а не из запомненного старого ответа
+    response = await route(_request=request, _response_cache=cache)
+    assert b'new' in response.body
+    assert response_key(request, {}) in cache.data
+
+
+def film_list_arguments(page_number=1, sort=None):
+    return {
+        'filter_by': QueryFilterModel(None, None),
+        'sort': SortModel(sort),
+        'pagination': CursorPaginateModel(50, page_number, None),
+        'film_service': object(),
+    }
+
+
+def test_response_key_ignores_defaults_and_unknown_params():
+    key = response_key(make_request('/api/v1/films'), film_list_arguments())
+
+    assert key == response_key(
+        make_request('/api/v1/films', b'page[number]=1&page[size]=50&_=123'), film_list_arguments()
+    )
+    assert key != response_key(make_request('/api/v1/films'), film_list_arguments(page_number=2))
+    assert key != response_key(make_request('/api/v1/films'), film_list_arguments(sort=['title']))
+
+
+def test_response_key_normalizes_query_and_skips_path_params():
+    request = make_request('/api/v1/films/genre_top_films/1')
+    request.scope['path_params'] = {'genre_id': '1'}
+
+    assert response_key(request, {'genre_id': '1', 'query': ' Star  Wars'}) == cache_key(
+        'api/v1/films/genre_top_films/1:response', query='star wars'
+    )
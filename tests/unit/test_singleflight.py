@@ -0,0 +1,72 @@
+import asyncio
+import uuid
+
+import pytest
+
+from db.singleflight import RELEASE_LOCK_SCRIPT, SingleFlight
+from services.base import BaseService
+
+from .fakes import CountingLoader, FakeCache
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_load_once():
+    flight = SingleFlight()
+    service = BaseService(FakeCache(), None, flight)
+    load = CountingLoader({'id': '1', 'title': 'Film'})
+
+    results = await asyncio.gather(*(
+        service._get_or_load('films:1', load, 'film_details') for _ in range(20)
+    ))
+
+    assert load.calls == 1
+    assert all(result == {'id': '1', 'title': 'Film'} for result in results)
+    assert flight.stats()['leaders'] == 1
+    assert flight.stats()['coalesced'] == 19
+    assert flight.stats()['in_flight'] == 0
+    # следующий запрос берёт значение из кэша, а не из источника
+    assert await service._get_or_load('films:1', load, 'film_details') == results[0]
+    assert load.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_load_is_not_shared_with_later_calls():
+    flight = SingleFlight()
+
+    async def fail():
+        raise RuntimeError('search engine is down')
+
+    with pytest.raises(RuntimeError):
+        await flight.do('films:1', fail)
+    assert await flight.do('films:1', CountingLoader('film')) == 'film'
+
+
+@pytest.mark.asyncio
+async def test_release_script_deletes_only_own_lock(redis_pool):
+    lock_key = f'lock:test:{uuid.uuid4().hex}'
+    await redis_pool.set(lock_key, 'owner', pexpire=10000)
+
+    assert await redis_pool.eval(RELEASE_LOCK_SCRIPT, keys=[lock_key], args=['other']) == 0
+    assert await redis_pool.get(lock_key) == b'owner'
+    assert await redis_pool.eval(RELEASE_LOCK_SCRIPT, keys=[lock_key], args=['owner']) == 1
+    assert await redis_pool.exists(lock_key) == 0
+
+
+@pytest.mark.asyncio
+async def test_redis_lock_coalesces_across_workers(redis_pool):
+    key = f'test:{uuid.uuid4().hex}'
+    cache = FakeCache()
+    # два воркера с общим Redis: второй ждёт значение в кэше, а не идёт в источник
+    workers = [
+        BaseService(cache, None, SingleFlight(redis_pool, lock_timeout=5, poll_interval=0.01))
+        for _ in range(2)
+    ]
+    load = CountingLoader({'id': '1'}, delay=0.05)
+
+    results = await asyncio.gather(*(
+        worker._get_or_load(key, load, 'film_details') for worker in workers
+    ))
+
+    assert load.calls == 1
+    assert results == [{'id': '1'}, {'id': '1'}]
+    assert await redis_pool.exists(f'lock:{key}') == 0
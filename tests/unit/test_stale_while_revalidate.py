@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+import pytest
+
+from core.config import get_cache_policy
+from db.singleflight import SingleFlight
+from services import codecs
+from services.base import BaseService
+
+from .fakes import CountingLoader, FakeCache
+
+SWR_ENDPOINT = 'film_details'
+PLAIN_ENDPOINT = 'no_swr_endpoint'
+
+
+async def refreshes_done():
+    await asyncio.gather(*BaseService._refresh_tasks)
+
+
+@pytest.fixture
+def cache():
+    return FakeCache()
+
+
+@pytest.fixture
+def service(cache):
+    return BaseService(cache, None, SingleFlight())
+
+
+def put_stale(cache, key, data):
+    # мягкий TTL истёк, жёсткий ещё нет: запись лежит в кэше
+    cache.data[key] = codecs.encode(data, time.time() - 1)
+
+
+@pytest.mark.asyncio
+async def test_entry_is_written_for_hard_ttl(service, cache):
+    policy = get_cache_policy(SWR_ENDPOINT)
+    await service._get_or_load('films:1', CountingLoader({'id': '1'}), SWR_ENDPOINT)
+
+    assert policy.stale_while_revalidate
+    assert cache.expires['films:1'] == policy.hard_ttl
+    _, expire_at = codecs.decode(cache.data['films:1'])
+    assert expire_at == pytest.approx(time.time() + policy.soft_ttl, abs=5)
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_served_and_refreshed_once(service, cache):
+    put_stale(cache, 'films:1', {'id': '1', 'title': 'old'})
+    load = CountingLoader({'id': '1', 'title': 'new'})
+    served_before = BaseService.stale_served[SWR_ENDPOINT]
+
+    results = await asyncio.gather(*(
+        service._get_or_load('films:1', load, SWR_ENDPOINT) for _ in range(10)
+    ))
+
+    # устаревшее значение отдаётся сразу, не дожидаясь источника
+    assert all(result['title'] == 'old' for result in results)
+    assert BaseService.stale_served[SWR_ENDPOINT] - served_before == 10
+    await refreshes_done()
+    assert load.calls == 1
+    assert await service._get_or_load('films:1', load, SWR_ENDPOINT) == {'id': '1', 'title': 'new'}
+    assert load.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_hard_miss_after_hard_ttl_waits_for_source(service, cache):
+    put_stale(cache, 'films:1', {'id': '1', 'title': 'old'})
+    # Redis удалил запись по жёсткому TTL
+    await cache.delete('films:1')
+    load = CountingLoader({'id': '1', 'title': 'new'})
+
+    assert await service._get_or_load('films:1', load, SWR_ENDPOINT) == {'id': '1', 'title': 'new'}
+    assert load.calls == 1
+    assert not BaseService._refresh_tasks
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_not_served_without_swr(service, cache):
+    put_stale(cache, 'films:1', {'id': '1', 'title': 'old'})
+    load = CountingLoader({'id': '1', 'title': 'new'})
+
+    assert await service._get_or_load('films:1', load, PLAIN_ENDPOINT) == {'id': '1', 'title': 'new'}
+    assert load.calls == 1
@@ -0,0 +1,63 @@
+import pytest
+
+from api.v1.suggest import suggest
+from core.config import SUGGEST_CACHE_TTL
+from db.breaker import OPEN, BreakerSearchEngine, CircuitBreaker, SearchEngineUnavailable
+from db.elastic import ElasticSearchEngine, is_unavailable
+from db.memory import MemoryCache
+from services.suggest import SuggestService
+
+from .fakes import make_request
+
+
+class FakeSuggestService:
+    async def suggest(self, prefix):
+        return b'{"films":[],"persons":[]}'
+
+
+@pytest.mark.asyncio
+async def test_suggest_sets_etag_and_max_age():
+    response = await suggest(make_request('/api/v1/suggest'), prefix='sta', suggest_service=FakeSuggestService())
+
+    assert response.status_code == 200
+    assert response.headers['etag'].startswith('"')
+    assert response.headers['cache-control'] in (
+        f'max-age={SUGGEST_CACHE_TTL}', f'max-age={SUGGEST_CACHE_TTL - 1}'
+    )
+
+    etag = response.headers['etag'].encode()
+    response = await suggest(
+        make_request('/api/v1/suggest', headers=[(b'if-none-match', etag)]), prefix='sta', suggest_service=FakeSuggestService()
+    )
+    assert response.status_code == 304
+    assert response.body == b''
+
+
+class PartlyFailingClient:
+    """_msearch, в котором поиск по persons упал на стороне кластера"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def msearch(self, body, **kwargs):
+        self.calls += 1
+        return {'responses': [
+            {'hits': {'total': {'value': 1}, 'hits': [{'_id': '1', '_source': {'title': 'Star'}}]}},
+            {'error': {'type': 'search_phase_execution_exception'}, 'status': 503},
+        ]}
+
+
+@pytest.mark.asyncio
+async def test_failed_msearch_item_is_not_cached_and_counts_for_breaker():
+    client = PartlyFailingClient()
+    breaker = CircuitBreaker(window=2, min_calls=2)
+    service = SuggestService(
+        BreakerSearchEngine(ElasticSearchEngine(client), breaker, is_unavailable), MemoryCache(max_items=10)
+    )
+
+    for _ in range(2):
+        with pytest.raises(SearchEngineUnavailable):
+            await service.suggest('st')
+
+    assert client.calls == 2
+    assert breaker.state == OPEN